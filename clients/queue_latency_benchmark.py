@@ -0,0 +1,145 @@
+import asyncio
+import websockets
+import json
+import random
+import statistics
+import time
+import src.config as config
+from clients.stress_test import TEST_ACCOUNTS, SERVER_URI
+
+# Background load: clients that keep persistence loops running and keep
+# filling orders so PnL monitors pile up on the monitoring queue.
+PERSISTENCE_CLIENTS = 20
+PNL_LOAD_CLIENTS = 50
+
+# Foreground probes: orders whose placement latency we measure.
+PROBE_ORDERS = 50
+PROBE_INTERVAL_SECONDS = 0.2
+
+PERSISTENCE_SYMBOLS = [("binanceusdm", "BTC/USDT:USDT"), ("binanceusdm", "ETH/USDT:USDT")]
+
+def build_order_payload(user_id: str) -> dict:
+    """Builds a random small market order for one of the test accounts."""
+    account_config = random.choice(TEST_ACCOUNTS)
+    payload = {
+        "user_id": user_id,
+        "account_name": account_config["account_name"],
+        "exchange": account_config["exchange"],
+        "api_key": account_config["api_key"],
+        "api_secret": account_config["api_secret"],
+        "is_testnet": account_config["is_testnet"],
+        "action": "place_market_order",
+        "params": {
+            "symbol": random.choice(account_config["symbols"]),
+            "side": random.choice(["buy", "sell"]),
+            "amount": round(random.uniform(10, 20), 5)
+        }
+    }
+    if account_config.get("exchange") == "okx":
+        payload["password"] = account_config["password"]
+    return payload
+
+async def connect(user_id: str):
+    """Opens a WebSocket and authenticates as `user_id`."""
+    websocket = await websockets.connect(SERVER_URI)
+    await websocket.send(json.dumps({"user_id": user_id}))
+    await asyncio.wait_for(websocket.recv(), timeout=10)
+    return websocket
+
+async def run_persistence_load(client_id: int, stop: asyncio.Event):
+    """Keeps one order book persistence loop alive until the benchmark ends."""
+    websocket = await connect(f"bench_persist_{client_id}")
+    exchange, symbol = PERSISTENCE_SYMBOLS[client_id % len(PERSISTENCE_SYMBOLS)]
+    try:
+        await websocket.send(json.dumps({"action": "start_orderbook", "exchange": exchange, "symbol": symbol}))
+        await stop.wait()
+        await websocket.send(json.dumps({"action": "stop_orderbook_persistence"}))
+    finally:
+        await websocket.close()
+
+async def run_pnl_load(client_id: int, stop: asyncio.Event):
+    """Fills one order so that a PnL monitor is started in the background."""
+    user_id = f"bench_pnl_{client_id}"
+    websocket = await connect(user_id)
+    try:
+        await websocket.send(json.dumps(build_order_payload(user_id)))
+        await stop.wait()
+    finally:
+        await websocket.close()
+
+async def run_probe(probe_id: int):
+    """
+    Sends one market order and measures the time until the worker reports it as placed.
+
+    Returns:
+        float | None: The placement latency in seconds, or None on failure/timeout.
+    """
+    user_id = f"bench_probe_{probe_id}"
+    try:
+        websocket = await connect(user_id)
+    except Exception as e:
+        print(f"Probe {probe_id}: connection failed with {e}")
+        return None
+
+    try:
+        start_ts = time.monotonic()
+        await websocket.send(json.dumps(build_order_payload(user_id)))
+        while True:
+            msg = await asyncio.wait_for(websocket.recv(), timeout=30)
+            data = json.loads(msg)
+            if data.get("action") != "place_market_order":
+                continue
+            if data.get("status") == "placed":
+                return time.monotonic() - start_ts
+            if data.get("status") == "error":
+                print(f"Probe {probe_id}: order failed -> {data}")
+                return None
+    except Exception as e:
+        print(f"Probe {probe_id}: failed with {e}")
+        return None
+    finally:
+        await websocket.close()
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+async def main():
+    print(f"🚀 Starting queue latency benchmark: {PERSISTENCE_CLIENTS} persistence loops, "
+          f"{PNL_LOAD_CLIENTS} PnL monitors, {PROBE_ORDERS} probe orders...")
+    print(f"Queues: {config.CELERY_QUEUES}")
+
+    stop = asyncio.Event()
+    background = [asyncio.create_task(run_persistence_load(i, stop)) for i in range(PERSISTENCE_CLIENTS)]
+    background += [asyncio.create_task(run_pnl_load(i, stop)) for i in range(PNL_LOAD_CLIENTS)]
+
+    # Give the background work time to occupy the monitoring/persistence workers
+    await asyncio.sleep(5)
+
+    probes = []
+    for i in range(PROBE_ORDERS):
+        probes.append(asyncio.create_task(run_probe(i)))
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+    results = await asyncio.gather(*probes)
+
+    stop.set()
+    await asyncio.gather(*background, return_exceptions=True)
+
+    latencies = sorted(r for r in results if r is not None)
+    print("\n--- Order Placement Latency Under Background Load ---")
+    print(f"Probe orders:      {PROBE_ORDERS}")
+    print(f"Placed:            {len(latencies)}")
+    print(f"Failed:            {PROBE_ORDERS - len(latencies)}")
+    if latencies:
+        print(f"Mean:              {statistics.mean(latencies):.3f} sec")
+        print(f"p50:               {percentile(latencies, 50):.3f} sec")
+        print(f"p95:               {percentile(latencies, 95):.3f} sec")
+        print(f"p99:               {percentile(latencies, 99):.3f} sec")
+        print(f"Max:               {latencies[-1]:.3f} sec")
+
+if __name__ == "__main__":
+    # Ensure the server, RabbitMQ and the worker profiles are running
+    asyncio.run(main())
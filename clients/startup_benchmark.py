@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Measures what a process pays at startup: import time and peak RSS of the
+# server and worker entry points (each in a fresh interpreter), and optionally
+# the memory of a running prefork worker's children, split into what they
+# share with the parent and what each one holds privately.
+#
+#   python -m clients.startup_benchmark
+#   python -m clients.startup_benchmark --worker orders --settle 20
+
+MODULES = {
+    'server': 'src.server.server',
+    'task signatures': 'src.tasks.signatures',
+    'worker tasks': 'src.tasks.tasks',
+}
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in ('ccxt', 'pandas', 'pyarrow', 'numpy', 'boto3') if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy_modules": heavy}}))
+"""
+
+def measure_import(module: str, runs: int) -> dict:
+    """Imports `module` in `runs` fresh interpreters and keeps the fastest run."""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE.format(module=module)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(results, key=lambda result: result['seconds'])
+
+def read_memory_kb(pid: int) -> dict:
+    """Rss, Pss and private memory of a process from /proc/<pid>/smaps_rollup (Linux only)."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+def child_pids(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+def measure_worker(profile: str, settle_seconds: float) -> dict:
+    """Starts a worker profile, lets it fork its pool, and reads the memory of parent and children."""
+    worker = subprocess.Popen([sys.executable, '-m', 'src.worker', profile],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(settle_seconds)
+        # `python -m src.worker` execs celery in-process, so the pool children are its direct children
+        children = [read_memory_kb(pid) for pid in child_pids(worker.pid)]
+        return {'parent': read_memory_kb(worker.pid), 'children': children}
+    finally:
+        worker.terminate()
+        worker.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time and memory benchmark for the server and workers.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per module (fastest is reported).")
+    parser.add_argument("--worker", help="Also start this worker profile and report its pool's memory (Linux only).")
+    parser.add_argument("--settle", type=float, default=15.0, help="Seconds to let the worker start before measuring.")
+    args = parser.parse_args()
+
+    print(f"{'entry point':<18} {'import (s)':>10} {'max RSS (MB)':>13}  heavy modules loaded")
+    for label, module in MODULES.items():
+        result = measure_import(module, args.runs)
+        print(f"{label:<18} {result['seconds']:>10.2f} {result['max_rss_mb']:>13.1f}  {', '.join(result['heavy_modules']) or '-'}")
+
+    if args.worker:
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            print("Worker memory needs /proc/<pid>/smaps_rollup (Linux).")
+            return
+        memory = measure_worker(args.worker, args.settle)
+        children = memory['children']
+        print(f"\nWorker '{args.worker}': parent RSS {memory['parent']['rss'] / 1024:.1f} MB, {len(children)} children")
+        if children:
+            rss = sum(child['rss'] for child in children) / len(children) / 1024
+            private = sum(child['private'] for child in children) / len(children) / 1024
+            pss = sum(child['pss'] for child in children) / 1024
+            print(f"  per child: RSS {rss:.1f} MB, private {private:.1f} MB (shared with parent: {rss - private:.1f} MB)")
+            print(f"  total PSS of children: {pss:.1f} MB")
+        print("Compare with WORKER_PRELOAD_ENABLED=false to see what preloading saves.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,26 @@ import argparse
 import src.config as config
 import ccxt.async_support as ccxt
 from collections import deque
+import shutil
 import sys, time
 
+# --- Terminal UI rendering ---
+# The screen is redrawn only after state changes, at most UI_MAX_FPS times per
+# second, and only the lines that differ from the previous frame are rewritten.
+UI_MAX_FPS = 20
+BOOK_DEPTH = 10
+ui_dirty = asyncio.Event()
+
+def mark_dirty():
+    """Schedules a redraw; many changes between two frames cost a single redraw."""
+    ui_dirty.set()
+
 # --- Global state for the Terminal UI ---
 pre_trade_analysis_display = "No pre-trade analysis requested."
 best_bid_ask_display = "Waiting for orderbook command..."
 l2_book_display = "Connect and send 'start_orderbook' action to begin."
 position_pnl_display = "No active positions being monitored."
+book_metrics_display = "No book metrics yet (sent while persistence runs)."
 message_log = deque(maxlen=10)
 orderbook_task = None
 current_exchange = None
@@ -33,8 +46,9 @@ def format_l2_table(order_book: dict, limit: int = 10) -> str:
     if not order_book or not order_book.get('bids') or not order_book.get('asks'):
         return "L2 table data unavailable."
 
-    asks = sorted(order_book['asks'])[:limit]
-    bids = sorted(order_book['bids'], reverse=True)[:limit]
+    # ccxt returns both sides sorted best-first, so the top levels are a slice
+    asks = order_book['asks'][:limit]
+    bids = order_book['bids'][:limit]
     
     header = f"{'Qty':>12} @ {'Price':<14} | {'Price':>14} @ {'Qty':<12}\n"
     header += "-" * 56
@@ -65,21 +79,30 @@ async def send_user_commands(ws):
             message_log.append(f"[{time.strftime('%H:%M:%S')}] >> {req}")
         except json.JSONDecodeError:
             message_log.append(f"[{time.strftime('%H:%M:%S')}] >> Invalid JSON: {line}")
+        mark_dirty()
 
 async def poll_order_book(exchange_id, symbol):
     """Coroutine to fetch order book data and update the display variables."""
     global best_bid_ask_display, l2_book_display
     client = getattr(ccxt, exchange_id)()
+    top_levels = None
     try:
         while True:
             try:
                 snapshot = await client.fetch_order_book(symbol)
-                best_bid_ask_display = format_best_bid_ask(snapshot)
-                l2_book_display = format_l2_table(snapshot)
+                # Only the displayed levels matter: an unchanged top of book needs no formatting or redraw
+                latest = (snapshot['bids'][:BOOK_DEPTH], snapshot['asks'][:BOOK_DEPTH])
+                if latest != top_levels:
+                    top_levels = latest
+                    best_bid_ask_display = format_best_bid_ask(snapshot)
+                    l2_book_display = format_l2_table(snapshot, BOOK_DEPTH)
+                    mark_dirty()
             except Exception as e:
                 error_message = f"Error fetching order book: {e}"
                 best_bid_ask_display = error_message
                 l2_book_display = ""
+                top_levels = None
+                mark_dirty()
             await asyncio.sleep(1)
     finally:
         await client.close()
@@ -88,11 +111,13 @@ async def handle_server_messages(websocket):
     """Coroutine to listen for messages from our trading server."""
     import time
     global message_log, orderbook_task, current_exchange, current_symbol, best_bid_ask_display, l2_book_display
+    global book_metrics_display, position_pnl_display, pre_trade_analysis_display
     
     async for message in websocket:
         timestamp = time.strftime('%H:%M:%S', time.localtime())
         log_entry = f"[{timestamp}] << {message}"
         message_log.append(log_entry)
+        mark_dirty()
         
         try:
             data = json.loads(message)
@@ -101,8 +126,10 @@ async def handle_server_messages(websocket):
             if action == 'pre_trade_analysis':
                 analysis = data.get('data', {})
                 impact = analysis.get('price_impact', {})
-                funding = analysis.get('funding',{})
+                funding = analysis.get('funding_rate', {})
                 display_str = "--- Pre-Trade Analysis ---\n"
+                if data.get('status') == 'partial':
+                    display_str += "  (partial: some data missed the analysis deadline)\n"
                 if impact.get('status') == 'success':
                     display_str += (
                         f"  Price Impact for {impact['trade_volume_quote']:.2f} USDT trade: {impact['price_impact_percent']:.4f}%\n"
@@ -143,6 +170,18 @@ async def handle_server_messages(websocket):
                 l2_book_display = "Send 'start_orderbook' to resume."
                 message_log.append(f"[{timestamp}] Stopped orderbook")
 
+            elif action == 'orderbook_metrics':
+                metrics = data.get('data', {})
+                bands = " | ".join(
+                    f"{name[len('bid_depth_'):]}: {metrics[name] or 0:,.4f} / {metrics.get('ask' + name[3:]) or 0:,.4f}"
+                    for name in metrics if name.startswith('bid_depth_')
+                )
+                book_metrics_display = (
+                    f"  Mid: {metrics.get('mid_price') or 0:,.4f} | Microprice: {metrics.get('microprice') or 0:,.4f} | "
+                    f"Spread: {metrics.get('spread_bps') or 0:.2f} bps | Imbalance: {metrics.get('imbalance') or 0:+.3f}\n"
+                    f"  Bid/Ask depth by band: {bands}"
+                )
+
             elif action == 'pnl_update':
                 status = data.get('status')
                 if status == 'monitoring':
@@ -156,26 +195,74 @@ async def handle_server_messages(websocket):
                     )
                 elif status == 'stopped':
                     position_pnl_display = "Position monitoring stopped."
+
+            elif action == 'portfolio_update':
+                portfolio = data.get('data', {})
+                totals = portfolio.get('totals') or {}
+                lines = [
+                    f"  💼 Portfolio | Realized: {totals.get('realized_pnl', 0):.4f} | "
+                    f"Unrealized: {totals.get('unrealized_pnl', 0):.4f} | Net: {totals.get('net_pnl', 0):.4f}"
+                ]
+                for position in portfolio.get('positions', [])[:10]:
+                    lines.append(
+                        f"      {position['account']} {position['symbol']} {position['position_side'].upper()} "
+                        f"{position['quantity']} @ {position['entry_price'] or 0:.4f} | "
+                        f"uPnL {position['unrealized_pnl']:.4f} | rPnL {position['realized_pnl']:.4f}"
+                    )
+                position_pnl_display = "\n".join(lines)
                 
         except json.JSONDecodeError:
             pass  # Message wasn't JSON, just log it
 
+def build_frame() -> list:
+    """The full screen as a list of lines."""
+    sections = [
+        "--- Trading Client ---", best_bid_ask_display,
+        "", "--- L2 Order Book ---", l2_book_display,
+        "", "--- 📐 Book Metrics ---", book_metrics_display,
+        "", "--- 🔬 Pre-Trade Analysis ---", pre_trade_analysis_display,
+        "", "--- 📊 Position & PnL ---", position_pnl_display,
+        "", "--- Server Message Log ---", *message_log,
+        "", "--- Send Command (as single-line JSON) ---",
+    ]
+    return [line for section in sections for line in section.split("\n")]
+
 async def display_ui():
-    """Coroutine to continuously redraw the terminal UI."""
+    """
+    Coroutine that redraws the terminal UI when the state changes.
+
+    Each frame is compared with the previous one line by line, and only the
+    changed lines are rewritten in place (ANSI cursor positioning), so a book
+    update touches ~20 lines instead of the whole screen.
+    """
+    previous = []
+    previous_size = None
+    min_interval = 1 / UI_MAX_FPS
     while True:
-        print("\033c", end="")
-        print("--- Trading Client ---")
-        print(best_bid_ask_display)
-        print("\n--- L2 Order Book ---")
-        print(l2_book_display)
-        print("\n--- 🔬 Pre-Trade Analysis ---") # New UI section
-        print(pre_trade_analysis_display)
-        print("\n--- 📊 Position & PnL ---")
-        print(position_pnl_display)
-        print("\n--- Server Message Log ---")
-        for msg in message_log: print(msg)
-        print("\n--- Send Command (as single-line JSON) ---")
-        await asyncio.sleep(0.1)
+        await ui_dirty.wait()
+        ui_dirty.clear()
+        started = time.monotonic()
+
+        size = shutil.get_terminal_size()
+        # Lines are cut to the terminal width so one line is always one screen row
+        frame = [line[:size.columns] for line in build_frame()][:size.lines - 1]
+        output = []
+        if size != previous_size:
+            output.append("\033[2J")  # Resized (or first frame): redraw everything
+            previous, previous_size = [], size
+        for row, line in enumerate(frame):
+            if row >= len(previous) or previous[row] != line:
+                output.append(f"\033[{row + 1};1H{line}\033[K")
+        if len(frame) < len(previous):
+            output.append(f"\033[{len(frame) + 1};1H\033[J")  # Clear rows the new frame no longer uses
+        # Leave the cursor under the prompt for typing
+        output.append(f"\033[{len(frame) + 1};1H")
+        sys.stdout.write("".join(output))
+        sys.stdout.flush()
+        previous = frame
+
+        # Frame cap: changes arriving meanwhile are drawn together in the next frame
+        await asyncio.sleep(max(0.0, min_interval - (time.monotonic() - started)))
 
 async def run_client(user_id, account_name=None):
     """Sets up all tasks and connects to the server."""
@@ -191,6 +278,7 @@ async def run_client(user_id, account_name=None):
             message_log.append(f"Server response: {response}")
 
             # launch listen/display/send coroutines
+            mark_dirty()
             listener = asyncio.create_task(handle_server_messages(websocket))
             ui       = asyncio.create_task(display_ui())
             sender   = asyncio.create_task(send_user_commands(websocket))
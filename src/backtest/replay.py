@@ -0,0 +1,117 @@
+import heapq
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+from datetime import datetime, timedelta, timezone
+from src.utils.orderbook_reader import OrderbookReader, OrderbookReconstructor, to_naive_utc
+
+SNAPSHOT_COLUMNS = ['timestamp', 'exchange', 'symbol', 'bids', 'asks']
+
+def _to_ms(value: datetime) -> int:
+    """Converts a naive-UTC datetime to epoch milliseconds."""
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+class MarketReplay:
+    """
+    Streams persisted order book snapshots in timestamp order across several
+    (exchange, symbol) streams.
+
+    Each stream is read one day at a time from the Parquet dataset and sorted,
+    and the streams are combined with a k-way merge, so memory stays bounded by
+    one day per stream regardless of the replay length.
+
+    Snapshots are ccxt-style order books:
+        {'timestamp': ms, 'datetime': iso, 'exchange': ..., 'symbol': ..., 'bids': [...], 'asks': [...]}
+    """
+
+    def __init__(self, reader: OrderbookReader, streams: list, start: datetime, end: datetime,
+                 speed: float = None, depth: int = None, reconstructor: OrderbookReconstructor = None):
+        """
+        Args:
+            reader (OrderbookReader): The dataset to replay from.
+            streams (list): (exchange_id, symbol) pairs to replay.
+            start (datetime): Replay start (UTC, inclusive).
+            end (datetime): Replay end (UTC, exclusive).
+            speed (float): Replay speed multiplier relative to real time (e.g., 60 plays an
+                hour in a minute). None replays as fast as possible.
+            depth (int): Levels per side to keep in each snapshot (all when omitted).
+            reconstructor (OrderbookReconstructor): Replays data captured in delta mode,
+                yielding a book after every recorded change instead of reading `reader`.
+        """
+        if not streams:
+            raise ValueError("MarketReplay needs at least one (exchange, symbol) stream.")
+        self.reader = reader
+        self.streams = list(streams)
+        self.start = to_naive_utc(start)
+        self.end = to_naive_utc(end)
+        self.speed = speed
+        self.depth = depth
+        self.reconstructor = reconstructor
+        self._seek_to = None
+
+    def _read_stream(self, exchange: str, symbol: str, start: datetime):
+        """Yields one stream's snapshots in timestamp order, reading a day at a time."""
+        if self.reconstructor is not None:
+            yield from self.reconstructor.iter_books(exchange, symbol, start, self.end, self.depth)
+            return
+        day_start = start
+        while day_start < self.end:
+            next_midnight = datetime.combine(day_start.date() + timedelta(days=1), datetime.min.time())
+            day_end = min(next_midnight, self.end)
+            table = self.reader.read_table(day_start, day_end, [symbol], [exchange], SNAPSHOT_COLUMNS)
+            if table.num_rows:
+                timestamps = pc.cast(table.column('timestamp'), pa.timestamp('ms')).cast(pa.int64()).to_pylist()
+                bids, asks = table.column('bids'), table.column('asks')
+                if self.depth:
+                    # Trim in Arrow so only the kept levels become Python objects
+                    bids, asks = pc.list_slice(bids, 0, self.depth), pc.list_slice(asks, 0, self.depth)
+                for ts, bid_levels, ask_levels in zip(timestamps, bids.to_pylist(), asks.to_pylist()):
+                    yield {
+                        'timestamp': ts,
+                        'datetime': datetime.fromtimestamp(ts / 1000, tz=timezone.utc).isoformat(),
+                        'exchange': exchange,
+                        'symbol': symbol,
+                        'bids': bid_levels,
+                        'asks': ask_levels,
+                    }
+            day_start = day_end
+
+    def _merged(self, start: datetime):
+        streams = [self._read_stream(exchange, symbol, start) for exchange, symbol in self.streams]
+        return heapq.merge(*streams, key=lambda snapshot: snapshot['timestamp'])
+
+    def seek(self, timestamp: datetime):
+        """
+        Jumps to a point in time. Takes effect on the next snapshot when called
+        during iteration, otherwise on the next iteration.
+        """
+        self._seek_to = to_naive_utc(timestamp)
+
+    def __iter__(self):
+        position = self._seek_to or self.start
+        self._seek_to = None
+        merged = self._merged(position)
+        # Pacing starts at the first snapshot after a start or seek, not at the requested
+        # position, so a gap before the first data is not slept through
+        replay_origin_ms = None
+
+        while True:
+            if self._seek_to is not None:
+                position, self._seek_to = self._seek_to, None
+                merged = self._merged(position)
+                replay_origin_ms = None
+
+            snapshot = next(merged, None)
+            if snapshot is None:
+                return
+
+            if replay_origin_ms is None:
+                replay_origin_ms = snapshot['timestamp']
+                wall_origin = time.monotonic()
+            elif self.speed:
+                # Pace the replay so that replayed time runs `speed` times faster than wall time
+                due = (snapshot['timestamp'] - replay_origin_ms) / 1000 / self.speed
+                delay = due - (time.monotonic() - wall_origin)
+                if delay > 0:
+                    time.sleep(delay)
+            yield snapshot
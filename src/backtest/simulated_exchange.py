@@ -0,0 +1,168 @@
+import itertools
+from datetime import datetime, timezone
+from src.exchanges.symbol_mapper import SymbolMapper
+
+class SimulatedExchange:
+    """
+    A ccxt-compatible stand-in for an exchange, driven by replayed order books.
+
+    It implements the subset of the ccxt API that `UnifiedExchangeAPI` uses, so
+    the same price impact, order placement, order monitoring and PnL code runs
+    unchanged in backtests. Market orders fill immediately by walking the
+    current book; limit orders fill when a later snapshot crosses their price.
+    The exchange clock is the timestamp of the last snapshot it has seen.
+    """
+
+    def __init__(self, exchange_id: str, symbol_mapper: SymbolMapper = None, taker_fee: float = 0.0,
+                 starting_balances: dict = None):
+        """
+        Args:
+            exchange_id (str): The exchange being simulated (e.g., 'binanceusdm').
+            symbol_mapper (SymbolMapper): Used to accept exchange-specific IDs (e.g., 'BTCUSDT').
+            taker_fee (float): Fee charged on fills, as a fraction of the cost.
+            starting_balances (dict): Initial free balances per currency.
+        """
+        self.id = exchange_id
+        self.symbol_mapper = symbol_mapper
+        self.taker_fee = taker_fee
+        self.has = {'createOrders': False, 'fetchFundingRate': False, 'watchOrders': False}
+        self.balances = dict(starting_balances or {})
+        self.books = {}
+        self.orders = {}
+        self.open_orders = {}  # symbol -> {order_id: order}, matched on every snapshot
+        self.timestamp = None
+        self._order_ids = itertools.count(1)
+
+    # --- Market data ---
+    def _resolve(self, symbol: str) -> str:
+        if symbol in self.books or self.symbol_mapper is None:
+            return symbol
+        return self.symbol_mapper.to_universal(symbol, self.id) or symbol
+
+    def on_snapshot(self, snapshot: dict):
+        """Advances the exchange to a replayed order book snapshot and matches resting orders."""
+        symbol = snapshot['symbol']
+        self.books[symbol] = snapshot
+        self.timestamp = snapshot['timestamp']
+        for order in list(self.open_orders.get(symbol, {}).values()):
+            self._match_limit(order)
+
+    def iso8601(self, timestamp: int) -> str:
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).isoformat()
+
+    def load_markets(self, *args, **kwargs) -> dict:
+        return {symbol: self.market(symbol) for symbol in self.books}
+
+    def market(self, symbol: str) -> dict:
+        symbol = self._resolve(symbol)
+        return {'symbol': symbol, 'id': symbol, 'spot': True, 'swap': False, 'contract': False,
+                'contractSize': 1.0, 'limits': {'amount': {'min': None}}}
+
+    def amount_to_precision(self, symbol: str, amount: float) -> str:
+        return str(amount)
+
+    def set_sandbox_mode(self, enabled: bool):
+        pass
+
+    def fetch_order_book(self, symbol: str, limit: int = None, params=None) -> dict:
+        symbol = self._resolve(symbol)
+        if symbol not in self.books:
+            raise ValueError(f"No replayed order book for {symbol} on {self.id} yet.")
+        book = self.books[symbol]
+        if limit:
+            return {**book, 'bids': book['bids'][:limit], 'asks': book['asks'][:limit]}
+        return book
+
+    def fetch_ticker(self, symbol: str, params=None) -> dict:
+        book = self.fetch_order_book(symbol)
+        bid = book['bids'][0][0] if book['bids'] else None
+        ask = book['asks'][0][0] if book['asks'] else None
+        last = (bid + ask) / 2 if bid is not None and ask is not None else bid or ask
+        return {'symbol': book['symbol'], 'timestamp': book['timestamp'], 'datetime': book['datetime'],
+                'bid': bid, 'ask': ask, 'last': last}
+
+    def fetch_funding_rate(self, symbol: str, params=None) -> dict:
+        return {'symbol': self._resolve(symbol), 'fundingRate': 0.0, 'fundingTimestamp': None}
+
+    # --- Trading ---
+    def _apply_fill(self, order: dict, filled: float, cost: float):
+        base, quote = order['symbol'].split(':')[0].split('/')
+        fee = cost * self.taker_fee
+        sign = 1 if order['side'] == 'buy' else -1
+        self.balances[base] = self.balances.get(base, 0.0) + sign * filled
+        self.balances[quote] = self.balances.get(quote, 0.0) - sign * cost - fee
+
+        order['filled'] += filled
+        order['cost'] += cost
+        order['remaining'] = order['amount'] - order['filled']
+        order['average'] = order['cost'] / order['filled'] if order['filled'] else None
+        order['fee'] = {'currency': quote, 'cost': (order['fee'] or {}).get('cost', 0.0) + fee}
+        order['lastTradeTimestamp'] = self.timestamp
+
+    def _walk(self, order: dict, limit_price: float = None) -> tuple:
+        """Takes liquidity from the current book, optionally only at or better than a limit price."""
+        book = self.books[order['symbol']]
+        levels = book['asks'] if order['side'] == 'buy' else book['bids']
+        remaining = order['amount'] - order['filled']
+        filled = cost = 0.0
+        for price, quantity, *_ in levels:
+            if remaining <= 0:
+                break
+            if limit_price is not None and (price > limit_price if order['side'] == 'buy' else price < limit_price):
+                break
+            take = min(quantity, remaining)
+            filled += take
+            cost += take * price
+            remaining -= take
+        return filled, cost
+
+    def _match_limit(self, order: dict):
+        filled, cost = self._walk(order, order['price'])
+        if filled > 0:
+            self._apply_fill(order, filled, cost)
+        if order['remaining'] <= 1e-12:
+            order['status'] = 'closed'
+            self.open_orders.get(order['symbol'], {}).pop(order['id'], None)
+
+    def create_order(self, symbol: str, type: str, side: str, amount: float, price: float = None, params=None) -> dict:
+        symbol = self._resolve(symbol)
+        if symbol not in self.books:
+            raise ValueError(f"No replayed order book for {symbol} on {self.id} yet.")
+        order_id = str(next(self._order_ids))
+        order = {
+            'id': order_id, 'symbol': symbol, 'type': type, 'side': side, 'amount': amount, 'price': price,
+            'timestamp': self.timestamp, 'datetime': self.iso8601(self.timestamp), 'status': 'open',
+            'filled': 0.0, 'remaining': amount, 'cost': 0.0, 'average': None, 'fee': None,
+            'lastTradeTimestamp': None,
+        }
+        self.orders[order_id] = order
+
+        if type == 'market':
+            filled, cost = self._walk(order)
+            if filled > 0:
+                self._apply_fill(order, filled, cost)
+            # Unfilled remainder of a market order is canceled, as on a real venue
+            order['status'] = 'closed' if filled > 0 else 'canceled'
+        else:
+            self.open_orders.setdefault(symbol, {})[order_id] = order
+            self._match_limit(order)
+        return dict(order)
+
+    def create_market_order(self, symbol: str, side: str, amount: float, params=None) -> dict:
+        return self.create_order(symbol, 'market', side, amount, None, params)
+
+    def create_limit_order(self, symbol: str, side: str, amount: float, price: float, params=None) -> dict:
+        return self.create_order(symbol, 'limit', side, amount, price, params)
+
+    def cancel_order(self, order_id: str, symbol: str = None, params=None) -> dict:
+        order = self.orders[order_id]
+        if order['status'] == 'open':
+            order['status'] = 'canceled'
+            self.open_orders.get(order['symbol'], {}).pop(order_id, None)
+        return dict(order)
+
+    def fetch_order(self, order_id: str, symbol: str = None, params=None) -> dict:
+        return dict(self.orders[order_id])
+
+    def fetch_balance(self, params=None) -> dict:
+        return {'free': dict(self.balances), 'total': dict(self.balances)}
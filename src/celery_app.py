@@ -1,4 +1,5 @@
 from celery import Celery
+from kombu import Exchange, Queue
 import src.config as config
 
 celery_app = Celery(
@@ -7,3 +8,33 @@ celery_app = Celery(
     backend='rpc://', # Using RPC for results via RabbitMQ
     include=['src.tasks.tasks']
 )
+
+# --- Queue routing ---
+# Each kind of work gets its own queue so long-running persistence loops and
+# PnL monitors can never sit in front of a new order. The queues are declared
+# with `x-max-priority` so RabbitMQ honours per-message priorities inside them.
+def _priority_queue(name: str) -> Queue:
+    return Queue(
+        name,
+        Exchange(name, type='direct'),
+        routing_key=name,
+        queue_arguments={'x-max-priority': config.CELERY_MAX_PRIORITY}
+    )
+
+celery_app.conf.update(
+    task_queues=tuple(_priority_queue(name) for name in config.CELERY_QUEUES.values()),
+    task_routes={
+        'src.tasks.tasks.handle_api_request': {'queue': config.CELERY_QUEUES['orders']},
+        'src.tasks.tasks.task_smart_route_order': {'queue': config.CELERY_QUEUES['orders']},
+        'src.tasks.tasks.task_compare_funding_rates': {'queue': config.CELERY_QUEUES['orders']},
+        'src.tasks.tasks.task_prefetch_analysis': {'queue': config.CELERY_QUEUES['orders']},
+        'src.tasks.tasks.task_run_execution_algo': {'queue': config.CELERY_QUEUES['algos']},
+        'src.tasks.tasks.task_monitor_pnl': {'queue': config.CELERY_QUEUES['monitoring']},
+        'src.tasks.tasks.task_persist_orderbook_data': {'queue': config.CELERY_QUEUES['persistence']},
+    },
+    task_default_queue=config.CELERY_QUEUES['orders'],
+    task_queue_max_priority=config.CELERY_MAX_PRIORITY,
+    task_default_priority=config.CELERY_DEFAULT_PRIORITY,
+    # Long-running tasks must not let a worker hoard messages it cannot start yet.
+    worker_prefetch_multiplier=1,
+)
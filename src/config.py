@@ -13,10 +13,38 @@ AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = os.getenv('AWS_REGION', 'AWS_REGION')
 AWS_S3_BUCKET_NAME = os.getenv('AWS_S3_BUCKET_NAME')
+# Optional endpoint for S3-compatible stores (e.g., MinIO at http://localhost:9000)
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+# Root directory for order book data kept on local disk
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR', 'data')
 
 # Capture frequency for the order book data
 DATA_CAPTURE_INTERVAL_SECONDS = 1
 
+# --- Persistence Storage & Uploads ---
+# Where snapshots are written: 's3' (AWS or S3-compatible via S3_ENDPOINT_URL), 'local' or 'memory'
+PERSISTENCE_BACKEND = os.getenv('PERSISTENCE_BACKEND', 's3')
+# Background uploads: concurrent uploads and how many may be in flight before new objects spill to disk
+UPLOAD_MAX_WORKERS = 4
+UPLOAD_MAX_PENDING = 256
+UPLOAD_MAX_RETRIES = 3
+UPLOAD_RETRY_BACKOFF_SECONDS = 0.5
+# How long a stopping capture task waits for queued uploads
+UPLOAD_FLUSH_TIMEOUT_SECONDS = 30
+# Objects that could not be uploaded are kept here and retried periodically
+SPILL_DIR = os.getenv('SPILL_DIR', 'spill')
+SPILL_DRAIN_INTERVAL_SECONDS = 30
+
+# 'full' writes every snapshot; 'delta' writes a full keyframe every KEYFRAME_INTERVAL_SECONDS
+# and only the changed levels in between (see DeltaOrderbookPersistor)
+PERSISTENCE_MODE = os.getenv('PERSISTENCE_MODE', 'full')
+KEYFRAME_INTERVAL_SECONDS = 60
+
+# Derived metrics computed at capture time (see src/utils/book_metrics.py)
+METRICS_DEPTH_BANDS_BPS = [5, 10, 25, 50, 100]
+METRICS_BOOK_DEPTH = 100
+METRICS_FLUSH_INTERVAL_SECONDS = 60
+
 # --- API Keys (placeholder) ---
 # In production, load these from environment variables or a secure vault.
 API_KEYS = {
@@ -29,4 +57,273 @@ API_KEYS = {
         'secret': 'YOUR_BITMART_SECRET_KEY',
         'uid': 'YOUR_BITMART_UID'
     }
-}
\ No newline at end of file
+}
+
+# --- Celery Queue Routing & Priorities ---
+# One queue per kind of work, so background loops cannot starve order placement.
+CELERY_QUEUES = {
+    'orders': 'orders',            # handle_api_request (order placement, account info)
+    'monitoring': 'monitoring',    # task_monitor_pnl
+    'persistence': 'persistence',  # task_persist_orderbook_data
+    'algos': 'algos',              # task_run_execution_algo (TWAP/VWAP parent orders)
+}
+
+# RabbitMQ priorities are 0..CELERY_MAX_PRIORITY, higher is served first.
+CELERY_MAX_PRIORITY = 10
+CELERY_DEFAULT_PRIORITY = 5
+
+# Broker priority for each WebSocket action proxied into `handle_api_request`.
+ACTION_PRIORITIES = {
+    'place_market_order': 9,
+    'place_limit_order': 9,
+    'analyze_and_place_order': 8,
+    'place_batch_orders': 9,
+    'smart_route_order': 9,
+    'start_execution_algo': 7,
+    'get_account_info': 3,
+    'compare_funding_rates': 5,
+}
+PNL_MONITOR_PRIORITY = 4
+PERSISTENCE_PRIORITY = 2
+# Speculative pre-trade prefetches must never delay real orders.
+PREFETCH_PRIORITY = 1
+
+# Worker profiles used by `python -m src.worker <profile>`.
+# Prefetch and concurrency are per worker, so each queue gets its own worker.
+WORKER_PROFILES = {
+    'orders': {
+        'queues': [CELERY_QUEUES['orders']],
+        'concurrency': 16,
+        'prefetch_multiplier': 1,
+        'pool': 'prefork',
+    },
+    'monitoring': {
+        # PnL monitors mostly sleep between ticker polls, so threads are cheap.
+        'queues': [CELERY_QUEUES['monitoring']],
+        'concurrency': 64,
+        'prefetch_multiplier': 1,
+        'pool': 'threads',
+    },
+    'persistence': {
+        # Stopped cooperatively (StopSignal), so any pool works; prefork keeps each loop's
+        # pandas/pyarrow serialization off the others' GIL and shares the preloaded modules.
+        'queues': [CELERY_QUEUES['persistence']],
+        'concurrency': 8,
+        'prefetch_multiplier': 1,
+        'pool': 'prefork',
+    },
+    'algos': {
+        # Each task runs many parent orders on one event loop, so few processes are needed.
+        'queues': [CELERY_QUEUES['algos']],
+        'concurrency': 4,
+        'prefetch_multiplier': 1,
+        'pool': 'prefork',
+    },
+    'all': {
+        'queues': list(CELERY_QUEUES.values()),
+        'concurrency': 16,
+        'prefetch_multiplier': 1,
+        'pool': 'prefork',
+    },
+}
+
+
+# --- Admission Control (see src/server/admission.py) ---
+# Token buckets as (requests per second, burst): one per user for everything
+# they enqueue, and one per user and action.
+ADMISSION_USER_LIMIT = (20, 40)
+ADMISSION_DEFAULT_ACTION_LIMIT = (5, 10)
+ADMISSION_ACTION_LIMITS = {
+    'place_market_order': (10, 20),
+    'place_limit_order': (10, 20),
+    'get_account_info': (2, 5),
+    'start_orderbook': (0.5, 2),
+    'prefetch_analysis': (2, 5),
+}
+# Requests a server instance may have enqueued without an answer from a worker yet.
+ADMISSION_MAX_IN_FLIGHT = 1000
+ADMISSION_IN_FLIGHT_TTL_SECONDS = 60
+# New work is rejected as "busy" while its queue holds this many waiting messages.
+ADMISSION_MAX_QUEUE_DEPTH = {
+    'orders': 2000,
+    'algos': 200,
+    'persistence': 200,
+}
+ADMISSION_QUEUE_POLL_SECONDS = 1.0
+
+# --- Worker Preloading (see src/tasks/preload.py) ---
+# Loaded in the worker parent before forking, so prefork children share them copy-on-write.
+WORKER_PRELOAD_ENABLED = os.getenv('WORKER_PRELOAD_ENABLED', 'true').lower() == 'true'
+# Public markets loaded up front; authenticated clients on these exchanges reuse them.
+WORKER_PRELOAD_EXCHANGES = ['binanceusdm', 'binancecoinm', 'okx']
+# Heavy modules imported lazily by the tasks of a queue, preloaded by workers consuming it.
+WORKER_PRELOAD_MODULES = {
+    'persistence': ['src.utils.data_persistor', 'src.utils.book_metrics'],
+}
+
+# --- Profiling (see src/utils/profiler.py) ---
+# Sampled stacks are written here as collapsed stacks (open in speedscope or render with flamegraph.pl).
+PROFILE_OUTPUT_DIR = os.getenv('PROFILE_OUTPUT_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILE_MAX_WINDOW_SECONDS = 600
+# A task profiled by count is sampled for at most this long (persistence loops never return on their own).
+PROFILE_MAX_TASK_SECONDS = 60
+# Arm profiling at startup: workers profile every task for PROFILE_SECONDS and/or the next
+# PROFILE_TASKS tasks; the server profiles its event loop for PROFILE_SECONDS.
+PROFILE_ON_START_SECONDS = float(os.getenv('PROFILE_SECONDS', '0'))
+PROFILE_ON_START_TASKS = int(os.getenv('PROFILE_TASKS', '0'))
+# User IDs (comma-separated) allowed to send `start_profiling`; empty disables the action.
+PROFILING_ADMINS = {user_id for user_id in os.getenv('PROFILING_ADMINS', '').split(',') if user_id}
+# Event-loop lag: measured during server profiles, or continuously when enabled.
+LOOP_LAG_MONITOR_ENABLED = os.getenv('LOOP_LAG_MONITOR_ENABLED', 'false').lower() == 'true'
+LOOP_LAG_INTERVAL_SECONDS = 0.05
+LOOP_LAG_WARN_SECONDS = 0.1
+
+# --- Symbol Resolution (see src/exchanges/symbol_mapper.py) ---
+# Exchange IDs accepted by the symbol mapper in place of the ones market data is stored under.
+SYMBOL_EXCHANGE_ALIASES = {
+    'binance': 'binanceusdm',
+    'binancefutures': 'binanceusdm',
+    'okex': 'okx',
+}
+
+# --- Credential Registration ---
+# Registered accounts are kept in a local encrypted keystore shared by the
+# server and the workers on this host. Set CREDENTIAL_STORE_KEY (a Fernet key)
+# in production; otherwise a key is generated inside the keystore directory.
+CREDENTIAL_STORE_DIR = os.getenv('CREDENTIAL_STORE_DIR', '.keystore')
+CREDENTIAL_STORE_KEY = os.getenv('CREDENTIAL_STORE_KEY')
+
+# --- Batch Orders ---
+# Maximum legs per native batch request (ccxt `create_orders`) for each exchange.
+BATCH_ORDER_CHUNK_SIZES = {
+    'binanceusdm': 5,
+    'binancecoinm': 5,
+    'okx': 20,
+}
+BATCH_ORDER_DEFAULT_CHUNK_SIZE = 5
+# Upper bound on concurrent requests per batch (chunks or single-order fallback).
+BATCH_ORDER_MAX_WORKERS = 8
+
+# --- Smart Order Routing ---
+# Order book depth fetched per venue and how long a fetched book may be reused.
+ROUTER_BOOK_DEPTH = 100
+ROUTER_BOOK_MAX_AGE_SECONDS = 0.5
+# Taker fees (as a fraction) used to compare venues on effective price.
+ROUTER_TAKER_FEES = {
+    'binanceusdm': 0.0005,
+    'binancecoinm': 0.0005,
+    'okx': 0.0005,
+    'kucoin': 0.001,
+    'bitmart': 0.0006,
+    'deribit': 0.0005,
+}
+
+# --- Funding Rates ---
+# Cached rates are kept until the next funding time, but never longer than this,
+# since the rate for the current interval keeps moving on most exchanges.
+FUNDING_CACHE_MAX_TTL_SECONDS = 300
+# Exchanges compared by `compare_funding_rates` when the request names none.
+FUNDING_COMPARE_EXCHANGES = ['binanceusdm', 'okx', 'bitmart', 'deribit']
+
+# --- Order Status Streams (see src/exchanges/order_streams.py) ---
+# Orders on these exchanges are tracked through the account's private order stream
+# (ccxt pro `watch_orders`) instead of polling `fetch_order`; others keep polling.
+ORDER_STREAMS_ENABLED = os.getenv('ORDER_STREAMS_ENABLED', 'true').lower() == 'true'
+ORDER_STREAM_EXCHANGES = ['binanceusdm', 'binancecoinm', 'okx']
+# While streaming, `fetch_order` only runs this often, as a safety net for missed updates.
+ORDER_STREAM_SAFETY_POLL_SECONDS = 15.0
+ORDER_STREAM_MAX_BACKOFF_SECONDS = 30.0
+# Recent order updates kept per account, for orders whose update arrives before monitoring starts.
+ORDER_STREAM_CACHE_SIZE = 10000
+# Streams (authenticated connections holding the account's keys) unused for this long are closed.
+ORDER_STREAM_IDLE_SECONDS = 900
+ORDER_STREAM_IDLE_CHECK_SECONDS = 60
+# Polling interval for exchanges without a stream, and the overall monitoring timeout.
+ORDER_POLL_INTERVAL_SECONDS = 3
+ORDER_MONITOR_TIMEOUT_SECONDS = 300
+
+# --- Public Request Coalescing (see src/exchanges/request_coalescer.py) ---
+# Identical public calls in flight at the same time are merged; results are then
+# reused for this many seconds. Methods not listed are only merged while in flight.
+COALESCE_TTL_SECONDS = {
+    'fetch_order_book': 0.2,
+    'fetch_ticker': 0.5,
+}
+COALESCE_MAX_ENTRIES = 5000
+# Callers joining a call in flight wait at most the client's request timeout plus this long
+# (room for a hedged copy), then make the call themselves.
+COALESCE_WAIT_MARGIN_SECONDS = 5.0
+
+# --- Exchange Health (see src/exchanges/circuit_breaker.py) ---
+# Consecutive network failures (timeouts, unavailability, rate limits) of one endpoint
+# on one exchange that open its circuit, and how long calls then fail fast before a probe.
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_OPEN_SECONDS = 30
+BREAKER_LATENCY_WINDOW = 200
+# Idempotent reads still unanswered after this latency percentile are sent again.
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_LATENCY_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.05
+HEDGE_MAX_WORKERS = 32
+
+# --- Pre-trade Analysis ---
+# `analyze_and_place_order` fetches the book, funding and market metadata concurrently;
+# funding and metadata still missing after this long are skipped.
+PRE_TRADE_DEADLINE_SECONDS = 1.5
+# Prefetched funding/metadata (sent on `start_orderbook` or `prefetch_analysis`) is used while this fresh.
+PRE_TRADE_PREFETCH_MAX_AGE_SECONDS = 30
+PRE_TRADE_MAX_WORKERS = 16
+
+# --- Balance Cache (see src/exchanges/balance_cache.py) ---
+# `get_account_info` re-fetches balances older than this; streamed accounts get pushes
+# and are only re-fetched at the longer interval. `force_refresh` always fetches.
+BALANCE_REFRESH_SECONDS = 10
+BALANCE_STREAM_REFRESH_SECONDS = 300
+
+# --- Connection Registry (see src/server/connection_registry.py) ---
+# 'memory' for a single server process; 'redis' to run several server processes/hosts
+# behind a load balancer, with worker messages routed to the instance holding the socket.
+CONNECTION_REGISTRY = os.getenv('CONNECTION_REGISTRY', 'memory')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+SERVER_INSTANCE_ID = os.getenv('SERVER_INSTANCE_ID')
+CONNECTION_TTL_SECONDS = 60
+CONNECTION_HEARTBEAT_SECONDS = 20
+
+# --- Cooperative Cancellation (see src/utils/stop_signals.py) ---
+# How often long-running loops check for a stop request.
+STOP_CHECK_INTERVAL_SECONDS = 0.5
+# Stop queues unused for this long are deleted by RabbitMQ.
+STOP_QUEUE_EXPIRES_SECONDS = 3600
+
+# --- Portfolio Service (python -m src.portfolio.service) ---
+# Durable queue workers publish fills to; the service nets them into positions.
+PORTFOLIO_FILLS_QUEUE = 'portfolio_fills'
+PORTFOLIO_STATE_PATH = os.getenv('PORTFOLIO_STATE_PATH', 'state/portfolio.npz')
+PORTFOLIO_PRICE_INTERVAL_SECONDS = 1.0
+PORTFOLIO_SNAPSHOT_INTERVAL_SECONDS = 1.0
+PORTFOLIO_CHECKPOINT_INTERVAL_SECONDS = 5.0
+PORTFOLIO_POLL_INTERVAL_SECONDS = 0.1
+PORTFOLIO_PRICE_MAX_WORKERS = 8
+# IDs of this many recent fills are checkpointed, so fills redelivered after a crash are not applied twice.
+PORTFOLIO_DEDUP_WINDOW = 100000
+
+# --- Execution Algorithms (TWAP/VWAP) ---
+# How long a fetched order book may be reused when re-evaluating a slice's impact.
+ALGO_BOOK_MAX_AGE_SECONDS = 1.0
+# Slices whose estimated impact exceeds this percentage are deferred to the next slice.
+ALGO_MAX_SLICE_IMPACT_PERCENT = 0.5
+# Days of hourly candles used to build the VWAP volume profile.
+ALGO_VWAP_LOOKBACK_DAYS = 7
+# Threads available to the blocking ccxt calls of all parent orders in one task.
+ALGO_MAX_THREADS = 64
+
+# --- Parquet Compaction ---
+# One compacted file per day of 1-second snapshots, with hourly row groups for timestamp pruning.
+COMPACTION_TARGET_FILE_ROWS = 86400
+COMPACTION_ROW_GROUP_SIZE = 3600
+COMPACTION_COMPRESSION = 'zstd'
+# Minutes after midnight (UTC) before a day's partitions count as closed.
+COMPACTION_GRACE_MINUTES = 15
+COMPACTION_MAX_WORKERS = 4
@@ -0,0 +1,179 @@
+import threading
+import time
+import src.config as config
+from src.exchanges.order_streams import get_order_streams
+
+
+# Keys of a ccxt balance structure that are not currencies
+_BALANCE_FIELDS = ('info', 'free', 'used', 'total', 'timestamp', 'datetime')
+
+
+def _copy_balance(balance: dict) -> dict:
+    """Copies a ccxt balance structure deep enough that updating one copy leaves the other intact."""
+    return {key: dict(value) if isinstance(value, dict) and key != 'info' else value for key, value in balance.items()}
+
+
+def _adjust(balance: dict, currency: str, delta: float):
+    """Adds `delta` to a currency's free and total amounts in a ccxt balance structure."""
+    account = balance.setdefault(currency, {'free': 0.0, 'used': 0.0, 'total': 0.0})
+    for field in ('free', 'total'):
+        account[field] = (account.get(field) or 0.0) + delta
+        balance.setdefault(field, {})[currency] = account[field]
+
+
+class _CachedBalance:
+    def __init__(self, balance: dict, source: str):
+        self.balance = balance
+        self.source = source  # 'rest' or 'stream'
+        self.updated_at = time.time()
+        self.fills_applied = 0
+        self.applied_order_ids = set()
+
+
+class BalanceCache:
+    """
+    Per-account balances for the worker process, so `get_account_info` is
+    answered from memory instead of a `fetch_balance` call every time.
+
+    A balance is refreshed from REST when it is older than
+    `BALANCE_REFRESH_SECONDS`, or on `force_refresh`. Accounts on exchanges
+    with private streams (see `OrderStreamManager`) also receive the balances
+    the exchange pushes, and are only re-fetched every
+    `BALANCE_STREAM_REFRESH_SECONDS` as a safety net. Between refreshes, fills
+    from this process's orders are applied incrementally (`apply_fill`).
+
+    Every answer says how old it is and where it came from (`staleness`).
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._streams = {}  # key -> the stream pushing the account's balance
+        self._refresh_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(api) -> tuple:
+        client = api.client
+        return (api.exchange_name, getattr(client, 'apiKey', None), bool(getattr(client, 'isSandboxModeEnabled', False)))
+
+    def _subscribe(self, api, key: tuple) -> tuple:
+        """
+        Keeps the account's balance pushes coming.
+
+        Returns:
+            tuple: (streamed, resubscribed): whether pushes keep the balance current,
+                and whether they come from a new stream, i.e. pushes may have been missed.
+        """
+        stream = get_order_streams().subscribe_balance(api, self, lambda balance: self._on_push(key, balance))
+        with self._lock:
+            previous = self._streams.get(key)
+            if stream is None:
+                self._streams.pop(key, None)
+            else:
+                self._streams[key] = stream
+        return stream is not None, stream is not None and stream is not previous
+
+    def _on_push(self, key: tuple, balance: dict):
+        # Runs on the stream thread. A push may only hold the currencies that changed
+        # (binanceusdm's ACCOUNT_UPDATE), so it is merged into the cached balance;
+        # ccxt keeps updating `balance` in place, so its values are copied.
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None:
+                # Nothing to merge into: the next get() fetches the complete balance
+                return
+            merged = _copy_balance(current.balance)
+            for currency, account in balance.items():
+                if currency in _BALANCE_FIELDS or not isinstance(account, dict):
+                    continue
+                merged[currency] = dict(account)
+                for field in ('free', 'used', 'total'):
+                    merged.setdefault(field, {})[currency] = account.get(field)
+            entry = _CachedBalance(merged, 'stream')
+            entry.applied_order_ids = current.applied_order_ids
+            self._entries[key] = entry
+
+    def refresh(self, api) -> _CachedBalance:
+        """Fetches the account's balance from REST; concurrent refreshes of one account share a single call."""
+        key = self._key(api)
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(key, threading.Lock())
+            started = time.time()
+        with refresh_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry.updated_at >= started:
+                # Refreshed (or pushed) while this call waited for the lock
+                return entry
+            entry = _CachedBalance(api.fetch_balance(), 'rest')
+            with self._lock:
+                self._entries[key] = entry
+            return entry
+
+    def get(self, api, force_refresh: bool = False) -> dict:
+        """
+        The account's balance (ccxt structure) plus a `staleness` field:
+        {"as_of": ms timestamp, "age_seconds", "source": 'rest'|'stream', "fills_applied"}.
+        """
+        key = self._key(api)
+        streamed, resubscribed = self._subscribe(api, key)
+        max_age = config.BALANCE_STREAM_REFRESH_SECONDS if streamed else config.BALANCE_REFRESH_SECONDS
+        with self._lock:
+            entry = self._entries.get(key)
+        if force_refresh or resubscribed or entry is None or time.time() - entry.updated_at > max_age:
+            entry = self.refresh(api)
+
+        with self._lock:
+            balance = _copy_balance(entry.balance)
+            balance['staleness'] = {
+                "as_of": int(entry.updated_at * 1000),
+                "age_seconds": round(time.time() - entry.updated_at, 3),
+                "source": entry.source,
+                "fills_applied": entry.fills_applied,
+            }
+        return balance
+
+    def apply_fill(self, api, order: dict):
+        """
+        Applies a filled order to the account's cached balance, until the next refresh replaces it.
+
+        Spot fills move the base and quote amounts; derivative fills only deduct
+        their fee, since their margin effect is only known to the exchange.
+        Fills the cached balance already includes (fetched or pushed after the
+        trade) and orders applied before are skipped.
+        """
+        key = self._key(api)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not order.get('filled'):
+            return
+        traded_at = order.get('lastTradeTimestamp') or order.get('timestamp') or 0
+        market = api.client.market(order['symbol'])
+
+        with self._lock:
+            if order.get('id') in entry.applied_order_ids or entry.updated_at * 1000 >= traded_at:
+                return
+            balance = entry.balance
+            if market.get('spot'):
+                sign = 1 if order['side'] == 'buy' else -1
+                cost = order.get('cost') or order['filled'] * (order.get('average') or 0)
+                _adjust(balance, market['base'], sign * order['filled'])
+                _adjust(balance, market['quote'], -sign * cost)
+            fee = order.get('fee') or {}
+            if fee.get('cost') and fee.get('currency'):
+                _adjust(balance, fee['currency'], -fee['cost'])
+            entry.applied_order_ids.add(order.get('id'))
+            entry.fills_applied += 1
+
+
+_balance_cache = None
+_balance_cache_lock = threading.Lock()
+
+
+def get_balance_cache() -> BalanceCache:
+    """Returns the process-wide balance cache."""
+    global _balance_cache
+    with _balance_cache_lock:
+        if _balance_cache is None:
+            _balance_cache = BalanceCache()
+    return _balance_cache
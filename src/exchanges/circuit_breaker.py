@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import ccxt
+import src.config as config
+
+
+class CircuitOpenError(ccxt.ExchangeNotAvailable):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+class EndpointBreaker:
+    """
+    Health of one endpoint on one exchange: recent latencies and a circuit.
+
+    closed: calls go through. `BREAKER_FAILURE_THRESHOLD` consecutive network
+        failures (timeouts, unavailability, rate limiting) open it.
+    open: calls fail immediately with `CircuitOpenError` for
+        `BREAKER_OPEN_SECONDS`, so tasks stop waiting on a sick venue.
+    half_open: after the cool-down a single probe call goes through; success
+        closes the circuit, failure opens it again. Other calls keep failing fast.
+
+    Exchange errors that are not network errors (invalid order, insufficient
+    funds, ...) mean the venue answered and count as successes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._latencies = deque(maxlen=config.BREAKER_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Admits or rejects a call.
+
+        Returns:
+            bool: True if the call is the half-open probe.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with a probe in flight.
+        """
+        with self._lock:
+            if self.state == 'open':
+                remaining = config.BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} is failing, circuit open for another {remaining:.1f}s.")
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} is being probed after failures.")
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency: float, probe: bool):
+        with self._lock:
+            self._latencies.append(latency)
+            self.consecutive_failures = 0
+            if probe:
+                self._probe_in_flight = False
+                self.state = 'closed'
+                print(f"✅ {self.name} recovered, circuit closed.")
+
+    def record_failure(self, probe: bool):
+        with self._lock:
+            self.consecutive_failures += 1
+            if probe:
+                self._probe_in_flight = False
+            if probe or (self.state == 'closed' and self.consecutive_failures >= config.BREAKER_FAILURE_THRESHOLD):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                print(f"⚠️ {self.name} failed {self.consecutive_failures} time(s) in a row, "
+                      f"circuit open for {config.BREAKER_OPEN_SECONDS}s.")
+
+    def latency_percentile(self, percentile: float) -> float | None:
+        """The given latency percentile in seconds, or None until enough calls have been seen."""
+        with self._lock:
+            if len(self._latencies) < config.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "rejected": self.rejected,
+                "samples": len(self._latencies),
+            }
+
+
+class CircuitBreakerRegistry:
+    """
+    Per-exchange, per-endpoint circuit breakers for the process, plus hedged
+    requests for idempotent reads.
+
+    A hedged read that has not answered within the endpoint's
+    `HEDGE_LATENCY_PERCENTILE` latency is sent a second time, and whichever
+    copy answers first wins. Only public reads may be hedged: a hedged order
+    would be placed twice, and hedged signed reads race on the account's nonces.
+    """
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=config.HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def breaker(self, scope: str, endpoint: str) -> EndpointBreaker:
+        key = (scope, endpoint)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = EndpointBreaker(f"{scope}.{endpoint}")
+            return self._breakers[key]
+
+    def call(self, scope: str, endpoint: str, fn, hedge: bool = False):
+        """
+        Calls `fn()` through the breaker of `scope` (an exchange) and `endpoint`.
+
+        Raises:
+            CircuitOpenError: Without calling `fn`, if the circuit is open.
+        """
+        breaker = self.breaker(scope, endpoint)
+        probe = breaker.before_call()
+        started = time.monotonic()
+        try:
+            # The half-open probe is never hedged: it should measure the venue, not add load to it
+            result = self._hedged(breaker, fn) if hedge and config.HEDGE_ENABLED and not probe else fn()
+        except ccxt.NetworkError:
+            breaker.record_failure(probe)
+            raise
+        except Exception:
+            breaker.record_success(time.monotonic() - started, probe)
+            raise
+        breaker.record_success(time.monotonic() - started, probe)
+        return result
+
+    def _hedged(self, breaker: EndpointBreaker, fn):
+        threshold = breaker.latency_percentile(config.HEDGE_LATENCY_PERCENTILE)
+        if threshold is None:
+            return fn()
+
+        primary = self._hedge_pool.submit(fn)
+        done, _ = wait([primary], timeout=max(threshold, config.HEDGE_MIN_DELAY_SECONDS))
+        if done:
+            return primary.result()
+
+        backup = self._hedge_pool.submit(fn)
+        with self._lock:
+            self.hedges_sent += 1
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return future.result()
+        # Both copies failed
+        return primary.result()
+
+    def health(self) -> dict:
+        """'<scope>.<endpoint>' -> breaker state, for logs and diagnostics."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+_circuit_breakers = None
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """Returns the process-wide circuit breaker registry."""
+    global _circuit_breakers
+    with _circuit_breakers_lock:
+        if _circuit_breakers is None:
+            _circuit_breakers = CircuitBreakerRegistry()
+    return _circuit_breakers
@@ -0,0 +1,127 @@
+import threading
+import src.config as config
+from src.exchanges.order_streams import get_order_streams
+from src.exchanges.funding_service import get_funding_service
+from src.exchanges.symbol_mapper import get_symbol_mapper
+from src.exchanges.unified_exchange import UnifiedExchangeAPI
+from src.utils.credential_store import CredentialStore
+
+# Authenticated clients for registered accounts, keyed by account handle.
+# Lives for the lifetime of the worker process, so markets and sessions are reused.
+_CLIENT_CACHE = {}
+# Held only to read or update the dicts, never while a client is built
+_cache_lock = threading.Lock()
+# account_id -> lock held while that handle's client is built
+_BUILD_LOCKS = {}
+_credential_store = None
+
+
+def get_credential_store() -> CredentialStore:
+    """Returns the process-wide credential store."""
+    global _credential_store
+    if _credential_store is None:
+        _credential_store = CredentialStore(config.CREDENTIAL_STORE_DIR, config.CREDENTIAL_STORE_KEY)
+    return _credential_store
+
+
+def resolve_account(request_data: dict) -> dict:
+    """
+    Resolves the account a request refers to.
+
+    Requests either reference a registered account through `account_id`, or
+    (for backwards compatibility) carry the credentials inline.
+
+    Returns:
+        dict: The account fields (account_name, exchange, api_key, api_secret, ...).
+
+    Raises:
+        ValueError: If the account handle is unknown or has expired.
+    """
+    account_id = request_data.get('account_id')
+    if not account_id:
+        return {
+            'account_name': request_data.get('account_name'),
+            'exchange': request_data.get('exchange'),
+            'api_key': request_data.get('api_key'),
+            'api_secret': request_data.get('api_secret'),
+            'password': request_data.get('password'),
+            'uid': request_data.get('uid'),
+            'is_testnet': request_data.get('is_testnet', False),
+        }
+
+    account = get_credential_store().load(account_id)
+    if account is None:
+        raise ValueError(f"Unknown or expired account handle '{account_id}'. Register the account again.")
+    return account
+
+
+def _build_client(account: dict) -> UnifiedExchangeAPI:
+    other_creds = {'uid': account['uid']} if account.get('uid') else {}
+    client = UnifiedExchangeAPI(
+        account_name=account.get('account_name'),
+        exchange_name=account.get('exchange'),
+        api_key=account.get('api_key'),
+        secret_key=account.get('api_secret'),
+        password=account.get('password'),
+        symbol_mapper=get_symbol_mapper(),
+        is_testnet=account.get('is_testnet', False),
+        **other_creds
+    )
+    # Reuse markets preloaded in this process instead of a `load_markets` round trip
+    # (testnet markets differ, so those clients still load their own)
+    if not account.get('is_testnet', False):
+        loaded = get_funding_service().loaded_markets(account.get('exchange'))
+        if loaded:
+            client.client.set_markets(*loaded)
+    return client
+
+
+def get_client(request_data: dict) -> UnifiedExchangeAPI:
+    """
+    Returns an authenticated client for the account a request refers to.
+
+    Clients for registered accounts are cached per handle and reused across
+    tasks in this worker process. Inline credentials always get a fresh client.
+
+    Clients are built outside the cache lock (construction may load markets
+    over the network); concurrent requests for the same handle wait for one
+    build, while other handles are not held up by a slow venue.
+    """
+    account_id = request_data.get('account_id')
+    if not account_id:
+        return _build_client(resolve_account(request_data))
+
+    store = get_credential_store()
+    with _cache_lock:
+        client = _CLIENT_CACHE.get(account_id)
+    if client is not None:
+        if store.exists(account_id):
+            return client
+        # The session that registered this account has ended: drop its client and stream
+        with _cache_lock:
+            if _CLIENT_CACHE.get(account_id) is client:
+                del _CLIENT_CACHE[account_id]
+        get_order_streams().release(client)
+        raise ValueError(f"Unknown or expired account handle '{account_id}'. Register the account again.")
+
+    with _cache_lock:
+        build_lock = _BUILD_LOCKS.setdefault(account_id, threading.Lock())
+    with build_lock:
+        with _cache_lock:
+            client = _CLIENT_CACHE.get(account_id)
+        if client is not None:
+            # Built by the request this one waited for
+            return client
+        try:
+            client = _build_client(resolve_account(request_data))
+            with _cache_lock:
+                _CLIENT_CACHE[account_id] = client
+        finally:
+            with _cache_lock:
+                if _BUILD_LOCKS.get(account_id) is build_lock:
+                    del _BUILD_LOCKS[account_id]
+    print(f"Cached authenticated client for account handle {account_id}.")
+
+    # Subscribe before the first order is placed, so its fill arrives on the stream
+    get_order_streams().ensure_stream(client)
+    return client
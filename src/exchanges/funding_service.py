@@ -0,0 +1,217 @@
+import re
+import threading
+import time
+import ccxt
+from concurrent.futures import ThreadPoolExecutor
+import src.config as config
+
+DEFAULT_FUNDING_INTERVAL_HOURS = 8
+
+def funding_intervals_per_day(funding: dict, market: dict = None) -> float:
+    """
+    Number of funding payments per day, from ccxt's funding `interval` (e.g., '8h'),
+    else the market's `fundingInterval` in ms, else every 8 hours.
+    """
+    match = re.fullmatch(r'(\d+)([hm])', str(funding.get('interval') or ''))
+    if match:
+        hours = int(match.group(1)) / (60 if match.group(2) == 'm' else 1)
+        return 24 / hours
+    interval_ms = (market or {}).get('fundingInterval')
+    if interval_ms:
+        return 24 * 60 * 60 * 1000 / interval_ms
+    return 24 / DEFAULT_FUNDING_INTERVAL_HOURS
+
+
+def funding_summary(symbol: str, funding: dict, market: dict = None) -> dict:
+    """Formats a ccxt funding rate structure as returned by `get_funding_rate_info`."""
+    rate = funding.get('fundingRate') or 0
+    return {
+        "status": "success",
+        "symbol": symbol,
+        "funding_rate": funding.get('fundingRate'),
+        "funding_timestamp": funding.get('fundingTimestamp'),
+        "predicted_rate": funding.get('nextFundingRate'),  # Only some exchanges provide this
+        "mark_price": funding.get('markPrice'),
+        "estimated_apr": rate * funding_intervals_per_day(funding, market) * 365 * 100,  # As a percentage
+    }
+
+
+class FundingRateService:
+    """
+    Caches funding rates per exchange.
+
+    A miss refreshes the whole exchange with one `fetch_funding_rates` call when
+    the exchange supports it (falling back to concurrent `fetch_funding_rate`
+    calls for just the requested symbols). Each rate is kept until its next
+    funding timestamp, capped at `FUNDING_CACHE_MAX_TTL_SECONDS`, so refreshes
+    follow the funding schedule instead of every request. Concurrent misses for
+    the same exchange wait for a single refresh.
+    """
+
+    def __init__(self, max_ttl_seconds: float = None):
+        self.max_ttl = max_ttl_seconds or config.FUNDING_CACHE_MAX_TTL_SECONDS
+        # cache key -> {symbol: (expires_at, funding)}
+        self._rates = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # Unauthenticated clients for comparisons that do not name an account
+        self._public_clients = {}
+
+    @staticmethod
+    def _cache_key(client) -> tuple:
+        # Testnet and production rates differ, so cache them separately
+        return client.id, bool(getattr(client, 'isSandboxModeEnabled', False))
+
+    def _lock(self, key: tuple) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _expires_at(self, funding: dict, now: float) -> float:
+        next_funding = funding.get('fundingTimestamp')
+        if next_funding and next_funding / 1000 > now:
+            return min(next_funding / 1000, now + self.max_ttl)
+        return now + self.max_ttl
+
+    def public_client(self, exchange_id: str):
+        """Returns a shared unauthenticated ccxt client with markets loaded."""
+        with self._locks_guard:
+            client = self._public_clients.get(exchange_id)
+            if client is None:
+                if not hasattr(ccxt, exchange_id):
+                    raise ValueError(f"Exchange '{exchange_id}' is not supported by ccxt.")
+                client = self._public_clients[exchange_id] = getattr(ccxt, exchange_id)()
+        client.load_markets()
+        return client
+
+    def loaded_markets(self, exchange_id: str) -> tuple | None:
+        """(markets, currencies) of the shared public client, if it has loaded them, without fetching."""
+        client = self._public_clients.get(exchange_id)
+        if client is None or not client.markets:
+            return None
+        return client.markets, client.currencies
+
+    def _fresh(self, key: tuple, symbols: list, now: float) -> dict:
+        cached = self._rates.get(key, {})
+        return {
+            symbol: cached[symbol][1] for symbol in symbols
+            if symbol in cached and cached[symbol][0] > now
+        }
+
+    def _refresh(self, client, key: tuple, symbols: list):
+        now = time.time()
+        if client.has.get('fetchFundingRates'):
+            try:
+                fetched = client.fetch_funding_rates()
+            except ccxt.ArgumentsRequired:
+                # Some exchanges only bulk-fetch an explicit list of symbols
+                fetched = client.fetch_funding_rates(symbols)
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(symbols), config.BATCH_ORDER_MAX_WORKERS)) as pool:
+                fetched = dict(zip(symbols, pool.map(client.fetch_funding_rate, symbols)))
+        cached = self._rates.setdefault(key, {})
+        for symbol, funding in fetched.items():
+            cached[symbol] = (self._expires_at(funding, now), funding)
+
+    def get_rates(self, client, symbols: list) -> dict:
+        """
+        Returns raw ccxt funding structures for swap symbols on one exchange.
+
+        Args:
+            client: A ccxt client for the exchange (an account's own client, or `public_client`).
+            symbols (list): ccxt unified swap symbols (e.g., ['BTC/USDT:USDT']).
+
+        Returns:
+            dict: symbol -> funding structure, for every symbol the exchange returned a rate for.
+        """
+        key = self._cache_key(client)
+        rates = self._fresh(key, symbols, time.time())
+        missing = [symbol for symbol in symbols if symbol not in rates]
+        if not missing:
+            return rates
+
+        with self._lock(key):
+            # Another thread may have refreshed while we waited
+            rates.update(self._fresh(key, missing, time.time()))
+            missing = [symbol for symbol in missing if symbol not in rates]
+            if missing:
+                self._refresh(client, key, missing)
+                rates.update(self._fresh(key, missing, time.time()))
+        return rates
+
+    def get_summaries(self, client, symbols: list) -> dict:
+        """Funding rate and estimated APR for many symbols at once (see `funding_summary`)."""
+        rates = self.get_rates(client, symbols)
+        return {
+            symbol: funding_summary(symbol, rates[symbol], client.markets.get(symbol)) if symbol in rates
+            else {"status": "error", "symbol": symbol, "message": "No funding rate returned by the exchange."}
+            for symbol in symbols
+        }
+
+    @staticmethod
+    def resolve_swap_symbol(client, symbol: str) -> str | None:
+        """
+        Finds the perpetual swap for a symbol: 'BTC/USDT:USDT' as given, or a
+        universal 'BTC/USDT' as its linear ('BTC/USDT:USDT') or inverse ('BTC/USD:BTC') perpetual.
+        """
+        candidates = [symbol]
+        if ':' not in symbol and '/' in symbol:
+            base, quote = symbol.split('/')
+            candidates += [f"{symbol}:{quote}", f"{base}/USD:{base}"]
+        for candidate in candidates:
+            market = client.markets.get(candidate)
+            if market and market.get('swap'):
+                return candidate
+        return None
+
+    def compare(self, symbols: list, exchange_ids: list) -> dict:
+        """
+        Compares funding across exchanges for universal symbols, using one bulk
+        fetch per exchange (run concurrently) and the shared cache.
+
+        Returns:
+            dict: {symbol: {"venues": {exchange_id: summary}, "max_apr": exchange_id,
+                "min_apr": exchange_id, "apr_spread": percent}}, the last three only when
+                at least one venue returned a rate.
+        """
+        def for_exchange(exchange_id: str) -> dict:
+            try:
+                client = self.public_client(exchange_id)
+                resolved = {symbol: self.resolve_swap_symbol(client, symbol) for symbol in symbols}
+                summaries = self.get_summaries(client, [s for s in resolved.values() if s])
+                return {
+                    symbol: summaries[swap] if swap
+                    else {"status": "info", "message": f"No perpetual swap for {symbol} on {exchange_id}."}
+                    for symbol, swap in resolved.items()
+                }
+            except Exception as e:
+                return {symbol: {"status": "error", "message": f"Could not fetch funding rates: {e}"} for symbol in symbols}
+
+        with ThreadPoolExecutor(max_workers=max(1, len(exchange_ids))) as pool:
+            per_exchange = dict(zip(exchange_ids, pool.map(for_exchange, exchange_ids)))
+
+        comparison = {}
+        for symbol in symbols:
+            venues = {exchange_id: per_exchange[exchange_id][symbol] for exchange_id in exchange_ids}
+            aprs = {
+                exchange_id: summary['estimated_apr'] for exchange_id, summary in venues.items()
+                if summary.get('status') == 'success'
+            }
+            entry = {"venues": venues}
+            if aprs:
+                highest, lowest = max(aprs, key=aprs.get), min(aprs, key=aprs.get)
+                entry.update(max_apr=highest, min_apr=lowest, apr_spread=aprs[highest] - aprs[lowest])
+            comparison[symbol] = entry
+        return comparison
+
+
+_funding_service = None
+_funding_service_lock = threading.Lock()
+
+
+def get_funding_service() -> FundingRateService:
+    """Returns the process-wide funding rate service."""
+    global _funding_service
+    with _funding_service_lock:
+        if _funding_service is None:
+            _funding_service = FundingRateService()
+    return _funding_service
@@ -0,0 +1,314 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+import ccxt
+import src.config as config
+
+FINAL_ORDER_STATUSES = ('closed', 'filled', 'canceled', 'rejected')
+
+
+class _OrderWaiter:
+    """A worker thread waiting for updates on one order."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.latest = None
+
+
+class _AccountStream:
+    """
+    One persistent private stream connection (ccxt pro) for one account,
+    running on the manager's event loop.
+
+    `watch_orders` runs from the start: every update wakes the threads
+    waiting on that order and is remembered briefly, so an update that arrives
+    before anyone waits for it is not lost. `watch_balance` runs once a
+    balance listener is added (see `OrderStreamManager.subscribe_balance`).
+
+    `last_used` tells the manager when the stream was last asked for, so
+    streams of accounts nobody trades anymore can be closed.
+    """
+
+    def __init__(self, exchange_id: str, credentials: dict, sandbox: bool, loop: asyncio.AbstractEventLoop):
+        self.exchange_id = exchange_id
+        self.connected = threading.Event()
+        self.errors = 0
+        self._credentials = credentials
+        self._sandbox = sandbox
+        self._loop = loop
+        self._client = None
+        self._waiters = {}  # order_id -> set of _OrderWaiter
+        self._recent = OrderedDict()  # order_id -> latest order, bounded
+        self._balance_listeners = {}  # token -> listener
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self._futures = [asyncio.run_coroutine_threadsafe(self._watch(self._on_orders, 'watch_orders', 'watchOrders'), loop)]
+
+    def _dispatch(self, order: dict):
+        order_id = str(order.get('id'))
+        with self._lock:
+            self._recent[order_id] = order
+            self._recent.move_to_end(order_id)
+            while len(self._recent) > config.ORDER_STREAM_CACHE_SIZE:
+                self._recent.popitem(last=False)
+            for waiter in self._waiters.get(order_id, ()):
+                waiter.latest = order
+                waiter.event.set()
+
+    def _on_orders(self, orders: list):
+        for order in orders:
+            self._dispatch(order)
+
+    def _on_balance(self, balance: dict):
+        with self._lock:
+            listeners = list(self._balance_listeners.values())
+        for listener in listeners:
+            listener(balance)
+
+    def _get_client(self):
+        # Only called on the stream's event loop, so no locking is needed
+        if self._client is None:
+            import ccxt.pro as ccxtpro
+            self._client = getattr(ccxtpro, self.exchange_id)(self._credentials)
+            if self._sandbox:
+                self._client.set_sandbox_mode(True)
+        return self._client
+
+    async def _watch(self, handle, method: str, feature: str):
+        client = self._get_client()
+        if not client.has.get(feature):
+            print(f"⚠️ {self.exchange_id} has no {method} stream.")
+            return
+        backoff = 1.0
+        while True:
+            try:
+                # The first call subscribes; it resolves on the first update after that
+                self.connected.set()
+                update = await getattr(client, method)()
+                backoff = 1.0
+                handle(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Waiters keep their safety polls while the stream reconnects
+                self.errors += 1
+                self.connected.clear()
+                print(f"⚠️ {method} stream for {self.exchange_id} failed ({e}), reconnecting in {backoff:.0f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, config.ORDER_STREAM_MAX_BACKOFF_SECONDS)
+
+    def add_balance_listener(self, token, listener):
+        """Calls `listener(balance)` (on the stream's thread) for every balance push; once per `token`."""
+        with self._lock:
+            if token in self._balance_listeners:
+                return
+            first = not self._balance_listeners
+            self._balance_listeners[token] = listener
+        if first:
+            self._futures.append(asyncio.run_coroutine_threadsafe(
+                self._watch(self._on_balance, 'watch_balance', 'watchBalance'), self._loop
+            ))
+
+    def add_waiter(self, order_id: str) -> _OrderWaiter:
+        waiter = _OrderWaiter()
+        with self._lock:
+            self._waiters.setdefault(order_id, set()).add(waiter)
+            if order_id in self._recent:
+                waiter.latest = self._recent[order_id]
+                waiter.event.set()
+        return waiter
+
+    def remove_waiter(self, order_id: str, waiter: _OrderWaiter):
+        with self._lock:
+            waiters = self._waiters.get(order_id)
+            if waiters:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[order_id]
+
+    def idle_seconds(self) -> float:
+        """Seconds since the stream was last asked for; 0 while a thread waits on one of its orders."""
+        with self._lock:
+            if self._waiters:
+                return 0.0
+        return time.monotonic() - self.last_used
+
+    def cancel(self):
+        """Stops the watches, closes the websocket and forgets the credentials."""
+        for future in self._futures:
+            future.cancel()
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop)
+        self._credentials = None
+        with self._lock:
+            self._balance_listeners.clear()
+
+
+class OrderStreamManager:
+    """
+    Push-based order tracking for the worker process.
+
+    Keeps one private order stream per account (ccxt pro `watch_orders`) on a
+    background event loop thread, shared by every task in the process. Threads
+    waiting on an order are woken directly by the stream, so a fill reaches
+    `monitor_order` as soon as the exchange reports it, instead of on the next
+    `fetch_order` poll. A slow REST safety poll (`ORDER_STREAM_SAFETY_POLL_SECONDS`)
+    covers updates sent before the stream subscribed and stream outages.
+
+    Exchanges not listed in `ORDER_STREAM_EXCHANGES`, or clients that are not
+    ccxt exchanges (e.g. simulated ones), are not streamed; callers poll instead.
+
+    A stream holds the account's credentials and an authenticated connection,
+    so it is closed when its account handle expires (`release`) or after
+    `ORDER_STREAM_IDLE_SECONDS` without use; the next use opens a new one.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='order-streams', daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._close_idle_streams(), self._loop)
+        return self._loop
+
+    async def _close_idle_streams(self):
+        while True:
+            await asyncio.sleep(config.ORDER_STREAM_IDLE_CHECK_SECONDS)
+            with self._lock:
+                idle = [key for key, stream in self._streams.items()
+                        if stream.idle_seconds() > config.ORDER_STREAM_IDLE_SECONDS]
+                streams = [self._streams.pop(key) for key in idle]
+            for stream in streams:
+                stream.cancel()
+                print(f"Closed idle private order stream on {stream.exchange_id}.")
+
+    @staticmethod
+    def _key(api) -> tuple:
+        client = api.client
+        return (api.exchange_name, client.apiKey, bool(getattr(client, 'isSandboxModeEnabled', False)))
+
+    @staticmethod
+    def supports(api) -> bool:
+        """True if orders on this `UnifiedExchangeAPI` can be tracked through a private stream."""
+        return (
+            config.ORDER_STREAMS_ENABLED
+            and api.exchange_name in config.ORDER_STREAM_EXCHANGES
+            and isinstance(api.client, ccxt.Exchange)
+            and bool(api.client.apiKey)
+        )
+
+    def ensure_stream(self, api) -> _AccountStream | None:
+        """Starts (once) and returns the account's order stream, or None if it cannot be streamed."""
+        if not self.supports(api):
+            return None
+        client = api.client
+        key = self._key(api)
+        sandbox = key[2]
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                credentials = {'apiKey': client.apiKey, 'secret': client.secret}
+                if client.password:
+                    credentials['password'] = client.password
+                if client.uid:
+                    credentials['uid'] = client.uid
+                stream = self._streams[key] = _AccountStream(api.exchange_name, credentials, sandbox, self._ensure_loop())
+                print(f"✅ Started private order stream for {api.account_name} on {api.exchange_name}.")
+            stream.last_used = time.monotonic()
+        return stream
+
+    def release(self, api):
+        """Closes the account's stream, e.g. once the session that registered it has ended."""
+        if not self.supports(api):
+            return
+        with self._lock:
+            stream = self._streams.pop(self._key(api), None)
+        if stream is not None:
+            stream.cancel()
+            print(f"Closed private order stream for {api.account_name} on {api.exchange_name}.")
+
+    def subscribe_balance(self, api, token, listener) -> _AccountStream | None:
+        """
+        Pushes the account's balance to `listener(balance)` whenever the exchange
+        sends it. Subscribing again with the same `token` only keeps the stream in use.
+
+        Returns:
+            _AccountStream | None: The stream delivering the pushes (a different
+                one after the previous stream was closed), or None if the account
+                cannot be streamed.
+        """
+        stream = self.ensure_stream(api)
+        if stream is None:
+            return None
+        stream.add_balance_listener(token, listener)
+        return stream
+
+    def wait_for_order(self, api, order_id: str, exchange_symbol: str, timeout: float) -> dict | None:
+        """
+        Blocks until the order reaches a final state, woken by the account's stream.
+
+        Returns:
+            dict | None: The final order, an error dict on timeout or failure, or None
+                if the account cannot be streamed (the caller should poll).
+        """
+        stream = self.ensure_stream(api)
+        if stream is None:
+            return None
+
+        def poll(current: dict) -> dict:
+            # Through the account's breaker, like the polling path. Network failures (an open
+            # circuit included) are not fatal here: the stream may still deliver the update.
+            try:
+                return api._guarded('fetch_order', api.client.fetch_order, order_id, exchange_symbol)
+            except ccxt.NetworkError as e:
+                print(f"⚠️ Safety poll for order {order_id} failed, waiting on the stream: {e}")
+                return current
+
+        order_id = str(order_id)
+        waiter = stream.add_waiter(order_id)
+        deadline = time.monotonic() + timeout
+        try:
+            # Catches updates sent before the stream subscribed, e.g. an instant market fill
+            order = poll({})
+            while order.get('status') not in FINAL_ORDER_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"Monitoring for order {order_id} timed out.")
+                    return {"status": "error", "message": "Monitoring timed out"}
+
+                if waiter.event.wait(min(remaining, config.ORDER_STREAM_SAFETY_POLL_SECONDS)):
+                    waiter.event.clear()
+                    order = waiter.latest
+                else:
+                    order = poll(order)
+            print(f"Order {order_id} has reached a final state: {order.get('status')}")
+            return order
+        except Exception as e:
+            print(f"Error monitoring order {order_id}: {e}")
+            return {"status": "error", "message": str(e)}
+        finally:
+            stream.remove_waiter(order_id, waiter)
+
+    def close(self):
+        with self._lock:
+            for stream in self._streams.values():
+                stream.cancel()
+            self._streams.clear()
+
+
+_order_streams = None
+_order_streams_lock = threading.Lock()
+
+
+def get_order_streams() -> OrderStreamManager:
+    """Returns the process-wide order stream manager."""
+    global _order_streams
+    with _order_streams_lock:
+        if _order_streams is None:
+            _order_streams = OrderStreamManager()
+    return _order_streams
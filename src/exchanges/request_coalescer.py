@@ -0,0 +1,130 @@
+import threading
+import time
+import ccxt
+import src.config as config
+
+
+class _Flight:
+    """One exchange call in progress, shared by every caller that asked for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    Single-flight coalescing with a micro-TTL cache for public ccxt calls.
+
+    Identical calls (same exchange, sandbox mode, method and arguments) that
+    overlap in time are merged: the first caller makes the request and every
+    other caller waits for its result instead of sending its own. Results are
+    then served from memory for a short time (`COALESCE_TTL_SECONDS` per method,
+    or the caller's `max_age`), so a burst of tasks asking for the same book or
+    ticker costs the exchange one request.
+
+    The key does not include credentials, so only public endpoints may go
+    through here. Results are shared between callers and must not be mutated.
+    Errors are passed to every waiter of that call but never cached.
+
+    Clients that are not ccxt exchanges (e.g. simulated ones in backtests, whose
+    clock is not wall time) are called directly.
+    """
+
+    def __init__(self, ttls: dict = None, max_entries: int = None):
+        self.ttls = config.COALESCE_TTL_SECONDS if ttls is None else ttls
+        self.max_entries = max_entries or config.COALESCE_MAX_ENTRIES
+        self._cache = {}    # key -> (fetched_at, result)
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'wait_timeouts': 0}
+
+    @staticmethod
+    def _key(client, method: str, args: tuple, kwargs: dict) -> tuple:
+        sandbox = bool(getattr(client, 'isSandboxModeEnabled', False))
+        return (client.id, sandbox, method, args, tuple(sorted(kwargs.items())))
+
+    def _evict(self, now: float):
+        # Called with the lock held once the cache grows past max_entries
+        longest_ttl = max(self.ttls.values(), default=0.0)
+        for key in [key for key, (fetched_at, _) in self._cache.items() if now - fetched_at > longest_ttl]:
+            del self._cache[key]
+
+    def call(self, client, method: str, *args, max_age: float = None, guard=None, **kwargs):
+        """
+        Calls `client.<method>(*args, **kwargs)` through the coalescer.
+
+        Args:
+            max_age (float): Maximum age in seconds of a cached result that may be served.
+                None uses the method's micro-TTL; 0 only joins a call already in flight.
+            guard (callable): Wraps the actual exchange call, e.g. in a circuit breaker:
+                `guard(fetch)` must call `fetch()` and return its result.
+        """
+        def fetch():
+            return getattr(client, method)(*args, **kwargs)
+
+        if not isinstance(client, ccxt.Exchange):
+            return fetch()
+
+        max_age = self.ttls.get(method, 0.0) if max_age is None else max_age
+        try:
+            key = self._key(client, method, args, kwargs)
+            hash(key)
+        except TypeError:
+            # Unhashable arguments (e.g. a params dict) cannot be matched, so are not coalesced
+            return guard(fetch) if guard else fetch()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and max_age > 0 and time.monotonic() - cached[0] <= max_age:
+                self.stats['cache_hits'] += 1
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats['requests'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            # Bounded by the client's own request timeout, so a hung leader cannot hang its followers
+            if not flight.done.wait(client.timeout / 1000 + config.COALESCE_WAIT_MARGIN_SECONDS):
+                with self._lock:
+                    self.stats['wait_timeouts'] += 1
+                return guard(fetch) if guard else fetch()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        completed = False
+        try:
+            flight.result = guard(fetch) if guard else fetch()
+            completed = True
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                now = time.monotonic()
+                # Only a fetch that returned normally is cached
+                if completed:
+                    self._cache[key] = (now, flight.result)
+                    if len(self._cache) > self.max_entries:
+                        self._evict(now)
+                del self._flights[key]
+            flight.done.set()
+
+
+_request_coalescer = None
+_request_coalescer_lock = threading.Lock()
+
+
+def get_request_coalescer() -> RequestCoalescer:
+    """Returns the process-wide coalescer for public exchange calls."""
+    global _request_coalescer
+    with _request_coalescer_lock:
+        if _request_coalescer is None:
+            _request_coalescer = RequestCoalescer()
+    return _request_coalescer
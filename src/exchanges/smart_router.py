@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor
+import src.config as config
+from src.exchanges.unified_exchange import UnifiedExchangeAPI
+
+class SmartOrderRouter:
+    """
+    Splits one order for a universal symbol across several exchange accounts.
+
+    The router fetches the book for the symbol on every account in parallel,
+    merges the relevant sides into one consolidated ladder and fills the
+    requested quote volume from the best levels first. Because every level is
+    consumed in price order, the resulting split buys the most base (or
+    receives the most quote) for the requested size, i.e. it minimizes the
+    total price impact across venues. Child orders are then executed concurrently.
+    """
+
+    def __init__(self, clients: list, book_max_age: float = None):
+        """
+        Initializes the router.
+
+        Args:
+            clients (list): `UnifiedExchangeAPI` instances, one per account to route across.
+            book_max_age (float): Reuse order books fetched within this many seconds
+                (defaults to `config.ROUTER_BOOK_MAX_AGE_SECONDS`).
+        """
+        if not clients:
+            raise ValueError("SmartOrderRouter needs at least one exchange client.")
+        self.clients = clients
+        self._clients_by_venue = {}
+        for client in clients:
+            venue = self.venue(client)
+            if venue in self._clients_by_venue:
+                raise ValueError(f"Two accounts route as '{venue}'; give them distinct account names.")
+            self._clients_by_venue[venue] = client
+        self.book_max_age = config.ROUTER_BOOK_MAX_AGE_SECONDS if book_max_age is None else book_max_age
+
+    @staticmethod
+    def venue(client: UnifiedExchangeAPI) -> str:
+        """The name a client's account is routed under: '<account_name>@<exchange>[:sandbox]'."""
+        return client.account_key
+
+    def _fetch_book(self, client: UnifiedExchangeAPI, symbol: str) -> dict:
+        if not client.symbol_mapper.to_exchange_specific(symbol, client.exchange_name):
+            return {"status": "error", "message": f"'{symbol}' is not listed on {client.exchange_name}"}
+        try:
+            book = client.fetch_order_book(symbol, limit=config.ROUTER_BOOK_DEPTH, max_age=self.book_max_age)
+            return {"status": "success", "book": book}
+        except Exception as e:
+            return {"status": "error", "message": f"Could not fetch order book: {e}"}
+
+    def fetch_books(self, symbol: str) -> dict:
+        """
+        Fetches (or reuses cached) order books for a symbol on every venue in parallel.
+
+        Returns:
+            dict: venue -> {'status': 'success', 'book': {...}} or {'status': 'error', 'message': ...}
+        """
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as pool:
+            results = pool.map(lambda c: self._fetch_book(c, symbol), self.clients)
+            return {self.venue(c): r for c, r in zip(self.clients, results)}
+
+    def consolidate(self, books: dict, side: str) -> list:
+        """
+        Merges one side of several books into a single ladder.
+
+        The ladder is sorted by fee-adjusted price, best first: ascending asks
+        for a buy, descending bids for a sell.
+
+        Returns:
+            list: (effective_price, price, quantity, venue) tuples.
+        """
+        venue_exchanges = {self.venue(c): c.exchange_name for c in self.clients}
+        ladder = []
+        for venue, book in books.items():
+            fee = config.ROUTER_TAKER_FEES.get(venue_exchanges[venue], 0.0)
+            levels = book['asks'] if side == 'buy' else book['bids']
+            for price, quantity, *_ in levels:
+                effective_price = price * (1 + fee) if side == 'buy' else price * (1 - fee)
+                ladder.append((effective_price, price, quantity, venue))
+        ladder.sort(key=lambda level: level[0], reverse=(side == 'sell'))
+        return ladder
+
+    def _allocate(self, ladder: list, trade_volume_quote: float, excluded: set) -> tuple:
+        """Greedily fills the quote volume from the consolidated ladder."""
+        allocations = {}
+        remaining = trade_volume_quote
+        for _, price, quantity, venue in ladder:
+            if remaining <= 0:
+                break
+            if venue in excluded:
+                continue
+            take_quote = min(price * quantity, remaining)
+            alloc = allocations.setdefault(venue, {"base_quantity": 0.0, "quote_volume": 0.0})
+            alloc["base_quantity"] += take_quote / price
+            alloc["quote_volume"] += take_quote
+            remaining -= take_quote
+        return allocations, remaining
+
+    def _order_amount(self, venue: str, symbol: str, base_quantity: float) -> float:
+        """Converts a base quantity into the venue's order amount (contracts for derivatives)."""
+        market = self._clients_by_venue[venue].client.market(symbol)
+        contract_size = market.get('contractSize') if market.get('contract') else None
+        return base_quantity / (contract_size or 1.0)
+
+    def _below_minimum(self, venue: str, symbol: str, base_quantity: float) -> bool:
+        market = self._clients_by_venue[venue].client.market(symbol)
+        min_amount = ((market.get('limits') or {}).get('amount') or {}).get('min')
+        return bool(min_amount) and self._order_amount(venue, symbol, base_quantity) < min_amount
+
+    def compute_split(self, symbol: str, side: str, trade_volume_quote: float) -> dict:
+        """
+        Computes the impact-minimizing split of a quote volume across venues.
+
+        Venues whose share would fall below the exchange's minimum order size are
+        dropped and the volume is re-allocated to the remaining venues.
+
+        Args:
+            symbol (str): The universal symbol (e.g., 'BTC/USDT:USDT').
+            side (str): 'buy' or 'sell'.
+            trade_volume_quote (float): The total trade amount in the quote currency.
+
+        Returns:
+            dict: The routing plan, with per-venue child orders and the consolidated impact.
+        """
+        books = self.fetch_books(symbol)
+        usable = {venue: r['book'] for venue, r in books.items()
+                  if r['status'] == 'success' and r['book'].get('bids') and r['book'].get('asks')}
+        skipped = {venue: r.get('message', 'Empty order book') for venue, r in books.items() if venue not in usable}
+        if not usable:
+            return {"status": "error", "message": "No venue returned a usable order book.", "skipped_venues": skipped}
+
+        ladder = self.consolidate(usable, side)
+
+        excluded = set()
+        while True:
+            allocations, unfilled = self._allocate(ladder, trade_volume_quote, excluded)
+            too_small = {venue for venue, alloc in allocations.items()
+                         if self._below_minimum(venue, symbol, alloc["base_quantity"])}
+            if not too_small:
+                break
+            excluded |= too_small
+            for venue in too_small:
+                skipped[venue] = "Allocation below the exchange's minimum order size"
+
+        if unfilled > 1e-9 * trade_volume_quote or not allocations:
+            return {"status": "error", "message": "Insufficient consolidated liquidity to fill the entire trade volume.",
+                    "skipped_venues": skipped}
+
+        best_bid = max(book['bids'][0][0] for book in usable.values())
+        best_ask = min(book['asks'][0][0] for book in usable.values())
+        consolidated_mid = (best_bid + best_ask) / 2
+
+        total_base = sum(a["base_quantity"] for a in allocations.values())
+        avg_exec_price = trade_volume_quote / total_base
+        children = []
+        for venue, alloc in allocations.items():
+            client = self._clients_by_venue[venue]
+            children.append({
+                "venue": venue,
+                "exchange": client.exchange_name,
+                "account_name": client.account_name,
+                "symbol": symbol,
+                "side": side,
+                "base_quantity": alloc["base_quantity"],
+                "amount": float(client.client.amount_to_precision(
+                    symbol, self._order_amount(venue, symbol, alloc["base_quantity"])
+                )),
+                "quote_volume": alloc["quote_volume"],
+                "avg_execution_price": alloc["quote_volume"] / alloc["base_quantity"],
+            })
+
+        return {
+            "status": "success",
+            "symbol": symbol,
+            "side": side,
+            "trade_volume_quote": trade_volume_quote,
+            "consolidated_mid_price": consolidated_mid,
+            "avg_execution_price": avg_exec_price,
+            "price_impact_percent": ((avg_exec_price - consolidated_mid) / consolidated_mid) * 100,
+            "base_quantity_filled": total_base,
+            "children": children,
+            "skipped_venues": skipped,
+        }
+
+    def _execute_child(self, child: dict) -> dict:
+        client = self._clients_by_venue[child["venue"]]
+        try:
+            initial = client.place_market_order(child["symbol"], child["side"], child["amount"])
+            final_order = client.monitor_order(initial['id'], child["symbol"])
+            return {**child, "status": final_order.get('status'), "order": final_order}
+        except Exception as e:
+            return {**child, "status": "error", "order": None, "message": str(e)}
+
+    def execute(self, plan: dict) -> list:
+        """
+        Places the child orders of a routing plan concurrently and waits for their final state.
+
+        Returns:
+            list: The plan's children, each extended with 'status' and the final 'order'.
+        """
+        children = plan.get("children", [])
+        if not children:
+            return []
+        with ThreadPoolExecutor(max_workers=len(children)) as pool:
+            return list(pool.map(self._execute_child, children))
@@ -3,6 +3,19 @@ import json
 import os
 import re
 import time
+from bisect import bisect_left
+import src.config as config
+
+_SEPARATORS = re.compile(r'[^A-Z0-9:]')
+
+def canonical_key(symbol: str) -> str:
+    """
+    Case- and separator-insensitive form of a symbol that keeps the settle part:
+    'BTC/USDT', 'btc-usdt' and 'BTCUSDT' -> 'BTCUSDT'; 'BTC/USDT:USDT' -> 'BTCUSDT:USDT'.
+    """
+    pair, _, settle = symbol.upper().partition(':')
+    key = _SEPARATORS.sub('', pair)
+    return f"{key}:{_SEPARATORS.sub('', settle)}" if settle else key
 
 class SymbolMapper:
     """
@@ -24,6 +37,77 @@ class SymbolMapper:
         self.cache_filename = cache_filename
         self.cache_ttl = cache_ttl_seconds
         self.markets = self._load_or_fetch_markets()
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Precomputes, per exchange, the lookups behind `resolve` and `search`:
+        canonical key -> symbol, spot-style pair key -> perpetual swap (so
+        'BTCUSDT' finds 'BTC/USDT:USDT' on derivatives-only exchanges),
+        canonical market id -> symbol, id -> symbol, and the sorted keys for prefix search.
+        """
+        self._by_key, self._perpetuals, self._by_id_key, self._by_id, self._sorted_keys = {}, {}, {}, {}, {}
+        for exchange_id, markets in self.markets.items():
+            by_key, perpetuals, by_id_key, by_id = {}, {}, {}, {}
+            for symbol, market_id in markets.items():
+                key = canonical_key(symbol)
+                by_key[key] = symbol
+                pair_key, _, settle = key.partition(':')
+                # Linear/inverse perpetuals have a settle currency but no expiry ('BTC/USDT:USDT')
+                if settle and '-' not in symbol.partition(':')[2]:
+                    perpetuals.setdefault(pair_key, symbol)
+                by_id_key.setdefault(canonical_key(market_id), symbol)
+                by_id[market_id] = symbol
+            self._by_key[exchange_id] = by_key
+            self._perpetuals[exchange_id] = perpetuals
+            self._by_id_key[exchange_id] = by_id_key
+            self._by_id[exchange_id] = by_id
+            self._sorted_keys[exchange_id] = sorted(by_key)
+
+    def resolve_exchange(self, exchange_id: str) -> str | None:
+        """The exchange ID the market data is stored under, following `SYMBOL_EXCHANGE_ALIASES` (e.g. 'binance' -> 'binanceusdm')."""
+        if exchange_id in self.markets:
+            return exchange_id
+        alias = config.SYMBOL_EXCHANGE_ALIASES.get(exchange_id)
+        return alias if alias in self.markets else None
+
+    def resolve(self, symbol: str, exchange_id: str) -> str | None:
+        """
+        Resolves any spelling of a symbol to the exchange's unified ccxt symbol.
+
+        Tries, in order: the canonical key ('btc-usdt' -> 'BTC/USDT'), the
+        perpetual swap for a pair given without settle currency ('BTCUSDT' ->
+        'BTC/USDT:USDT' where there is no spot market), and the exchange's own
+        market id ('BTCUSD_PERP'). Every step is a dict lookup.
+
+        Returns:
+            str | None: The unified symbol, or None if the exchange has no such market.
+        """
+        exchange_id = self.resolve_exchange(exchange_id)
+        if exchange_id is None or not symbol:
+            return None
+        key = canonical_key(symbol)
+        resolved = self._by_key[exchange_id].get(key)
+        if resolved is None and ':' not in key:
+            resolved = self._perpetuals[exchange_id].get(key)
+        if resolved is None:
+            resolved = self._by_id_key[exchange_id].get(key)
+        return resolved
+
+    def search(self, prefix: str, exchange_id: str, limit: int = 20) -> list:
+        """Unified symbols whose canonical key starts with `prefix`'s, in key order (for autocomplete)."""
+        exchange_id = self.resolve_exchange(exchange_id)
+        if exchange_id is None:
+            return []
+        prefix = canonical_key(prefix)
+        keys = self._sorted_keys[exchange_id]
+        by_key = self._by_key[exchange_id]
+        results = []
+        for i in range(bisect_left(keys, prefix), len(keys)):
+            if len(results) >= limit or not keys[i].startswith(prefix):
+                break
+            results.append(by_key[keys[i]])
+        return results
 
     def _is_cache_valid(self) -> bool:
         """Checks if the cache file exists and is not expired."""
@@ -73,21 +157,23 @@ class SymbolMapper:
     
     def to_exchange_specific(self, universal_symbol: str, exchange_id: str) -> str | None:
         """
-        Converts a universal symbol (e.g., 'BTC/USDT') to the format required
-        by a specific exchange.
+        Converts a universal symbol (e.g., 'BTC/USDT', 'btc-usdt' or 'BTCUSDT')
+        to the format required by a specific exchange (see `resolve`).
 
         Args:
-            universal_symbol (str): The standardized symbol.
-            exchange_id (str): The ID of the target exchange (e.g., 'binance').
+            universal_symbol (str): The symbol, in any supported spelling.
+            exchange_id (str): The ID of the target exchange (e.g., 'binanceusdm', or an alias like 'binance').
 
         Returns:
             str | None: The exchange-specific symbol ID or None if not found.
         """
-        if exchange_id not in self.markets:
+        resolved_exchange = self.resolve_exchange(exchange_id)
+        if resolved_exchange is None:
             print(f"Error: Exchange '{exchange_id}' not found in market data.")
             return None
-            
-        return self.markets[exchange_id].get(universal_symbol)
+
+        symbol = self.resolve(universal_symbol, resolved_exchange)
+        return self.markets[resolved_exchange][symbol] if symbol else None
     
     def to_universal(self, exchange_symbol_id: str, exchange_id: str) -> str | None:
         """
@@ -100,13 +186,24 @@ class SymbolMapper:
         Returns:
             str | None: The universal symbol or None if not found.
         """
-        if exchange_id not in self.markets:
+        exchange_id = self.resolve_exchange(exchange_id)
+        if exchange_id is None:
             return None
-        
-        # This creates a reverse mapping on-the-fly to find the universal symbol
-        reverse_map = {v: k for k, v in self.markets[exchange_id].items()}
-        return reverse_map.get(exchange_symbol_id)
+        return self._by_id[exchange_id].get(exchange_symbol_id)
     
+_symbol_mapper = None
+
+
+def get_symbol_mapper() -> SymbolMapper:
+    """
+    Returns the process-wide symbol mapper. Loaded once (in the worker parent
+    when preloading), instead of re-reading the market cache for every client.
+    """
+    global _symbol_mapper
+    if _symbol_mapper is None:
+        _symbol_mapper = SymbolMapper()
+    return _symbol_mapper
+
 # --- Standalone script to generate the cache ---
 if __name__ == '__main__':
     print("Running SymbolMapper in standalone mode to generate the market data cache.")
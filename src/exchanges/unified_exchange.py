@@ -1,12 +1,102 @@
 
 import ccxt
+import hashlib
 import time 
+from concurrent.futures import ThreadPoolExecutor, wait
+import src.config as config
+from src.exchanges.balance_cache import get_balance_cache
+from src.exchanges.circuit_breaker import get_circuit_breakers
+from src.exchanges.funding_service import get_funding_service
+from src.exchanges.order_streams import FINAL_ORDER_STATUSES, get_order_streams
+from src.exchanges.request_coalescer import get_request_coalescer
 from src.exchanges.symbol_mapper import SymbolMapper
 
 # api credentials
 
 
 
+def walk_order_book(order_book: dict, side: str, trade_volume_quote: float) -> dict:
+    """
+    Calculates the average execution price and price impact of a trade
+    by walking one side of an order book.
+
+    Args:
+        order_book (dict): A ccxt order book with sorted 'bids' and 'asks'.
+        side (str): 'buy' (walks the asks) or 'sell' (walks the bids).
+        trade_volume_quote (float): The trade amount in the quote currency (e.g., USDT).
+    """
+    book_side = order_book['asks'] if side == 'buy' else order_book['bids']
+    
+    mid_price = (order_book['bids'][0][0] + order_book['asks'][0][0]) / 2
+    
+    accumulated_base = 0.0
+    accumulated_quote = 0.0
+    
+    for price, quantity, *_ in book_side:
+        level_cost_quote = price * quantity
+        
+        if accumulated_quote + level_cost_quote >= trade_volume_quote:
+            # This level is enough to fill the rest of the order
+            remaining_volume_quote = trade_volume_quote - accumulated_quote
+            base_to_add = remaining_volume_quote / price
+            accumulated_base += base_to_add
+            accumulated_quote += remaining_volume_quote
+            break
+        else:
+            # Take the whole level
+            accumulated_base += quantity
+            accumulated_quote += level_cost_quote
+    
+    if accumulated_quote < trade_volume_quote:
+        return {"status": "error", "message": "Insufficient liquidity to fill the entire trade volume."}
+
+    avg_exec_price = accumulated_quote / accumulated_base
+    price_impact = ((avg_exec_price - mid_price) / mid_price) * 100
+    
+    return {
+        "status": "success",
+        "trade_volume_quote": trade_volume_quote,
+        "avg_execution_price": avg_exec_price,
+        "mid_price": mid_price,
+        "price_impact_percent": price_impact,
+        "base_quantity_filled": accumulated_base
+    }
+
+def calculate_unrealized_pnl(position_side: str, entry_price: float, current_price: float,
+                             quantity: float, contract_size: float = 1.0) -> float:
+    """
+    Calculates the unrealized PnL of a position opened by a filled order.
+
+    Args:
+        position_side (str): The side of the opening order, 'buy' (long) or 'sell' (short).
+        entry_price (float): The average fill price.
+        current_price (float): The latest market price.
+        quantity (float): The filled amount (contracts for derivatives).
+        contract_size (float): The base amount per contract (1.0 for spot).
+    """
+    if position_side == 'buy':  # Long position
+        return (current_price - entry_price) * quantity * contract_size
+    # Short position
+    return (entry_price - current_price) * quantity * contract_size
+
+def market_summary(market: dict) -> dict:
+    """The market metadata reported by pre-trade analysis (type, contract size, precision, limits, fee)."""
+    return {
+        "status": "success",
+        "symbol": market.get('symbol'),
+        "type": market.get('type'),
+        "contract_size": (market.get('contractSize') or 1.0) if market.get('contract') else 1.0,
+        "precision": market.get('precision'),
+        "limits": market.get('limits'),
+        "taker_fee": market.get('taker'),
+    }
+
+# Shared by the pre-trade analyses of every client in the process
+_analysis_pool = ThreadPoolExecutor(max_workers=config.PRE_TRADE_MAX_WORKERS, thread_name_prefix='pre-trade')
+
+# Endpoints whose health is shared by every account on an exchange; all others are per account
+PUBLIC_ENDPOINTS = ('fetch_order_book', 'fetch_ticker')
+
 # Function to create for authenticated requests
 class UnifiedExchangeAPI:
     """
@@ -58,37 +148,187 @@ class UnifiedExchangeAPI:
         else:
             print(f"Initialized client for {account_name} on {exchange_name} in PRODUCTION mode.")
 
+        self._init_state()
+
+    @classmethod
+    def from_client(cls, account_name: str, exchange_name: str, client, symbol_mapper: SymbolMapper) -> 'UnifiedExchangeAPI':
+        """
+        Wraps an already constructed ccxt-compatible client, e.g. a simulated
+        exchange driven by historical data for backtests.
+        """
+        instance = cls.__new__(cls)
+        instance.account_name = account_name
+        instance.exchange_name = exchange_name
+        instance.symbol_mapper = symbol_mapper
+        instance.client = client
+        instance._init_state()
+        return instance
+
+    def _init_state(self):
+        """Sets up per-instance state shared by every way of constructing the API."""
+        # Public data is shared with every other client in the process on the same exchange
+        self.public = get_request_coalescer()
+        # Endpoint health is tracked per exchange (and sandbox) for public endpoints, and per
+        # account for private ones, so one account's rate limit does not open the circuit for
+        # every account on the exchange; simulated clients are not guarded
+        self.breakers = get_circuit_breakers()
+        self._health_scope = self._account_health_scope = None
+        if isinstance(self.client, ccxt.Exchange):
+            sandbox = getattr(self.client, 'isSandboxModeEnabled', False)
+            self._health_scope = f"{self.exchange_name}:sandbox" if sandbox else self.exchange_name
+            self._account_health_scope = self._health_scope
+            if self.client.apiKey:
+                # A digest, so breaker names in logs and health reports never show the key
+                key_digest = hashlib.sha256(self.client.apiKey.encode()).hexdigest()[:12]
+                self._account_health_scope = f"{self._health_scope}#{key_digest}"
+
+    @property
+    def account_key(self) -> str:
+        """
+        Identifies the exchange account across sessions: '<account_name>@<exchange>',
+        with ':sandbox' for testnet clients. Unlike a registered account_id, it
+        is the same for every session and for inline credentials.
+        """
+        sandbox = getattr(self.client, 'isSandboxModeEnabled', False)
+        return f"{self.account_name}@{self.exchange_name}{':sandbox' if sandbox else ''}"
+
+    def _guarded(self, endpoint: str, fn, *args, hedge: bool = False, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` through the circuit breaker for `endpoint`
+        (shared by the exchange for public endpoints, this account's own for
+        private ones), failing fast with `CircuitOpenError` while the endpoint is down.
+        `hedge` may only be set for idempotent public reads (see `CircuitBreakerRegistry`);
+        it is ignored for private endpoints, whose signed copies would share one
+        client's nonces and rate limit.
+        """
+        if self._health_scope is None:
+            return fn(*args, **kwargs)
+        public = endpoint in PUBLIC_ENDPOINTS
+        scope = self._health_scope if public else self._account_health_scope
+        return self.breakers.call(scope, endpoint, lambda: fn(*args, **kwargs), hedge=hedge and public)
+
+    def fetch_order_book(self, symbol: str, limit: int = 100, max_age: float = None) -> dict:
+        """
+        Fetches the L2 order book, coalesced with identical concurrent requests
+        in this process and optionally served from a recently fetched copy.
+
+        Args:
+            symbol (str): The trading pair.
+            limit (int): The number of levels per side.
+            max_age (float): Maximum age in seconds of a cached book that may be reused.
+                None uses the micro-TTL (`COALESCE_TTL_SECONDS`); 0 only joins a fetch already in flight.
+        """
+        return self.public.call(
+            self.client, 'fetch_order_book', symbol, limit=limit, max_age=max_age,
+            guard=lambda fetch: self._guarded('fetch_order_book', fetch, hedge=True)
+        )
+
     def get_funding_rate_info(self, symbol: str) -> dict:
         """
         Fetches funding rate data for a given symbol if it's a perpetual swap.
         Also calculates an estimated APR.
+
+        Rates come from the process-wide `FundingRateService`, which bulk-fetches
+        the exchange and caches each rate until its next funding time.
         """
         market = self.client.market(symbol)
         if not market.get('swap', False):
             return {"status": "info", "message": "Symbol is not a perpetual swap, no funding rate applicable."}
 
         try:
-            # Fetch live funding rate
-            funding_rate_data = self.client.fetch_funding_rate(symbol)
-            
-            # Calculate APR
-            rate = funding_rate_data.get('fundingRate', 0)
-            # Funding interval is in ms, so we calculate how many intervals per day
-            intervals_per_day = 24 * 60 * 60 * 1000 / market.get('fundingInterval', 8 * 60 * 60 * 1000)
-            apr = rate * intervals_per_day * 365 * 100  # As a percentage
-            
-            return {
-                "status": "success",
-                "symbol": symbol,
-                "funding_rate": funding_rate_data.get('fundingRate'),
-                "funding_timestamp": funding_rate_data.get('fundingTimestamp'),
-                "predicted_rate": funding_rate_data.get('markPrice'), # Note: some exchanges provide this, others don't
-                "estimated_apr": apr
-            }
+            return get_funding_service().get_summaries(self.client, [symbol])[symbol]
         except Exception as e:
             return {"status": "error", "message": f"Could not fetch funding rate: {e}"}
+
+    def get_funding_rates_info(self, symbols: list) -> dict:
+        """
+        Funding rate and estimated APR for many perpetual swaps at once, served
+        from the same cache as `get_funding_rate_info`.
+
+        Returns:
+            dict: symbol -> the `get_funding_rate_info` result for that symbol.
+        """
+        swaps = [symbol for symbol in symbols if self.client.market(symbol).get('swap', False)]
+        try:
+            results = get_funding_service().get_summaries(self.client, swaps) if swaps else {}
+        except Exception as e:
+            results = {symbol: {"status": "error", "message": f"Could not fetch funding rate: {e}"} for symbol in swaps}
+        return {
+            symbol: results.get(symbol, {"status": "info", "message": "Symbol is not a perpetual swap, no funding rate applicable."})
+            for symbol in symbols
+        }
     
-    def calculate_price_impact(self, symbol: str, side: str, trade_volume_quote: float) -> dict:
+    def get_market_info(self, symbol: str) -> dict:
+        """Market metadata for a symbol (see `market_summary`)."""
+        try:
+            self.client.load_markets()
+            return market_summary(self.client.market(symbol))
+        except Exception as e:
+            return {"status": "error", "message": f"Could not load market metadata: {e}"}
+
+    def _usable_prefetch(self, symbol: str, prefetched: dict) -> dict:
+        """The parts of a speculative prefetch that still apply to this client and symbol."""
+        if not prefetched:
+            return {}
+        if (prefetched.get('exchange') != self.exchange_name or prefetched.get('symbol') != symbol
+                or prefetched.get('sandbox') != bool(getattr(self.client, 'isSandboxModeEnabled', False))
+                or time.time() - prefetched.get('fetched_at', 0) > config.PRE_TRADE_PREFETCH_MAX_AGE_SECONDS):
+            return {}
+        return {name: prefetched[name] for name in ('funding_rate', 'market') if name in prefetched}
+
+    def analyze_trade(self, symbol: str, side: str, trade_volume_quote: float,
+                      prefetched: dict = None, deadline: float = None) -> dict:
+        """
+        Pre-trade analysis: price impact, funding rate and market metadata, fetched concurrently.
+
+        Funding and market metadata are informational, so whatever has not
+        arrived within `deadline` seconds is reported as timed out and the
+        analysis proceeds without it. The price impact sizes the order and is
+        always waited for. Fresh parts of `prefetched` (published by
+        `task_prefetch_analysis`) are used instead of fetching them again.
+
+        Args:
+            prefetched (dict): A prefetch result for this symbol, or None.
+            deadline (float): Seconds to wait for the optional parts
+                (default `config.PRE_TRADE_DEADLINE_SECONDS`).
+
+        Returns:
+            dict: {"price_impact", "funding_rate", "market", "partial"}.
+        """
+        deadline = config.PRE_TRADE_DEADLINE_SECONDS if deadline is None else deadline
+        results = self._usable_prefetch(symbol, prefetched)
+
+        def with_markets(fetch, *args):
+            # `market()` needs loaded markets; after the first call this is a no-op
+            self.client.load_markets()
+            return fetch(*args)
+
+        jobs = {
+            'price_impact': (self.calculate_price_impact, symbol, side, trade_volume_quote),
+            'funding_rate': (with_markets, self.get_funding_rate_info, symbol),
+            'market': (self.get_market_info, symbol),
+        }
+        futures = {
+            name: _analysis_pool.submit(*job) for name, job in jobs.items() if name not in results
+        }
+        wait(futures.values(), timeout=deadline)
+
+        partial = False
+        for name, future in futures.items():
+            if name == 'price_impact':
+                results[name] = future.result()
+            elif not future.done():
+                partial = True
+                results[name] = {"status": "timeout", "message": f"No result within {deadline}s, proceeding without it."}
+            else:
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {"status": "error", "message": str(e)}
+        results['partial'] = partial
+        return results
+
+    def calculate_price_impact(self, symbol: str, side: str, trade_volume_quote: float, max_book_age: float = None) -> dict:
         """
         Calculates the average execution price and price impact for a given trade volume
         by walking the order book.
@@ -97,52 +337,23 @@ class UnifiedExchangeAPI:
             symbol (str): The trading pair.
             side (str): 'buy' or 'sell'.
             trade_volume_quote (float): The trade amount in the quote currency (e.g., USDT).
+            max_book_age (float): Reuse an order book fetched within this many seconds
+                (None = the micro-TTL, 0 = only share a fetch already in flight).
         """
         try:
-            order_book = self.client.fetch_order_book(symbol, limit=100)
-            book_side = order_book['asks'] if side == 'buy' else order_book['bids']
-            
-            mid_price = (order_book['bids'][0][0] + order_book['asks'][0][0]) / 2
-            
-            accumulated_base = 0.0
-            accumulated_quote = 0.0
-            
-            for price, quantity in book_side:
-                level_cost_quote = price * quantity
-                
-                if accumulated_quote + level_cost_quote >= trade_volume_quote:
-                    # This level is enough to fill the rest of the order
-                    remaining_volume_quote = trade_volume_quote - accumulated_quote
-                    base_to_add = remaining_volume_quote / price
-                    accumulated_base += base_to_add
-                    accumulated_quote += remaining_volume_quote
-                    break
-                else:
-                    # Take the whole level
-                    accumulated_base += quantity
-                    accumulated_quote += level_cost_quote
-            
-            if accumulated_quote < trade_volume_quote:
-                return {"status": "error", "message": "Insufficient liquidity to fill the entire trade volume."}
-
-            avg_exec_price = accumulated_quote / accumulated_base
-            price_impact = ((avg_exec_price - mid_price) / mid_price) * 100
-            
-            return {
-                "status": "success",
-                "trade_volume_quote": trade_volume_quote,
-                "avg_execution_price": avg_exec_price,
-                "mid_price": mid_price,
-                "price_impact_percent": price_impact,
-                "base_quantity_filled": accumulated_base
-            }
+            order_book = self.fetch_order_book(symbol, limit=100, max_age=max_book_age)
+            return walk_order_book(order_book, side, trade_volume_quote)
         except Exception as e:
             return {"status": "error", "message": f"Could not calculate price impact: {e}"}
 
     # monitor ongoing orders
     def monitor_order(self, order_id: str, symbol: str):
         """
-        Polls the exchange to check an order's status until it is closed or canceled.
+        Waits for an order to be closed or canceled.
+
+        On exchanges with a private order stream (see `OrderStreamManager`) the
+        final update is pushed by the exchange; elsewhere the order is polled
+        with `fetch_order`.
 
         Returns:
             dict: The final order object from the exchange.
@@ -150,24 +361,28 @@ class UnifiedExchangeAPI:
         exchange_symbol = self._get_exchange_symbol(symbol)
         print(f"Monitoring order {order_id} for symbol {exchange_symbol}")
 
-        # Set a timeout for the polling for 5 mins
-        timeout = time.time()+ 300
+        order = get_order_streams().wait_for_order(self, order_id, exchange_symbol, config.ORDER_MONITOR_TIMEOUT_SECONDS)
+        if order is not None:
+            return order
+
+        # No stream for this exchange: poll until the timeout
+        timeout = time.time() + config.ORDER_MONITOR_TIMEOUT_SECONDS
     
         while time.time() < timeout:
             try:
                 # Fetch the order status from the exchange
-                order = self.client.fetch_order(order_id, exchange_symbol)
+                order = self._guarded('fetch_order', self.client.fetch_order, order_id, exchange_symbol)
                 status = order.get('status')
 
                 print(f"Order {order_id} status is: {status}")
 
                 # Check for a final state
-                if status == 'closed' or status == 'filled' or status == 'canceled' or status == 'rejected':
+                if status in FINAL_ORDER_STATUSES:
                     print(f"Order {order_id} has reached a final state: {status}")
                     return order # Return the final order details
                 
                 # Wait for a few seconds before checking again to avoid rate limiting
-                time.sleep(3)
+                time.sleep(config.ORDER_POLL_INTERVAL_SECONDS)
 
             except Exception as e:
                 print(f"Error fetching order {order_id}: {e}")
@@ -231,15 +446,15 @@ class UnifiedExchangeAPI:
             monitoring_end_time = time.time() + 5
             while time.time() < monitoring_end_time:
                 # fetch the latest market price
-                ticker = self.client.fetch_ticker(pair_name)
+                ticker = self.public.call(
+                    self.client, 'fetch_ticker', pair_name,
+                    guard=lambda fetch: self._guarded('fetch_ticker', fetch, hedge=True)
+                )
                 current_price = ticker.get('last')
 
                 if current_price is not None:
                     # 3. Calculate unrealized pnl, ACCOUNTING FOR CONTRACT SIZE
-                    if position_side == 'buy':  # Long position
-                        net_pnl = (current_price - entry_price) * quantity * contract_size
-                    else:  # Short position
-                        net_pnl = (entry_price - current_price) * quantity * contract_size
+                    net_pnl = calculate_unrealized_pnl(position_side, entry_price, current_price, quantity, contract_size)
 
                     # Construct the structured PnL object
                     pnl_update = {
@@ -274,8 +489,8 @@ class UnifiedExchangeAPI:
             dict: The order information from the exchange.
         """
         exchange_symbol = self._get_exchange_symbol(symbol)
-        print(f"Placing MARKET {side} order for {amount} {exchange_symbol}... with credentials: API-KEY: {self.client.apiKey}, SECRET: {self.client.secret}")
-        return self.client.create_market_order(exchange_symbol, side, amount)
+        print(f"Placing MARKET {side} order for {amount} {exchange_symbol}...")
+        return self._guarded('create_order', self.client.create_market_order, exchange_symbol, side, amount)
 
 
     def place_limit_order(self, symbol: str, side: str, amount: float, price: float):
@@ -293,13 +508,108 @@ class UnifiedExchangeAPI:
         """
         exchange_symbol = self._get_exchange_symbol(symbol)
         print(f"Placing LIMIT {side} order for {amount} {exchange_symbol} at {price}...")
-        return self.client.create_limit_order(exchange_symbol, side, amount, price)
+        return self._guarded('create_order', self.client.create_limit_order, exchange_symbol, side, amount, price)
+
+    def place_batch_orders(self, orders: list) -> list:
+        """
+        Places several orders at once.
+
+        Uses the exchange's native batch endpoint when ccxt supports `create_orders`
+        (e.g. Binance, OKX), splitting the legs into chunks the exchange accepts.
+        Otherwise, the legs are submitted concurrently as individual orders.
+
+        Args:
+            orders (list): Legs of the form
+                {'symbol': 'BTC/USDT', 'side': 'buy', 'amount': 0.01, 'type': 'market'|'limit', 'price': 100.0}.
+
+        Returns:
+            list: One result per leg, in input order:
+                {'leg': i, 'status': 'placed'|'error', 'order': {...} | None, 'message': str | None}.
+        """
+        results = [None] * len(orders)
+        prepared = []
+        for i, leg in enumerate(orders):
+            try:
+                order_type = leg.get('type', 'market')
+                if order_type == 'limit' and leg.get('price') is None:
+                    raise ValueError("Limit legs require a price.")
+                prepared.append((i, {
+                    'symbol': self._get_exchange_symbol(leg['symbol']),
+                    'type': order_type,
+                    'side': leg['side'],
+                    'amount': leg['amount'],
+                    'price': leg.get('price') if order_type == 'limit' else None,
+                    'params': leg.get('params', {}),
+                }))
+            except Exception as e:
+                results[i] = {"leg": i, "status": "error", "order": None, "message": f"Invalid leg: {e}"}
+
+        if not prepared:
+            return results
+
+        if self.client.has.get('createOrders'):
+            chunk_size = config.BATCH_ORDER_CHUNK_SIZES.get(self.exchange_name, config.BATCH_ORDER_DEFAULT_CHUNK_SIZE)
+            chunks = [prepared[i:i + chunk_size] for i in range(0, len(prepared), chunk_size)]
+            print(f"Placing {len(prepared)} orders on {self.exchange_name} via native batch endpoint in {len(chunks)} request(s)...")
+            submit, jobs = self._place_order_chunk, chunks
+        else:
+            print(f"{self.exchange_name} has no batch endpoint, submitting {len(prepared)} orders concurrently...")
+            submit, jobs = self._place_single_leg, [[leg] for leg in prepared]
+
+        with ThreadPoolExecutor(max_workers=min(len(jobs), config.BATCH_ORDER_MAX_WORKERS)) as pool:
+            for chunk_results in pool.map(submit, jobs):
+                for result in chunk_results:
+                    results[result['leg']] = result
+        return results
+
+    def _place_order_chunk(self, chunk: list) -> list:
+        """Submits one chunk of legs through ccxt's `create_orders`."""
+        try:
+            placed = self._guarded('create_orders', self.client.create_orders, [order for _, order in chunk])
+        except Exception as e:
+            return [{"leg": i, "status": "error", "order": None, "message": str(e)} for i, _ in chunk]
+
+        results = []
+        for (i, _), order in zip(chunk, placed):
+            # Exchanges report per-leg rejections inside the batch response
+            if not order or not order.get('id') or order.get('status') == 'rejected':
+                info = (order or {}).get('info')
+                message = info.get('msg') if isinstance(info, dict) else None
+                results.append({"leg": i, "status": "error", "order": order, "message": message or "Order rejected by exchange."})
+            else:
+                results.append({"leg": i, "status": "placed", "order": order, "message": None})
+        return results
+
+    def _place_single_leg(self, chunk: list) -> list:
+        """Fallback for exchanges without a batch endpoint: places one leg on its own."""
+        (i, order), = chunk
+        try:
+            placed = self._guarded(
+                'create_order', self.client.create_order,
+                order['symbol'], order['type'], order['side'], order['amount'], order['price'], order['params']
+            )
+            return [{"leg": i, "status": "placed", "order": placed, "message": None}]
+        except Exception as e:
+            return [{"leg": i, "status": "error", "order": None, "message": str(e)}]
 
-    def get_account_info(self):
+    def fetch_balance(self) -> dict:
         """
-        Fetches the account balance information.
+        Fetches the account balance from the exchange.
         Note: ccxt's fetchBalance is the unified method for this.
         """
         print("Fetching account balances...")
         # The 'private' scope is implied by providing API keys.
-        return self.client.fetch_balance()
\ No newline at end of file
+        return self._guarded('fetch_balance', self.client.fetch_balance)
+
+    def get_account_info(self, force_refresh: bool = False) -> dict:
+        """
+        The account balance, served from the process-wide `BalanceCache` (kept
+        current by refreshes, balance pushes and this process's fills).
+
+        Args:
+            force_refresh (bool): Fetch from the exchange even if the cached balance is fresh.
+
+        Returns:
+            dict: The ccxt balance structure plus a `staleness` field.
+        """
+        return get_balance_cache().get(self, force_refresh)
\ No newline at end of file
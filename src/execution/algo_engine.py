@@ -0,0 +1,232 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import src.config as config
+from src.exchanges.unified_exchange import UnifiedExchangeAPI
+
+SUPPORTED_ALGOS = ('twap', 'vwap')
+
+class ParentOrder:
+    """
+    A large order to be worked over time as a series of child market orders.
+    """
+
+    def __init__(self, client: UnifiedExchangeAPI, symbol: str, side: str, trade_volume_quote: float,
+                 algo: str = 'twap', duration_seconds: float = 600, num_slices: int = 10,
+                 max_impact_percent: float = None, volume_profile: list = None, parent_id: str = None):
+        """
+        Args:
+            client (UnifiedExchangeAPI): The account the child orders are placed on.
+            symbol (str): The trading pair.
+            side (str): 'buy' or 'sell'.
+            trade_volume_quote (float): The total amount to trade in the quote currency.
+            algo (str): 'twap' (equal slices) or 'vwap' (slices weighted by a volume profile).
+            duration_seconds (float): The time over which the order is worked.
+            num_slices (int): The number of child orders.
+            max_impact_percent (float): A slice whose estimated impact exceeds this is deferred
+                to the next slice instead of being placed.
+            volume_profile (list): Optional VWAP weights, one per slice. Fetched from
+                historical candles when omitted.
+            parent_id (str): Optional identifier echoed in progress updates.
+        """
+        if algo not in SUPPORTED_ALGOS:
+            raise ValueError(f"Unsupported execution algorithm '{algo}'. Supported: {SUPPORTED_ALGOS}")
+        if num_slices < 1 or duration_seconds <= 0 or trade_volume_quote <= 0:
+            raise ValueError("num_slices, duration_seconds and trade_volume_quote must be positive.")
+        if volume_profile is not None and len(volume_profile) != num_slices:
+            raise ValueError("volume_profile must have exactly one weight per slice.")
+
+        self.client = client
+        self.symbol = symbol
+        self.side = side
+        self.trade_volume_quote = trade_volume_quote
+        self.algo = algo
+        self.duration_seconds = duration_seconds
+        self.num_slices = num_slices
+        self.max_impact_percent = config.ALGO_MAX_SLICE_IMPACT_PERCENT if max_impact_percent is None else max_impact_percent
+        self.volume_profile = volume_profile
+        self.parent_id = parent_id or uuid.uuid4().hex[:12]
+
+        # Progress
+        self.executed_quote = 0.0
+        self.executed_base = 0.0
+        self.child_orders = []
+
+
+class ExecutionAlgoEngine:
+    """
+    Works many parent orders concurrently on a single asyncio event loop.
+
+    Every slice re-evaluates price impact with `calculate_price_impact` on a
+    briefly cached order book, so parents on the same symbol share book fetches.
+    The blocking ccxt calls run in worker threads; the loop itself only schedules.
+    """
+
+    def __init__(self, publish, book_max_age: float = None, on_fill=None, should_stop=None):
+        """
+        Args:
+            publish (callable): Called as `publish(status, data)` for every progress update
+                (blocking is fine, it runs in a worker thread).
+            book_max_age (float): Reuse order books fetched within this many seconds
+                (defaults to `config.ALGO_BOOK_MAX_AGE_SECONDS`).
+            on_fill (callable): Optionally called as `on_fill(parent, order)` with every
+                child order's final state, from a worker thread.
+            should_stop (callable): Optionally polled (from a worker thread) while parents
+                wait for their next slice; once it returns True no further slices are
+                placed and the parents finish as 'canceled'.
+        """
+        self.publish = publish
+        self.on_fill = on_fill
+        self.should_stop = should_stop
+        self._stopped = None
+        self.book_max_age = config.ALGO_BOOK_MAX_AGE_SECONDS if book_max_age is None else book_max_age
+
+    def _historical_volume_profile(self, parent: ParentOrder, slice_starts: list) -> list:
+        """
+        Builds VWAP weights from the average traded volume per hour of day
+        over the last `config.ALGO_VWAP_LOOKBACK_DAYS` days of hourly candles.
+        """
+        since = int((time.time() - config.ALGO_VWAP_LOOKBACK_DAYS * 86400) * 1000)
+        candles = parent.client.client.fetch_ohlcv(parent.symbol, '1h', since=since, limit=24 * config.ALGO_VWAP_LOOKBACK_DAYS)
+
+        volume_by_hour = [0.0] * 24
+        count_by_hour = [0] * 24
+        for timestamp, _, _, _, _, volume in candles:
+            hour = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).hour
+            volume_by_hour[hour] += volume or 0.0
+            count_by_hour[hour] += 1
+        avg_by_hour = [v / c if c else 0.0 for v, c in zip(volume_by_hour, count_by_hour)]
+
+        return [avg_by_hour[datetime.fromtimestamp(start, tz=timezone.utc).hour] for start in slice_starts]
+
+    def build_schedule(self, parent: ParentOrder, start_time: float) -> list:
+        """
+        Splits a parent order into timed slices.
+
+        Returns:
+            list: (wall_clock_time, quote_volume) tuples, one per slice.
+        """
+        interval = parent.duration_seconds / parent.num_slices
+        slice_starts = [start_time + i * interval for i in range(parent.num_slices)]
+
+        if parent.algo == 'twap':
+            weights = [1.0] * parent.num_slices
+        else:
+            weights = parent.volume_profile or self._historical_volume_profile(parent, slice_starts)
+            if sum(weights) <= 0:
+                # No usable volume history, fall back to an even schedule
+                weights = [1.0] * parent.num_slices
+
+        total = sum(weights)
+        return [(start, parent.trade_volume_quote * w / total) for start, w in zip(slice_starts, weights)]
+
+    async def _emit(self, parent: ParentOrder, status: str, **data):
+        update = {
+            "parent_id": parent.parent_id,
+            "algo": parent.algo,
+            "symbol": parent.symbol,
+            "side": parent.side,
+            "trade_volume_quote": parent.trade_volume_quote,
+            "executed_quote": parent.executed_quote,
+            "executed_base": parent.executed_base,
+            "avg_execution_price": parent.executed_quote / parent.executed_base if parent.executed_base else None,
+            **data
+        }
+        await asyncio.to_thread(self.publish, status, update)
+
+    def _execute_slice(self, parent: ParentOrder, quote_volume: float) -> dict:
+        """Evaluates and places one child order (runs in a worker thread)."""
+        impact = parent.client.calculate_price_impact(
+            parent.symbol, parent.side, quote_volume, max_book_age=self.book_max_age
+        )
+        if impact['status'] != 'success':
+            return {"status": "deferred", "reason": impact.get('message'), "impact": impact}
+        if abs(impact['price_impact_percent']) > parent.max_impact_percent:
+            return {"status": "deferred", "reason": "Estimated impact above threshold", "impact": impact}
+
+        initial = parent.client.place_market_order(parent.symbol, parent.side, impact['base_quantity_filled'])
+        final_order = parent.client.monitor_order(initial['id'], parent.symbol)
+        if self.on_fill:
+            self.on_fill(parent, final_order)
+        return {"status": final_order.get('status'), "order": final_order, "impact": impact}
+
+    async def run_parent(self, parent: ParentOrder) -> dict:
+        """
+        Works one parent order to completion.
+
+        Deferred or failed slices roll their volume into the next slice; whatever
+        is still unexecuted after the last slice is reported as remaining.
+        """
+        try:
+            schedule = await asyncio.to_thread(self.build_schedule, parent, time.time())
+        except Exception as e:
+            await self._emit(parent, "error", message=f"Could not build schedule: {e}")
+            return {"parent_id": parent.parent_id, "status": "error", "message": str(e)}
+
+        await self._emit(parent, "scheduled", num_slices=parent.num_slices,
+                         schedule=[{"at": at, "quote_volume": q} for at, q in schedule])
+
+        carry_quote = 0.0
+        for index, (at, quote_volume) in enumerate(schedule):
+            delay = at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            if self._stopped.is_set():
+                break
+
+            slice_quote = quote_volume + carry_quote
+            try:
+                outcome = await asyncio.to_thread(self._execute_slice, parent, slice_quote)
+            except Exception as e:
+                outcome = {"status": "error", "reason": str(e)}
+
+            order = outcome.get('order') or {}
+            if outcome['status'] in ('closed', 'filled'):
+                filled_base = order.get('filled') or 0.0
+                filled_quote = order.get('cost') or filled_base * (order.get('average') or 0.0)
+                parent.executed_base += filled_base
+                parent.executed_quote += filled_quote
+                parent.child_orders.append(order)
+                carry_quote = max(slice_quote - filled_quote, 0.0)
+                status = "slice_filled"
+            else:
+                carry_quote = slice_quote
+                status = "slice_deferred" if outcome['status'] == 'deferred' else "slice_failed"
+
+            await self._emit(parent, status, slice_index=index, num_slices=parent.num_slices,
+                             slice_quote=slice_quote, reason=outcome.get('reason'),
+                             price_impact=outcome.get('impact'), order_id=order.get('id'))
+
+        remaining = max(parent.trade_volume_quote - parent.executed_quote, 0.0)
+        if remaining <= parent.trade_volume_quote * 1e-6:
+            final_status = "completed"
+        else:
+            final_status = "canceled" if self._stopped.is_set() else "partial"
+        await self._emit(parent, final_status, remaining_quote=remaining, child_orders=len(parent.child_orders))
+        return {"parent_id": parent.parent_id, "status": final_status, "remaining_quote": remaining,
+                "executed_quote": parent.executed_quote, "executed_base": parent.executed_base}
+
+    async def run(self, parents: list) -> list:
+        """Runs all parent orders concurrently and returns their final summaries."""
+        # Each in-flight slice blocks a thread while ccxt talks to the exchange
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=config.ALGO_MAX_THREADS, thread_name_prefix='algo')
+        )
+        self._stopped = asyncio.Event()
+        watcher = asyncio.create_task(self._watch_stop()) if self.should_stop else None
+        try:
+            return await asyncio.gather(*(self.run_parent(parent) for parent in parents))
+        finally:
+            if watcher:
+                watcher.cancel()
+
+    async def _watch_stop(self):
+        """Polls `should_stop` once per check interval and wakes every waiting parent when it fires."""
+        while not await asyncio.to_thread(self.should_stop):
+            await asyncio.sleep(config.STOP_CHECK_INTERVAL_SECONDS)
+        self._stopped.set()
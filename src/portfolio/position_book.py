@@ -0,0 +1,196 @@
+import json
+import os
+from collections import deque
+import numpy as np
+
+class PositionBook:
+    """
+    Nets fills into positions per (user, account, symbol) and keeps realized and
+    unrealized PnL up to date as prices tick.
+
+    Positions live in parallel NumPy arrays (one row per position) rather than
+    objects, so a price tick updates every position in that market with one
+    vectorized expression and portfolio totals are a `bincount` over users.
+    That keeps ticks and snapshots cheap with thousands of positions.
+
+    Quantities are signed (long > 0, short < 0) and in contracts; PnL is
+    `quantity * contract_size * price difference`, in the quote currency.
+    """
+
+    FLOAT_FIELDS = ('quantity', 'entry_price', 'contract_size', 'realized_pnl', 'fees', 'last_price', 'unrealized_pnl')
+
+    def __init__(self, capacity: int = 1024, dedup_window: int = 100000):
+        self.size = 0
+        for field in self.FLOAT_FIELDS:
+            setattr(self, field, np.zeros(capacity))
+        self.last_price[:] = np.nan
+        self.user_index = np.zeros(capacity, dtype=np.int64)
+        # (user_id, account, exchange, symbol) per row, and the reverse lookups
+        self.keys = []
+        self._rows = {}
+        self._users = {}
+        self._market_rows = {}  # (exchange, symbol) -> rows holding that market
+        # IDs of the most recently applied fills, checkpointed with the positions they are in
+        self._applied = deque(maxlen=dedup_window)
+        self._applied_ids = set()
+
+    def _grow(self):
+        capacity = len(self.quantity) * 2
+        for field in self.FLOAT_FIELDS + ('user_index',):
+            old = getattr(self, field)
+            new = np.full(capacity, np.nan) if field == 'last_price' else np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, field, new)
+
+    def _row(self, user_id: str, account: str, exchange: str, symbol: str, contract_size: float) -> int:
+        key = (user_id, account, exchange, symbol)
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        if self.size == len(self.quantity):
+            self._grow()
+        row = self.size
+        self.size += 1
+        self.keys.append(key)
+        self._rows[key] = row
+        self.user_index[row] = self._users.setdefault(user_id, len(self._users))
+        self.contract_size[row] = contract_size or 1.0
+        self._market_rows.setdefault((exchange, symbol), []).append(row)
+        return row
+
+    def apply_fill(self, user_id: str, account: str, exchange: str, symbol: str, side: str,
+                   amount: float, price: float, contract_size: float = 1.0, fee: float = 0.0,
+                   fill_id: str = None) -> int | None:
+        """
+        Nets one fill into its position.
+
+        Adding to a position moves the average entry price; reducing it realizes
+        PnL against that entry; crossing through zero opens the remainder at the
+        fill price. Fees (in quote) are deducted from realized PnL.
+
+        A fill whose `fill_id` was applied before (e.g. redelivered after a
+        crash) is skipped.
+
+        Returns:
+            int | None: The position's row, or None if the fill was a duplicate.
+        """
+        if fill_id is not None:
+            if fill_id in self._applied_ids:
+                return None
+            if len(self._applied) == self._applied.maxlen:
+                self._applied_ids.discard(self._applied[0])
+            self._applied.append(fill_id)
+            self._applied_ids.add(fill_id)
+        row = self._row(user_id, account, exchange, symbol, contract_size)
+        signed = amount if side == 'buy' else -amount
+        current = self.quantity[row]
+
+        if current == 0 or np.sign(current) == np.sign(signed):
+            total = abs(current) + amount
+            self.entry_price[row] = (abs(current) * self.entry_price[row] + amount * price) / total
+        else:
+            closed = min(abs(current), amount)
+            self.realized_pnl[row] += closed * self.contract_size[row] * (price - self.entry_price[row]) * np.sign(current)
+            if amount > abs(current):
+                self.entry_price[row] = price  # Flipped: the remainder opens at the fill price
+            elif amount == abs(current):
+                self.entry_price[row] = 0.0
+
+        self.quantity[row] = current + signed
+        self.fees[row] += fee
+        self.realized_pnl[row] -= fee
+        if np.isnan(self.last_price[row]):
+            self.last_price[row] = price
+        self._mark(np.array([row]))
+        return row
+
+    def _mark(self, rows: np.ndarray):
+        self.unrealized_pnl[rows] = (
+            self.quantity[rows] * self.contract_size[rows] * (self.last_price[rows] - self.entry_price[rows])
+        )
+
+    def markets(self) -> list:
+        """(exchange, symbol) pairs with at least one open position, i.e. the prices worth fetching."""
+        return [market for market, rows in self._market_rows.items() if np.any(self.quantity[rows] != 0)]
+
+    def update_prices(self, exchange: str, prices: dict):
+        """Applies a price tick for one exchange: {symbol: last price}."""
+        for symbol, price in prices.items():
+            rows = self._market_rows.get((exchange, symbol))
+            if rows and price is not None:
+                rows = np.asarray(rows)
+                self.last_price[rows] = price
+                self._mark(rows)
+
+    def _position(self, row: int) -> dict:
+        user_id, account, exchange, symbol = self.keys[row]
+        quantity = float(self.quantity[row])
+        return {
+            "account": account,
+            "exchange": exchange,
+            "symbol": symbol,
+            "position_side": "long" if quantity > 0 else "short" if quantity < 0 else "flat",
+            "quantity": quantity,
+            "entry_price": float(self.entry_price[row]) if quantity else None,
+            "last_price": None if np.isnan(self.last_price[row]) else float(self.last_price[row]),
+            "realized_pnl": float(self.realized_pnl[row]),
+            "unrealized_pnl": float(self.unrealized_pnl[row]),
+            "fees": float(self.fees[row]),
+        }
+
+    def totals(self) -> dict:
+        """Per-user totals computed for all users at once: user_id -> {realized, unrealized, net, open_positions}."""
+        n, users = self.size, len(self._users)
+        index = self.user_index[:n]
+        realized = np.bincount(index, weights=self.realized_pnl[:n], minlength=users)
+        unrealized = np.bincount(index, weights=np.nan_to_num(self.unrealized_pnl[:n]), minlength=users)
+        open_positions = np.bincount(index, weights=(self.quantity[:n] != 0), minlength=users)
+        return {
+            user_id: {
+                "realized_pnl": float(realized[i]),
+                "unrealized_pnl": float(unrealized[i]),
+                "net_pnl": float(realized[i] + unrealized[i]),
+                "open_positions": int(open_positions[i]),
+            }
+            for user_id, i in self._users.items()
+        }
+
+    def snapshot(self, user_id: str, totals: dict = None) -> dict:
+        """A user's portfolio: totals plus every position with a quantity or realized PnL."""
+        user = self._users.get(user_id)
+        if user is None:
+            return {"totals": None, "positions": []}
+        rows = np.flatnonzero((self.user_index[:self.size] == user) &
+                              ((self.quantity[:self.size] != 0) | (self.realized_pnl[:self.size] != 0)))
+        return {
+            "totals": (totals or self.totals())[user_id],
+            "positions": [self._position(row) for row in rows],
+        }
+
+    def users(self) -> list:
+        return list(self._users)
+
+    # --- Checkpoints ---
+    def save(self, path: str):
+        """Writes the book to `path` (.npz) atomically."""
+        tmp_path = f"{path}.tmp.npz"
+        arrays = {field: getattr(self, field)[:self.size] for field in self.FLOAT_FIELDS + ('user_index',)}
+        np.savez(tmp_path, keys=np.array(json.dumps(self.keys)), applied=np.array(json.dumps(list(self._applied))),
+                 **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dedup_window: int = 100000) -> 'PositionBook':
+        """Restores a book written by `save`, or returns an empty one if there is none."""
+        book = cls(dedup_window=dedup_window)
+        if not os.path.exists(path):
+            return book
+        with np.load(path) as data:
+            for user_id, account, exchange, symbol in json.loads(str(data['keys'])):
+                book._row(user_id, account, exchange, symbol, 1.0)
+            for field in cls.FLOAT_FIELDS:
+                getattr(book, field)[:book.size] = data[field]
+            if 'applied' in data.files:
+                book._applied.extend(json.loads(str(data['applied'])))
+                book._applied_ids.update(book._applied)
+        return book
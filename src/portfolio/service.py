@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import time
+import ccxt
+import pika
+from concurrent.futures import ThreadPoolExecutor
+import src.config as config
+from src.portfolio.position_book import PositionBook
+from src.utils.notifications import publish_notification
+
+class PortfolioService:
+    """
+    Maintains every user's positions from the fills workers publish, and streams
+    portfolio snapshots to the users over the notifications exchange.
+
+    Fills arrive on the durable `PORTFOLIO_FILLS_QUEUE`, so none are lost while
+    the service is down. They are acknowledged only after the book containing
+    them has been checkpointed to `PORTFOLIO_STATE_PATH`; after a crash the
+    service restores the checkpoint and RabbitMQ redelivers the fills that were
+    not acknowledged. The checkpoint also holds the IDs of the fills it
+    includes, so fills redelivered after a crash between saving and
+    acknowledging are skipped rather than counted twice.
+
+    Run exactly one instance: `python -m src.portfolio.service`.
+    """
+
+    def __init__(self, state_path: str = None):
+        self.state_path = state_path or config.PORTFOLIO_STATE_PATH
+        self.book = PositionBook.load(self.state_path, config.PORTFOLIO_DEDUP_WINDOW)
+        self._public_clients = {}
+        self._pool = ThreadPoolExecutor(max_workers=config.PORTFOLIO_PRICE_MAX_WORKERS)
+        self._unacked_tag = None  # Highest delivery tag applied but not yet checkpointed
+        self._dirty_users = set()
+        print(f"✅ Portfolio service restored {self.book.size} position(s) from {self.state_path}.")
+
+    def _connect(self):
+        connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+        channel = connection.channel()
+        channel.queue_declare(queue=config.PORTFOLIO_FILLS_QUEUE, durable=True)
+        return connection, channel
+
+    def _client(self, exchange_id: str):
+        if exchange_id not in self._public_clients:
+            self._public_clients[exchange_id] = getattr(ccxt, exchange_id)()
+        return self._public_clients[exchange_id]
+
+    # --- Fills ---
+    def apply_fill(self, fill: dict):
+        """Applies one fill message as published by `tasks.publish_fill`, unless it was applied before."""
+        fill_id = f"{fill['account']}|{fill['exchange']}|{fill['order_id']}" if fill.get('order_id') else None
+        row = self.book.apply_fill(
+            fill['user_id'], fill['account'], fill['exchange'], fill['symbol'], fill['side'],
+            fill['filled'], fill['average'], fill.get('contract_size') or 1.0, fill.get('fee') or 0.0,
+            fill_id=fill_id
+        )
+        if row is None:
+            print(f"Skipping fill for order {fill['order_id']}, already applied.")
+            return
+        self._dirty_users.add(fill['user_id'])
+
+    def consume_fills(self, channel, limit: int = 1000) -> int:
+        """Applies up to `limit` waiting fills without blocking."""
+        applied = 0
+        while applied < limit:
+            method, _, body = channel.basic_get(queue=config.PORTFOLIO_FILLS_QUEUE, auto_ack=False)
+            if method is None:
+                break
+            try:
+                self.apply_fill(json.loads(body))
+            except Exception as e:
+                print(f"❌ Dropping malformed fill {body!r}: {e}")
+            self._unacked_tag = method.delivery_tag
+            applied += 1
+        return applied
+
+    def checkpoint(self, channel):
+        """Saves the book, then acknowledges every fill it includes."""
+        if self._unacked_tag is None:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.book.save(self.state_path)
+        channel.basic_ack(delivery_tag=self._unacked_tag, multiple=True)
+        self._unacked_tag = None
+
+    # --- Prices ---
+    def refresh_prices(self):
+        """Fetches last prices for every market with an open position, one bulk call per exchange."""
+        by_exchange = {}
+        for exchange_id, symbol in self.book.markets():
+            by_exchange.setdefault(exchange_id, []).append(symbol)
+
+        def fetch(item):
+            exchange_id, symbols = item
+            client = self._client(exchange_id)
+            if client.has.get('fetchTickers'):
+                tickers = client.fetch_tickers(symbols)
+            else:
+                tickers = {symbol: client.fetch_ticker(symbol) for symbol in symbols}
+            return exchange_id, {symbol: ticker.get('last') for symbol, ticker in tickers.items()}
+
+        futures = [self._pool.submit(fetch, item) for item in by_exchange.items()]
+        for future in futures:
+            try:
+                exchange_id, prices = future.result()
+                self.book.update_prices(exchange_id, prices)
+            except Exception as e:
+                print(f"Error refreshing portfolio prices: {e}")
+
+    # --- Snapshots ---
+    def publish_snapshots(self, channel, users: list, totals: dict):
+        for user_id in users:
+            publish_notification({
+                "user_id": user_id,
+                "payload": {"action": "portfolio_update", "status": "monitoring",
+                            "data": self.book.snapshot(user_id, totals)}
+            }, channel)
+
+    def run(self):
+        connection, channel = self._connect()
+        next_price = next_snapshot = next_checkpoint = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                self.consume_fills(channel)
+
+                if now >= next_price:
+                    self.refresh_prices()
+                    next_price = now + config.PORTFOLIO_PRICE_INTERVAL_SECONDS
+                if now >= next_snapshot:
+                    # Users with open positions, plus anyone whose position just closed
+                    totals = self.book.totals()
+                    users = {user_id for user_id, user in totals.items() if user['open_positions']}
+                    self.publish_snapshots(channel, sorted(users | self._dirty_users), totals)
+                    self._dirty_users.clear()
+                    next_snapshot = now + config.PORTFOLIO_SNAPSHOT_INTERVAL_SECONDS
+                if now >= next_checkpoint:
+                    self.checkpoint(channel)
+                    next_checkpoint = now + config.PORTFOLIO_CHECKPOINT_INTERVAL_SECONDS
+
+                # Keeps the connection's heartbeats going while waiting for the next fill
+                connection.sleep(config.PORTFOLIO_POLL_INTERVAL_SECONDS)
+        finally:
+            try:
+                self.checkpoint(channel)
+            finally:
+                connection.close()
+                self._pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregates fills into per-user positions and streams portfolio PnL.")
+    parser.add_argument("--state", default=config.PORTFOLIO_STATE_PATH, help="Checkpoint file for the position book.")
+    args = parser.parse_args()
+    try:
+        PortfolioService(args.state).run()
+    except KeyboardInterrupt:
+        print("\nPortfolio service stopped.")
+
+
+if __name__ == "__main__":
+    main()
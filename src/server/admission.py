@@ -0,0 +1,206 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+import src.config as config
+
+# Queue each dispatching WebSocket action lands on (see `task_routes` in celery_app.py)
+ACTION_QUEUES = {
+    'get_account_info': 'orders',
+    'place_market_order': 'orders',
+    'place_limit_order': 'orders',
+    'analyze_and_place_order': 'orders',
+    'place_batch_orders': 'orders',
+    'smart_route_order': 'orders',
+    'compare_funding_rates': 'orders',
+    'prefetch_analysis': 'orders',
+    'start_execution_algo': 'algos',
+    'start_orderbook': 'persistence',
+}
+
+# Worker messages that answer an action, i.e. show that it left the queue. Only the first
+# reply carrying the request's `request_id` releases it (orders reply "placed", then "filled").
+# Actions not listed here (long-running loops) are rate limited but not counted as in flight.
+REPLY_ACTIONS = {
+    'get_account_info': ('get_account_info',),
+    'place_market_order': ('place_market_order',),
+    'place_limit_order': ('place_limit_order',),
+    'analyze_and_place_order': ('pre_trade_analysis', 'analyze_and_place_order'),
+    'place_batch_orders': ('place_batch_orders',),
+    'smart_route_order': ('routing_plan', 'smart_route_order'),
+    'compare_funding_rates': ('compare_funding_rates',),
+    'start_execution_algo': ('execution_algo', 'start_execution_algo'),
+}
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token if one is available.
+
+        Returns:
+            float: 0 if admitted, otherwise the seconds until a token is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Pending:
+    __slots__ = ('request_id', 'action', 'expires_at', 'done')
+
+    def __init__(self, request_id: str, action: str, expires_at: float):
+        self.request_id = request_id
+        self.action = action
+        self.expires_at = expires_at
+        self.done = False
+
+
+class AdmissionController:
+    """
+    Decides, per WebSocket message, whether work may be enqueued.
+
+    In order, a message is rejected when:
+    1. its Celery queue is deeper than `ADMISSION_MAX_QUEUE_DEPTH` (workers are
+       behind, so new work would only wait) -> "busy";
+    2. this instance already has `ADMISSION_MAX_IN_FLIGHT` requests enqueued
+       that no worker has answered yet -> "busy";
+    3. the user exceeds their overall or per-action token bucket
+       (`ADMISSION_USER_LIMIT`, `ADMISSION_ACTION_LIMITS`) -> "rate_limited".
+
+    Rejections are immediate and carry a `retry_after` hint, so an overloaded
+    system answers quickly instead of queueing work it cannot serve in time.
+    Requests whose answer never arrives stop counting as in flight after
+    `ADMISSION_IN_FLIGHT_TTL_SECONDS`.
+
+    All state is local to the server instance and touched only from its event loop.
+    """
+
+    def __init__(self):
+        self._user_buckets = {}
+        self._action_buckets = {}
+        self._pending = deque()                  # _Pending, oldest first
+        self._pending_by_id = {}                 # request_id -> _Pending
+        self.in_flight = 0
+        self.queue_depths = {}                   # queue -> (ready messages, consumers)
+        self.metrics = defaultdict(lambda: defaultdict(int))  # action -> counter -> value
+
+    # --- Checks ---
+    def _bucket(self, buckets: dict, key, limit: tuple) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(*limit)
+        return bucket
+
+    def _expire(self, now: float):
+        while self._pending and (self._pending[0].done or self._pending[0].expires_at <= now):
+            entry = self._pending.popleft()
+            if not entry.done:
+                entry.done = True
+                self.in_flight -= 1
+                self.metrics[entry.action]['expired'] += 1
+                del self._pending_by_id[entry.request_id]
+
+    def admit(self, user_id: str, action: str, request_id: str) -> dict | None:
+        """
+        Admits a message or explains why not. `request_id` must be unique and
+        sent along with the work, so the reply can be matched (see `on_reply`).
+
+        Returns:
+            dict | None: None if admitted, otherwise the rejection to send to the client.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        metrics = self.metrics[action]
+
+        queue = ACTION_QUEUES.get(action)
+        depth, _ = self.queue_depths.get(queue, (0, 0))
+        max_depth = config.ADMISSION_MAX_QUEUE_DEPTH.get(queue)
+        if max_depth is not None and depth >= max_depth:
+            metrics['rejected_queue_depth'] += 1
+            return {"status": "busy", "action": action, "retry_after": config.ADMISSION_QUEUE_POLL_SECONDS,
+                    "message": f"The {queue} queue is backed up ({depth} waiting), try again shortly."}
+
+        tracked = action in REPLY_ACTIONS
+        if tracked and self.in_flight >= config.ADMISSION_MAX_IN_FLIGHT:
+            metrics['rejected_in_flight'] += 1
+            return {"status": "busy", "action": action, "retry_after": 1.0,
+                    "message": "The server is at capacity, try again shortly."}
+
+        for buckets, key, limit in (
+            (self._user_buckets, user_id, config.ADMISSION_USER_LIMIT),
+            (self._action_buckets, (user_id, action),
+             config.ADMISSION_ACTION_LIMITS.get(action, config.ADMISSION_DEFAULT_ACTION_LIMIT)),
+        ):
+            retry_after = self._bucket(buckets, key, limit).try_acquire()
+            if retry_after:
+                metrics['rejected_rate_limited'] += 1
+                return {"status": "rate_limited", "action": action, "retry_after": round(retry_after, 3),
+                        "message": "Too many requests, slow down."}
+
+        metrics['admitted'] += 1
+        if tracked:
+            entry = _Pending(request_id, action, now + config.ADMISSION_IN_FLIGHT_TTL_SECONDS)
+            self._pending.append(entry)
+            self._pending_by_id[request_id] = entry
+            self.in_flight += 1
+        return None
+
+    def on_reply(self, request_id: str, reply_action: str):
+        """
+        Marks the request `request_id` as no longer in flight on its first reply.
+        Later replies to the same request, and messages without a request_id, change nothing.
+        """
+        entry = self._pending_by_id.get(request_id) if request_id else None
+        if entry is not None and reply_action in REPLY_ACTIONS[entry.action]:
+            entry.done = True
+            self.in_flight -= 1
+            del self._pending_by_id[request_id]
+
+    def forget_user(self, user_id: str):
+        """Drops a disconnected user's buckets; their in-flight requests expire on their own."""
+        self._user_buckets.pop(user_id, None)
+        for key in [key for key in self._action_buckets if key[0] == user_id]:
+            del self._action_buckets[key]
+
+    # --- Metrics ---
+    def snapshot(self) -> dict:
+        self._expire(time.monotonic())
+        return {
+            "in_flight": self.in_flight,
+            "queues": {queue: {"ready": depth, "consumers": consumers}
+                       for queue, (depth, consumers) in self.queue_depths.items()},
+            "actions": {action: dict(counters) for action, counters in self.metrics.items()},
+        }
+
+
+async def run_queue_monitor(connection, admission: AdmissionController):
+    """Polls the depth of the Celery queues until cancelled, feeding `admission`."""
+    channel = None
+    while True:
+        try:
+            if channel is None or channel.is_closed:
+                channel = await connection.channel()
+            for queue_name in config.CELERY_QUEUES.values():
+                # Passive: only reads the counts, never creates the queue
+                queue = await channel.declare_queue(queue_name, passive=True)
+                result = queue.declaration_result
+                admission.queue_depths[queue_name] = (result.message_count, result.consumer_count)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A queue that does not exist yet closes the channel; the next poll reopens it
+            print(f"⚠️ Could not read queue depths: {e}")
+            channel = None
+        await asyncio.sleep(config.ADMISSION_QUEUE_POLL_SECONDS)
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import socket
+import uuid
+import src.config as config
+
+def make_instance_id() -> str:
+    """Identifies one server process, e.g. 'web-1-4211-9f2c' (host, pid, random suffix)."""
+    return config.SERVER_INSTANCE_ID or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+
+
+class ConnectionRegistry:
+    """
+    Tracks which server instance holds each user's WebSocket.
+
+    `sessions` holds this process's own connections (the socket plus session
+    state such as registered accounts and task ids); sockets cannot be shared,
+    so that part is always local. `lookup` answers which instance owns a user,
+    which is what workers need to deliver a message to exactly that process.
+    """
+
+    def __init__(self, instance_id: str = None):
+        self.instance_id = instance_id or make_instance_id()
+        self.sessions = {}
+
+    async def register(self, user_id: str, session: dict):
+        """Records a new connection on this instance (replacing an older one elsewhere)."""
+        self.sessions[user_id] = session
+
+    async def unregister(self, user_id: str):
+        self.sessions.pop(user_id, None)
+
+    async def lookup(self, user_id: str) -> str | None:
+        """The instance holding the user's connection, or None if they are not connected."""
+        return self.instance_id if user_id in self.sessions else None
+
+    async def heartbeat(self):
+        """Keeps this instance's entries alive in a shared store (no-op in memory)."""
+
+    async def close(self):
+        pass
+
+
+class InMemoryConnectionRegistry(ConnectionRegistry):
+    """Single-process registry: every connection lives in this process."""
+
+
+class RedisConnectionRegistry(ConnectionRegistry):
+    """
+    Shares user_id -> instance_id through Redis, so several uvicorn workers or
+    hosts can run behind a load balancer.
+
+    Entries expire after `CONNECTION_TTL_SECONDS` unless refreshed by
+    `heartbeat`, so a crashed instance's users are released automatically.
+    Heartbeats and unregistering only touch an entry that still names this
+    instance, so an old instance (e.g. holding a half-open socket) neither
+    takes back nor unregisters a user who reconnected elsewhere.
+    """
+
+    KEY_PREFIX = 'ws:user:'
+
+    # Compare-and-delete: only remove the key if it still points at this instance
+    _UNREGISTER_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    # Compare-and-refresh: extend the key's TTL only while it still points at this instance;
+    # re-claim it if it expired, but never take it back from an instance the user reconnected to
+    _HEARTBEAT_SCRIPT = """
+    local owner = redis.call('get', KEYS[1])
+    if owner == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    elseif not owner then
+        return redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2]) and 1 or 0
+    end
+    return 0
+    """
+
+    def __init__(self, redis_url: str = None, instance_id: str = None, ttl_seconds: int = None):
+        import redis.asyncio as aioredis
+        super().__init__(instance_id)
+        self.redis = aioredis.from_url(redis_url or config.REDIS_URL, decode_responses=True)
+        self.ttl = ttl_seconds or config.CONNECTION_TTL_SECONDS
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    async def register(self, user_id: str, session: dict):
+        await super().register(user_id, session)
+        await self.redis.set(self._key(user_id), self.instance_id, ex=self.ttl)
+
+    async def unregister(self, user_id: str):
+        await super().unregister(user_id)
+        await self.redis.eval(self._UNREGISTER_SCRIPT, 1, self._key(user_id), self.instance_id)
+
+    async def lookup(self, user_id: str) -> str | None:
+        if user_id in self.sessions:
+            return self.instance_id
+        return await self.redis.get(self._key(user_id))
+
+    async def heartbeat(self):
+        if not self.sessions:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in list(self.sessions):
+                pipe.eval(self._HEARTBEAT_SCRIPT, 1, self._key(user_id), self.instance_id, int(self.ttl * 1000))
+            await pipe.execute()
+
+    async def close(self):
+        for user_id in list(self.sessions):
+            await self.unregister(user_id)
+        await self.redis.aclose()
+
+
+def create_registry() -> ConnectionRegistry:
+    """Builds the registry selected by `config.CONNECTION_REGISTRY` ('memory' or 'redis')."""
+    if config.CONNECTION_REGISTRY == 'redis':
+        return RedisConnectionRegistry()
+    if config.CONNECTION_REGISTRY == 'memory':
+        return InMemoryConnectionRegistry()
+    raise ValueError(f"Unknown CONNECTION_REGISTRY '{config.CONNECTION_REGISTRY}'. Use 'memory' or 'redis'.")
+
+
+async def run_heartbeat(registry: ConnectionRegistry):
+    """Refreshes the registry's entries until cancelled."""
+    while True:
+        await asyncio.sleep(config.CONNECTION_HEARTBEAT_SECONDS)
+        try:
+            await registry.heartbeat()
+        except Exception as e:
+            print(f"⚠️ Connection registry heartbeat failed: {e}")
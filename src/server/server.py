@@ -1,65 +1,109 @@
 import asyncio
 import json
+import uuid
 import src.config as config
-import websockets
 from fastapi import FastAPI, WebSocket
-from src.tasks.tasks import handle_api_request, task_persist_orderbook_data
+from src.tasks.signatures import (
+    handle_api_request, task_persist_orderbook_data, task_smart_route_order, task_run_execution_algo,
+    task_compare_funding_rates, task_prefetch_analysis
+)
 from src.celery_app import celery_app
+from src.utils.credential_store import CredentialStore
+from src.utils.stop_signals import request_stop, user_scope
+from src.utils.notifications import NOTIFICATIONS_EXCHANGE, ROUTED_NOTIFICATIONS_EXCHANGE
+from src.server.admission import ACTION_QUEUES, AdmissionController, run_queue_monitor
+from src.server.connection_registry import create_registry, run_heartbeat
+from src.utils.profiler import LoopLagMonitor, profile_event_loop
 from aio_pika import connect_robust, ExchangeType, IncomingMessage
 from starlette.websockets import WebSocketDisconnect
 
 app = FastAPI()
 
-# This dictionary maps a user_id to their WebSocket connection object.
-# In a production system, this mapping should be stored in a shared cache like Redis.
-CONNECTED_CLIENTS = {}
+# Sessions connected to this process, and which instance holds every other user
+# (shared through Redis with CONNECTION_REGISTRY=redis, so several server
+# processes can run behind a load balancer).
+connections = create_registry()
+
+# Accounts registered by a session are stored here and referenced by handle.
+credential_store = CredentialStore(config.CREDENTIAL_STORE_DIR, config.CREDENTIAL_STORE_KEY)
+
+# Rate limits and load shedding for messages that enqueue work.
+admission = AdmissionController()
+
+# Continuous event-loop lag measurement (LOOP_LAG_MONITOR_ENABLED).
+loop_lag = LoopLagMonitor()
 
 @app.on_event("startup")
 async def startup_rabbitmq_listener():
-    # connect to RabbitMQ and bind to our fanout exchange
+    # connect to RabbitMQ and bind to the fanout exchange (messages for any
+    # instance) and to our own routing key on the direct exchange
     connection = await connect_robust(config.RABBITMQ_URL)
     channel = await connection.channel()
-    exchange = await channel.declare_exchange("notifications_exchange", ExchangeType.FANOUT)
+    exchange = await channel.declare_exchange(NOTIFICATIONS_EXCHANGE, ExchangeType.FANOUT)
+    routed_exchange = await channel.declare_exchange(ROUTED_NOTIFICATIONS_EXCHANGE, ExchangeType.DIRECT)
     queue = await channel.declare_queue(exclusive=True)
     await queue.bind(exchange)
+    await queue.bind(routed_exchange, routing_key=connections.instance_id)
 
     async def on_message(message: IncomingMessage):
         async with message.process():
             body = json.loads(message.body)
             user_id = body.get("user_id")
             payload = body.get("payload")
-            entry = CONNECTED_CLIENTS.get(user_id, {})
+            admission.on_reply(payload.get("request_id"), payload.get("action"))
+            entry = connections.sessions.get(user_id, {})
+            if entry and payload.get("action") == "analysis_prefetch":
+                # Kept for the user's next analyze_and_place_order, not sent to the client
+                data = payload["data"]
+                entry["prefetched"].setdefault(data["symbol"], {})[data["exchange"]] = data
+                return
             websocket = entry.get("websocket")
             if websocket:
-                await websocket.send_json(payload)
-                print(f"Broadcasted via WS to {user_id}: {payload}")
+                try:
+                    await websocket.send_json(payload)
+                    print(f"Broadcasted via WS to {user_id}: {payload}")
+                except Exception as e:
+                    print(f"Could not deliver message to {user_id}: {e}")
 
     await queue.consume(on_message)
+    app.state.registry_heartbeat = asyncio.create_task(run_heartbeat(connections))
+    app.state.queue_monitor = asyncio.create_task(run_queue_monitor(connection, admission))
+    if config.LOOP_LAG_MONITOR_ENABLED:
+        app.state.loop_lag_monitor = asyncio.create_task(loop_lag.run())
+    if config.PROFILE_ON_START_SECONDS:
+        app.state.loop_profile = asyncio.create_task(profile_event_loop(config.PROFILE_ON_START_SECONDS))
+    print(f"Server instance '{connections.instance_id}' is listening for notifications.")
+
 
+@app.on_event("shutdown")
+async def shutdown_connection_registry():
+    for name in ("registry_heartbeat", "queue_monitor", "loop_lag_monitor", "loop_profile"):
+        background = getattr(app.state, name, None)
+        if background:
+            background.cancel()
+    await connections.close()
 
-def broadcast_message(user_id: str, message: dict):
+
+def stop_task(task_id: str):
     """
-    Finds a user's WebSocket connection and sends them a message.
-    This function is called by the Celery worker.
+    Stops a long-running task cooperatively: it finishes its current step,
+    flushes and exits, so the worker process is not killed and respawned.
+    The revoke (without terminate) only drops the task if it has not started yet.
     """
-    # This needs to run in the main server's event loop
-    async def send_async():
-        entry = CONNECTED_CLIENTS.get(user_id, {})
-        websocket = entry.get("websocket")
-        if websocket:
-            try:
-                await websocket.send_json(message)
-                print(f"Sent update to user {user_id}")
-            except websockets.exceptions.ConnectionClosed:
-                # Clean up if the user disconnected
-                del CONNECTED_CLIENTS[user_id]
-        else:
-            print(f"Could not send update, user {user_id} not connected.")
-
-    # Get the running event loop from the main server thread and run the task
-    loop = asyncio.get_event_loop()
-    if loop.is_running():
-        asyncio.create_task(send_async())
+    request_stop(task_id)
+    celery_app.control.revoke(task_id)
+
+
+async def run_server_profile(websocket: WebSocket, seconds: float):
+    """Profiles this server's event loop and sends the result to the user who asked for it."""
+    try:
+        result = await profile_event_loop(seconds)
+        await websocket.send_json({"action": "server_profile", "status": "completed", **result})
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Server profile failed: {e}")
+
 
 async def ws_handler(websocket: WebSocket):
     """Handles incoming WebSocket connections and messages."""
@@ -77,7 +121,10 @@ async def ws_handler(websocket: WebSocket):
             await websocket.close(1008, "User ID is required for connection.")
             return
 
-        CONNECTED_CLIENTS[user_id] = {"websocket": websocket, "persistence_task_id": None}
+        await connections.register(user_id, {
+            "websocket": websocket, "persistence_task_id": None, "account_ids": set(), "task_ids": set(),
+            "prefetched": {}
+        })
         print(f"User '{account_name}' with user ID '{user_id}' connected.")
         await websocket.send_json({"status": "connected", "account_name": account_name,"user_id": user_id})
 
@@ -87,39 +134,141 @@ async def ws_handler(websocket: WebSocket):
             req = json.loads(msg)
             action = req.get("action")
 
-            if action in ("get_account_info", "place_market_order", "place_limit_order", "analyze_and_place_order"):
+            if action in ACTION_QUEUES:
+                # Rejected before anything is enqueued; stop/register actions are never limited
+                # Echoed by the worker in its replies, so the in-flight slot is released by this request's own answer
+                req["request_id"] = uuid.uuid4().hex
+                rejection = admission.admit(user_id, action, req["request_id"])
+                if rejection:
+                    await websocket.send_json(rejection)
+                    continue
+
+            if action in ("get_account_info", "place_market_order", "place_limit_order", "analyze_and_place_order",
+                          "place_batch_orders"):
                 # proxy trading actions into Celery
                 req["user_id"] = user_id
-                handle_api_request.delay(req)
+                if action == "analyze_and_place_order":
+                    # Prefetched funding/market data for the symbol, per exchange
+                    symbol = req.get("params", {}).get("symbol")
+                    req["prefetched"] = connections.sessions[user_id]["prefetched"].get(symbol)
+                handle_api_request.apply_async(
+                    args=[req],
+                    priority=config.ACTION_PRIORITIES.get(action, config.CELERY_DEFAULT_PRIORITY)
+                )
                 await websocket.send_json({"status": "processing", "action": action})
 
+            elif action in ("smart_route_order", "start_execution_algo", "compare_funding_rates"):
+                # These span several accounts/exchanges or run for minutes, so they get their own tasks
+                req["user_id"] = user_id
+                long_task = {
+                    "smart_route_order": task_smart_route_order,
+                    "start_execution_algo": task_run_execution_algo,
+                    "compare_funding_rates": task_compare_funding_rates,
+                }[action]
+                result = long_task.apply_async(
+                    args=[req],
+                    priority=config.ACTION_PRIORITIES.get(action, config.CELERY_DEFAULT_PRIORITY)
+                )
+                connections.sessions[user_id]["task_ids"].add(result.id)
+                # The task_id can be passed to `stop_task`
+                await websocket.send_json({"status": "processing", "action": action, "task_id": result.id})
+
+            elif action == "register_account":
+                # Store the credentials once per session; later trade messages
+                # only reference the returned account_id.
+                if not all([req.get("account_name"), req.get("exchange"), req.get("api_key"), req.get("api_secret")]):
+                    await websocket.send_json({
+                        "action": action, "status": "error",
+                        "message": "Missing required data (account_name, exchange, api_key, api_secret)"
+                    })
+                    continue
+                account_id = credential_store.register(req)
+                connections.sessions[user_id]["account_ids"].add(account_id)
+                print(f"Registered account '{req.get('account_name')}' on {req.get('exchange')} for user {user_id}")
+                await websocket.send_json({
+                    "action": action, "status": "registered", "account_id": account_id,
+                    "account_name": req.get("account_name"), "exchange": req.get("exchange")
+                })
+
             elif action == "start_orderbook":
                 # This action now serves two purposes:
                 # 1. Echo back to the client to start the UI polling.
                 # 2. Start the backend data persistence task.
                 exchange = req.get("exchange")
                 symbol = req.get("symbol", "BTC/USDT")
-                task = task_persist_orderbook_data.delay(
-                    exchange, symbol, config.DATA_CAPTURE_INTERVAL_SECONDS
+                task = task_persist_orderbook_data.apply_async(
+                    args=[exchange, symbol, config.DATA_CAPTURE_INTERVAL_SECONDS, user_id],
+                    priority=config.PERSISTENCE_PRIORITY
                 )
-                # Now this works because CONNECTED_CLIENTS[user_id] is a dict
-                CONNECTED_CLIENTS[user_id]["persistence_task_id"] = task.id
+                connections.sessions[user_id]["persistence_task_id"] = task.id
                 print(f"Launched persistence task {task.id} for user {user_id}")
+                # The user is likely to trade what they watch: warm the pre-trade analysis
+                task_prefetch_analysis.apply_async(args=[exchange, symbol, user_id], priority=config.PREFETCH_PRIORITY)
 
                 # Echo back on the socket stored in the dict:
-                await CONNECTED_CLIENTS[user_id]["websocket"].send_json({
+                await connections.sessions[user_id]["websocket"].send_json({
                     "action": action, "exchange": exchange, "symbol": symbol
                 })
+            elif action == "prefetch_analysis":
+                # Speculative: fetch funding and market metadata ahead of an analyze_and_place_order
+                exchange = req.get("exchange")
+                symbol = req.get("symbol")
+                if not exchange or not symbol:
+                    await websocket.send_json({"action": action, "status": "error",
+                                               "message": "prefetch_analysis requires 'exchange' and 'symbol'."})
+                    continue
+                task_prefetch_analysis.apply_async(args=[exchange, symbol, user_id], priority=config.PREFETCH_PRIORITY)
+                await websocket.send_json({"status": "processing", "action": action})
+
             elif action == "stop_orderbook_persistence":
-                task_id = CONNECTED_CLIENTS[user_id].get("persistence_task_id")
+                task_id = connections.sessions[user_id].get("persistence_task_id")
                 if task_id:
-                    print(f"Revoking persistence task {task_id} for user {user_id}")
-                    celery_app.control.revoke(task_id, terminate=True)
-                    CONNECTED_CLIENTS[user_id]["persistence_task_id"] = None
+                    print(f"Stopping persistence task {task_id} for user {user_id}")
+                    await asyncio.to_thread(stop_task, task_id)
+                    connections.sessions[user_id]["persistence_task_id"] = None
                     await websocket.send_json({"status": "stopped", "action": action})
                 else:
                     await websocket.send_json({"status": "error", "message": "No active persistence task found."})
             
+            elif action == "stop_task":
+                # Only tasks started from this session can be stopped
+                task_id = req.get("task_id")
+                if task_id in connections.sessions[user_id]["task_ids"]:
+                    await asyncio.to_thread(stop_task, task_id)
+                    connections.sessions[user_id]["task_ids"].discard(task_id)
+                    await websocket.send_json({"status": "stopping", "action": action, "task_id": task_id})
+                else:
+                    await websocket.send_json({"status": "error", "action": action,
+                                               "message": f"No task {task_id} started in this session."})
+
+            elif action in ("start_profiling", "stop_profiling"):
+                # Diagnostics: sample worker tasks and/or this server's event loop (see src/utils/profiler.py)
+                if user_id not in config.PROFILING_ADMINS:
+                    await websocket.send_json({"action": action, "status": "error",
+                                               "message": "Profiling is not enabled for this user."})
+                    continue
+                target = req.get("target", "all")
+                seconds = float(req.get("seconds", 30 if action == "start_profiling" else 0))
+                tasks = int(req.get("tasks", 0))
+                workers = []
+                if target in ("workers", "all"):
+                    # Reaches every worker (or the given hostnames); each arms its whole pool
+                    replies = await asyncio.to_thread(
+                        celery_app.control.broadcast, action,
+                        arguments={"seconds": seconds, "tasks": tasks} if action == "start_profiling" else {},
+                        destination=req.get("workers"), reply=True, timeout=1.0
+                    )
+                    workers = [hostname for reply in replies or () for hostname in reply]
+                running = getattr(app.state, "loop_profile", None)
+                if running and not running.done() and (action == "stop_profiling" or target in ("server", "all")):
+                    running.cancel()
+                if action == "start_profiling" and target in ("server", "all") and seconds > 0:
+                    app.state.loop_profile = asyncio.create_task(run_server_profile(websocket, seconds))
+                await websocket.send_json({
+                    "action": action, "status": "profiling" if action == "start_profiling" else "stopped",
+                    "workers": workers, "server": target in ("server", "all"), "output_dir": config.PROFILE_OUTPUT_DIR
+                })
+
             elif action == "stop_orderbook":
                 # This remains for stopping the UI polling on the client
                 await websocket.send_json({"action": action})
@@ -134,13 +283,33 @@ async def ws_handler(websocket: WebSocket):
         print(f"User '{user_id}' disconnected (normal closure).")
     finally:
         # Clean up the connection on disconnect
-        if user_id and user_id in CONNECTED_CLIENTS:
-            # Also terminate any running persistence task on disconnect
-            task_id = CONNECTED_CLIENTS[user_id].get("persistence_task_id")
-            if task_id:
-                print(f"Client disconnected, revoking task {task_id}")
-                celery_app.control.revoke(task_id, terminate=True)
-            del CONNECTED_CLIENTS[user_id]
+        # Skip if the same user has since reconnected on this instance with a new socket
+        if user_id and connections.sessions.get(user_id, {}).get("websocket") is websocket:
+            # Also stop the persistence task and the user's PnL monitors on disconnect.
+            # Execution algos keep working; they are stopped explicitly with `stop_task`.
+            task_id = connections.sessions[user_id].get("persistence_task_id")
+            try:
+                if task_id:
+                    print(f"Client disconnected, stopping task {task_id}")
+                    await asyncio.to_thread(stop_task, task_id)
+                await asyncio.to_thread(request_stop, user_scope(user_id))
+            except Exception as e:
+                print(f"Could not stop background tasks for {user_id}: {e}")
+            # Registered accounts only live as long as the session
+            for account_id in connections.sessions[user_id].get("account_ids", ()):
+                credential_store.delete(account_id)
+            admission.forget_user(user_id)
+            await connections.unregister(user_id)
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Admitted and rejected work per action, requests in flight and queue depths."""
+    return admission.snapshot()
+
+@app.get("/metrics/loop_lag")
+async def loop_lag_metrics():
+    """Event-loop lag percentiles since startup (needs LOOP_LAG_MONITOR_ENABLED)."""
+    return {"enabled": config.LOOP_LAG_MONITOR_ENABLED, **loop_lag.summary()}
 
 @app.websocket("/")
 async def websocket_endpoint(ws: WebSocket):
@@ -0,0 +1,27 @@
+from celery.signals import worker_init
+from celery.worker.control import control_command
+import src.config as config
+from src.utils import profiler
+
+
+# Remote control commands run in the worker parent, which shares the armed
+# profiling state with its pool children (see src/utils/profiler.py).
+@control_command(args=[('seconds', float), ('tasks', int)], signature='[seconds [tasks]]')
+def start_profiling(state, seconds=0.0, tasks=0):
+    """Profiles this worker's tasks for `seconds` and/or the next `tasks` tasks."""
+    profiler.arm(seconds, tasks)
+    return {'ok': profiler.armed_state()}
+
+
+@control_command()
+def stop_profiling(state):
+    """Stops arming new task profiles; tasks being sampled finish their profile."""
+    profiler.disarm()
+    return {'ok': profiler.armed_state()}
+
+
+@worker_init.connect
+def _arm_profiling_from_env(sender=None, **kwargs):
+    if config.PROFILE_ON_START_SECONDS or config.PROFILE_ON_START_TASKS:
+        profiler.arm(config.PROFILE_ON_START_SECONDS, config.PROFILE_ON_START_TASKS)
+        print(f"🔥 Task profiling armed from the environment: {profiler.armed_state()}")
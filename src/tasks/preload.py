@@ -0,0 +1,52 @@
+import gc
+import importlib
+import time
+from celery.signals import worker_init
+import src.config as config
+from src.exchanges.funding_service import get_funding_service
+from src.exchanges.symbol_mapper import get_symbol_mapper
+
+
+def _consumed_queues(worker) -> list:
+    try:
+        return list(worker.app.amqp.queues.consume_from)
+    except Exception:
+        return list(config.CELERY_QUEUES.values())
+
+
+def preload_worker_state(queues: list):
+    """
+    Loads what every task in a worker would otherwise load on its own: the
+    symbol map, the public markets of `WORKER_PRELOAD_EXCHANGES` and the heavy
+    modules of the consumed queues (`WORKER_PRELOAD_MODULES`).
+
+    Runs in the worker parent before the pool forks, so prefork children share
+    it copy-on-write. Objects are then moved to the permanent GC generation
+    (`gc.freeze`), so the children's collections do not touch, and thereby
+    copy, the shared pages.
+    """
+    started = time.perf_counter()
+    for queue in queues:
+        for module in config.WORKER_PRELOAD_MODULES.get(queue, ()):
+            importlib.import_module(module)
+
+    get_symbol_mapper()
+
+    service = get_funding_service()
+    for exchange_id in config.WORKER_PRELOAD_EXCHANGES:
+        try:
+            client = service.public_client(exchange_id)
+            # Children must open their own connections, not share the parent's sockets
+            client.session.close()
+        except Exception as e:
+            print(f"⚠️ Could not preload markets for {exchange_id}, children will load them: {e}")
+
+    gc.collect()
+    gc.freeze()
+    print(f"✅ Preloaded worker state for {', '.join(queues)} in {time.perf_counter() - started:.1f}s.")
+
+
+@worker_init.connect
+def _preload_on_worker_init(sender=None, **kwargs):
+    if config.WORKER_PRELOAD_ENABLED:
+        preload_worker_state(_consumed_queues(sender))
@@ -0,0 +1,18 @@
+from src.celery_app import celery_app
+
+# Signatures of the worker tasks, for processes that only dispatch them (the
+# WebSocket server, benchmarks). Importing `src.tasks.tasks` would pull in
+# ccxt, pandas, pyarrow and boto3; a signature only needs the task name, and
+# `apply_async` sends it by name with the usual routing and priorities.
+TASKS_MODULE = 'src.tasks.tasks'
+
+def task_signature(name: str):
+    """A signature for `src.tasks.tasks.<name>` that does not import the task code."""
+    return celery_app.signature(f"{TASKS_MODULE}.{name}")
+
+handle_api_request = task_signature('handle_api_request')
+task_persist_orderbook_data = task_signature('task_persist_orderbook_data')
+task_smart_route_order = task_signature('task_smart_route_order')
+task_run_execution_algo = task_signature('task_run_execution_algo')
+task_compare_funding_rates = task_signature('task_compare_funding_rates')
+task_prefetch_analysis = task_signature('task_prefetch_analysis')
@@ -1,156 +1,415 @@
+import asyncio
 import os
 import sys
 import pika
 import json
 import src.config as config
-from src.exchanges.symbol_mapper import SymbolMapper 
-from src.utils.data_persistor import S3Persistor
+from src.utils.stop_signals import StopSignal, user_scope
+from src.utils.notifications import NotificationPublisher, publish_notification
 import ccxt
 import time
+from concurrent.futures import ThreadPoolExecutor
 # ensure the project root is on PYTHONPATH so we can import server
 project_root = os.path.dirname(os.path.abspath(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from src.celery_app import celery_app
-from src.exchanges.unified_exchange import UnifiedExchangeAPI
+import src.tasks.preload  # noqa: F401 (preloads shared state in the worker parent)
+import src.tasks.control  # noqa: F401 (registers the profiling remote control commands)
+from src.exchanges.balance_cache import get_balance_cache
+from src.exchanges.client_cache import get_client, resolve_account
+from src.exchanges.funding_service import get_funding_service
+from src.exchanges.order_streams import FINAL_ORDER_STATUSES
+from src.exchanges.smart_router import SmartOrderRouter
+from src.exchanges.unified_exchange import market_summary
+from src.execution.algo_engine import ExecutionAlgoEngine, ParentOrder
+from src.utils.profiler import profiled
 
-def publish_result(body: dict):
+def publish_result(body: dict, request_id: str = None):
     """
-    Publishes the result to a RabbitMQ fanout exchange.
+    Publishes the result to the server instance holding the user's WebSocket
+    (see `notifications.publish_notification`).
+
+    `request_id` (set by the server on requests it admits) is echoed in the
+    payload, so the server can tell which request a reply answers.
     """
-    connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
-    channel = connection.channel()
-    channel.exchange_declare(exchange='notifications_exchange', exchange_type='fanout')
-    channel.basic_publish(
-        exchange='notifications_exchange',
-        routing_key='',
-        body=json.dumps(body)
-    )
-    connection.close()
+    if request_id:
+        body["payload"]["request_id"] = request_id
+    publish_notification(body)
     print(f"Worker published FINAL result for user {body}")
 
+def publish_fill(request_data: dict, client, order: dict):
+    """
+    Publishes an order's fill to the durable portfolio queue, where the
+    portfolio service nets it into the user's positions, and applies it to the
+    account's cached balance. Orders without fills are ignored.
+    """
+    if not order or not order.get('filled') or not order.get('average'):
+        return
+    try:
+        get_balance_cache().apply_fill(client, order)
+    except Exception as e:
+        print(f"⚠️ Could not apply fill for order {order.get('id')} to the cached balance: {e}")
+    try:
+        market = client.client.market(order['symbol'])
+        contract_size = market.get('contractSize') if market.get('contract') else 1.0
+        fill = {
+            "user_id": request_data.get('user_id'),
+            # Stable across sessions, so an account's fills net into one position per symbol
+            "account": client.account_key,
+            "exchange": client.exchange_name,
+            "symbol": order['symbol'],
+            "side": order['side'],
+            "filled": order['filled'],
+            "average": order['average'],
+            "contract_size": contract_size or 1.0,
+            "fee": (order.get('fee') or {}).get('cost') or 0.0,
+            "order_id": order.get('id'),
+            "timestamp": order.get('lastTradeTimestamp') or order.get('timestamp'),
+        }
+        connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+        channel = connection.channel()
+        channel.queue_declare(queue=config.PORTFOLIO_FILLS_QUEUE, durable=True)
+        channel.basic_publish(
+            exchange='',
+            routing_key=config.PORTFOLIO_FILLS_QUEUE,
+            body=json.dumps(fill),
+            properties=pika.BasicProperties(delivery_mode=2)  # Persistent
+        )
+        connection.close()
+    except Exception as e:
+        print(f"❌ Could not publish fill for order {order.get('id')}: {e}")
 
 @celery_app.task(bind=True)
-def task_persist_orderbook_data(self, exchange_id: str, symbol: str, interval: int):
+@profiled('task_persist_orderbook_data')
+def task_persist_orderbook_data(self, exchange_id: str, symbol: str, interval: int, user_id: str = None):
     """
     A long-running Celery task that captures and persists order book data.
     The `bind=True` allows us to access the task's own request context.
+
+    Each capture also computes derived metrics (mid, spread, depth bands,
+    imbalance, microprice), persisted to `orderbook_metrics/` and, when a
+    `user_id` is given, pushed live to that user as `orderbook_metrics`.
+
+    Stop it with `request_stop(task_id)` (or the user's scope): the loop exits
+    at the next check and buffered data is flushed before the task returns.
     """
+    # pandas/pyarrow/numpy are only needed here; persistence workers preload them (WORKER_PRELOAD_MODULES)
+    from src.utils.book_metrics import snapshot_metrics
+    from src.utils.data_persistor import create_persistor
+
     print(f"🚀 Starting data persistence pipeline for {symbol} on {exchange_id}...")
-    persistor = S3Persistor(
-        bucket_name=config.AWS_S3_BUCKET_NAME,
-        aws_access_key=config.AWS_ACCESS_KEY_ID,
-        aws_secret_key=config.AWS_SECRET_ACCESS_KEY,
-        region=config.AWS_REGION
-    )
+    # Uploads run on a background pool, so a slow store cannot delay the next capture
+    persistor = create_persistor()
 
     # Initialize the ccxt client for this task
     exchange = getattr(ccxt, exchange_id)()
+    # Live metrics are pushed from a background thread, so the broker is never on the capture path
+    publisher = NotificationPublisher() if user_id else None
+
+    stop = StopSignal(self.request.id, [user_scope(user_id)] if user_id else [])
+    next_capture = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                snapshot = exchange.fetch_order_book(symbol)
+                persistor.write_orderbook_snapshot(exchange_id, symbol, snapshot)
+                metrics = snapshot_metrics(snapshot)
+                persistor.write_metrics(exchange_id, symbol, metrics)
+                if publisher:
+                    publisher.publish({"user_id": user_id, "payload": {
+                        "action": "orderbook_metrics", "exchange": exchange_id, "symbol": symbol,
+                        "timestamp": snapshot.get('timestamp'), "data": metrics
+                    }})
+            except Exception as e:
+                print(f"Error in persistence loop for {symbol}: {e}")
 
-    while True:
-        try:
-            snapshot = exchange.fetch_order_book(symbol)
-            persistor.write_orderbook_snapshot(exchange_id, symbol, snapshot)
-        except Exception as e:
-            print(f"Error in persistence loop for {symbol}: {e}")
-        
-        # Wait for the configured interval
-        time.sleep(interval)
+            # Keep a fixed cadence: sleep until the next scheduled capture rather than
+            # a full interval after this one, and skip captures we are already late for
+            next_capture += interval
+            now = time.monotonic()
+            if next_capture < now:
+                next_capture = now
+            if stop.wait(next_capture - now):
+                break
+    finally:
+        persistor.close(timeout=config.UPLOAD_FLUSH_TIMEOUT_SECONDS)
+        if publisher:
+            publisher.close(timeout=config.UPLOAD_FLUSH_TIMEOUT_SECONDS)
+        stop.close()
 
     print(f"⏹️ Stopping data persistence for {symbol} on {exchange_id}.")
     return "Data persistence task terminated."
 
-@celery_app.task
-def task_monitor_pnl(request_data: dict, filled_order: dict):
+@celery_app.task(bind=True)
+def task_monitor_pnl(self, request_data: dict, filled_order: dict):
     """
     A dedicated Celery task to monitor PnL for a filled order asynchronously.
+    Stops early when the user's session ends (see `user_scope`).
     """
     user_id = request_data.get('user_id')
     print(f"🚀 Starting background PnL monitoring for user {user_id}...")
 
-    # We must re-initialize the client within the new task's process
-    client = UnifiedExchangeAPI(
-        account_name=request_data.get('account_name'),
-        exchange_name=request_data.get('exchange'),
-        api_key=request_data.get('api_key'),
-        secret_key=request_data.get('api_secret'),
-        password=request_data.get('password'), # Pass the password
-        symbol_mapper=SymbolMapper(),
-        is_testnet=request_data.get('is_testnet', False)
-    )
+    # Reuses this process's cached client when the request references a registered account
+    try:
+        client = get_client(request_data)
+    except ValueError as e:
+        publish_result({"user_id": user_id, "payload": {"action": "pnl_update", "status": "error", "message": str(e)}})
+        return "PnL monitoring aborted."
 
     # The PnL monitoring loop now runs here, in the background
-    for pnl_update in client.monitor_position_pnl(filled_order):
-        publish_result({
-            "user_id": user_id,
-            "payload": {"action": "pnl_update", "status": "monitoring", "data": pnl_update}
-        })
-    
+    stop = StopSignal(self.request.id, [user_scope(user_id)])
+    try:
+        for pnl_update in client.monitor_position_pnl(filled_order):
+            if stop.is_set():
+                break
+            publish_result({
+                "user_id": user_id,
+                "payload": {"action": "pnl_update", "status": "monitoring", "data": pnl_update}
+            })
+    finally:
+        stop.close()
+
     # Notify client that monitoring has stopped
     publish_result({"user_id": user_id, "payload": {"action": "pnl_update", "status": "stopped"}})
     return "Background PnL monitoring complete."
 
 @celery_app.task
-def handle_api_request(request_data: dict):
-    import src.server.server as server  # now resolves correctly
+def task_smart_route_order(request_data: dict):
+    """
+    Routes one order for a universal symbol across several accounts/exchanges.
 
+    `params.accounts` lists the accounts to route across, each either
+    {"account_id": ...} or inline credentials as accepted by `handle_api_request`.
+    """
+    user_id = request_data.get('user_id')
+    request_id = request_data.get('request_id')
+    action = request_data.get('action', 'smart_route_order')
+    order_params = request_data.get('params', {})
+    print(f"Worker received smart routing job for User '{user_id}'")
+
+    try:
+        accounts = order_params.get('accounts', [])
+        if not accounts:
+            raise Exception("smart_route_order requires a non-empty 'accounts' list.")
+        account_requests = [{**account, "user_id": user_id} for account in accounts]
+        clients = [get_client(account_request) for account_request in account_requests]
+
+        router = SmartOrderRouter(clients)
+        plan = router.compute_split(
+            order_params.get('symbol'), order_params.get('side'), order_params.get('trade_volume_quote')
+        )
+        publish_result({"user_id": user_id, "payload": {"action": "routing_plan", "status": plan["status"], "data": plan}},
+                       request_id=request_id)
+
+        if plan["status"] != "success":
+            raise Exception(f"Cannot route order: {plan['message']}")
+        if order_params.get('dry_run', False):
+            return "Dry run complete, no orders placed."
+
+        children = router.execute(plan)
+
+        # Start PnL monitoring for every filled child, against the account that filled it
+        venues = [router.venue(c) for c in clients]
+        venue_requests = dict(zip(venues, account_requests))
+        for child in children:
+            publish_fill(venue_requests[child['venue']], clients[venues.index(child['venue'])], child.get('order'))
+            if child.get('status') in ['closed', 'filled']:
+                task_monitor_pnl.apply_async(
+                    args=[venue_requests[child['venue']], child['order']], priority=config.PNL_MONITOR_PRIORITY
+                )
+
+        filled = sum(1 for child in children if child.get('status') in ['closed', 'filled'])
+        if filled == len(children):
+            status = 'completed'
+        elif filled == 0:
+            status = 'error'
+        else:
+            status = 'partial'
+        result = {"status": status, "children": children}
+
+    except Exception as e:
+        print(f"An error occurred while routing order for {user_id}: {e}")
+        result = {"status": "error", "message": str(e)}
+
+    publish_result({
+        "user_id": user_id,
+        "payload": {"action": action, "status": result.get("status"), "data": result}
+    }, request_id=request_id)
+    return "Smart order routing completed."
+
+@celery_app.task(bind=True)
+def task_run_execution_algo(self, request_data: dict):
+    """
+    Works one or more TWAP/VWAP parent orders concurrently on a single event loop,
+    streaming progress updates to the user.
+
+    `params.orders` lists the parent orders; each may reference its own
+    `account_id`, otherwise the request's account is used. `request_stop(task_id)`
+    stops placing further slices; parents then finish as 'canceled'.
+    """
+    user_id = request_data.get('user_id')
+    request_id = request_data.get('request_id')
+    action = request_data.get('action', 'start_execution_algo')
+    order_params = request_data.get('params', {})
+    parent_specs = order_params.get('orders') or [order_params]
+    print(f"Worker received {len(parent_specs)} execution algo order(s) for User '{user_id}'")
+
+    def publish_progress(status: str, data: dict):
+        publish_result({"user_id": user_id, "payload": {"action": "execution_algo", "status": status, "data": data}},
+                       request_id=request_id)
+
+    stop = StopSignal(self.request.id)
+    try:
+        parents = []
+        parent_requests = {}
+        for spec in parent_specs:
+            parent_request = {**request_data, "account_id": spec.get('account_id', request_data.get('account_id'))}
+            client = get_client(parent_request)
+            parents.append(ParentOrder(
+                client=client,
+                symbol=spec['symbol'],
+                side=spec['side'],
+                trade_volume_quote=spec['trade_volume_quote'],
+                algo=spec.get('algo', 'twap'),
+                duration_seconds=spec.get('duration_seconds', 600),
+                num_slices=spec.get('num_slices', 10),
+                max_impact_percent=spec.get('max_impact_percent'),
+                volume_profile=spec.get('volume_profile'),
+                parent_id=spec.get('parent_id'),
+            ))
+            parent_requests[parents[-1].parent_id] = parent_request
+
+        engine = ExecutionAlgoEngine(
+            publish_progress,
+            on_fill=lambda parent, order: publish_fill(parent_requests[parent.parent_id], parent.client, order),
+            should_stop=stop.is_set
+        )
+        summaries = asyncio.run(engine.run(parents))
+        statuses = {summary['status'] for summary in summaries}
+        result = {"status": statuses.pop() if len(statuses) == 1 else "partial", "parents": summaries}
+    except Exception as e:
+        print(f"An error occurred while running execution algo for {user_id}: {e}")
+        result = {"status": "error", "message": str(e)}
+    finally:
+        stop.close()
+
+    publish_result({
+        "user_id": user_id,
+        "payload": {"action": action, "status": result.get("status"), "data": result}
+    }, request_id=request_id)
+    return "Execution algo completed."
+
+@celery_app.task
+def task_compare_funding_rates(request_data: dict):
+    """
+    Compares funding rates for several symbols across exchanges. Uses public
+    endpoints only, so no account is needed.
+
+    `params.symbols` are universal symbols (e.g., 'BTC/USDT'); `params.exchanges`
+    defaults to `config.FUNDING_COMPARE_EXCHANGES`.
+    """
+    user_id = request_data.get('user_id')
+    request_id = request_data.get('request_id')
+    action = request_data.get('action', 'compare_funding_rates')
+    params = request_data.get('params', {})
+    print(f"Worker received funding comparison for User '{user_id}'")
+
+    try:
+        symbols = params.get('symbols', [])
+        if not symbols:
+            raise Exception("compare_funding_rates requires a non-empty 'symbols' list.")
+        exchanges = params.get('exchanges') or config.FUNDING_COMPARE_EXCHANGES
+        result = {"status": "completed", "data": get_funding_service().compare(symbols, exchanges)}
+    except Exception as e:
+        print(f"An error occurred while comparing funding rates for {user_id}: {e}")
+        result = {"status": "error", "message": str(e)}
+
+    publish_result({"user_id": user_id, "payload": {"action": action, **result}}, request_id=request_id)
+    return "Funding comparison completed."
+
+@celery_app.task
+def task_prefetch_analysis(exchange_id: str, symbol: str, user_id: str):
+    """
+    Speculatively fetches the public parts of a pre-trade analysis (funding rate
+    and market metadata) when a user starts watching a symbol. The server keeps
+    the result in the session and attaches it to the user's next
+    `analyze_and_place_order`, which then only needs to fetch the order book.
+    """
+    try:
+        service = get_funding_service()
+        client = service.public_client(exchange_id)
+        market = client.market(symbol)
+        if market.get('swap', False):
+            funding = service.get_summaries(client, [symbol])[symbol]
+        else:
+            funding = {"status": "info", "message": "Symbol is not a perpetual swap, no funding rate applicable."}
+        data = {
+            "exchange": exchange_id, "symbol": symbol, "sandbox": False, "fetched_at": time.time(),
+            "funding_rate": funding, "market": market_summary(market),
+        }
+    except Exception as e:
+        # Only an optimisation: the analysis fetches everything itself without it
+        print(f"Pre-trade prefetch for {symbol} on {exchange_id} failed: {e}")
+        return "Prefetch failed."
+
+    publish_result({"user_id": user_id, "payload": {"action": "analysis_prefetch", "status": "completed", "data": data}})
+    return "Prefetch completed."
+
+@celery_app.task
+@profiled('handle_api_request')
+def handle_api_request(request_data: dict):
     """
     A Celery task to handle a private API request for a user via the UnifiedExchangeAPI.
     """
-    account_name = request_data.get('account_name')
     user_id = request_data.get('user_id')
+    request_id = request_data.get('request_id')
     action = request_data.get('action')
-    exchange_name = request_data.get('exchange')
-    
-    # --- Extract Credentials ---
-    api_key = request_data.get('api_key')
-    api_secret = request_data.get('api_secret')
-    password = request_data.get('password') # Extract password
-    is_testnet = request_data.get('is_testnet', False)
-    other_creds = {'uid': request_data.get('uid')} if request_data.get('uid') else {}
+
+    # --- Resolve the account (registered handle or inline credentials) ---
+    try:
+        account = resolve_account(request_data)
+    except ValueError as e:
+        error_msg = {"status": "error", "message": str(e)}
+        publish_result({"user_id": user_id, "payload": {"action": action, **error_msg}}, request_id=request_id)
+        return error_msg
+    exchange_name = account.get('exchange')
 
     print(f"Worker received job for User '{user_id}' | Exchange: '{exchange_name}' | Action: '{action}'")
 
-    if not all([account_name, user_id, action, exchange_name, api_key, api_secret]):
-        error_msg = {"status": "error", "message": "Missing required data (user_id, action, exchange, api_key, api_secret)"}
-        server.broadcast_message(user_id, error_msg)
+    if not all([account.get('account_name'), user_id, action, exchange_name, account.get('api_key'), account.get('api_secret')]):
+        error_msg = {"status": "error", "message": "Missing required data (user_id, action, account_id or exchange/api_key/api_secret)"}
+        publish_result({"user_id": user_id, "payload": {"action": action, **error_msg}}, request_id=request_id)
         return error_msg
 
     try:
-        client = UnifiedExchangeAPI(
-            account_name=account_name,
-            exchange_name=exchange_name,
-            api_key=api_key,
-            secret_key=api_secret,
-            password=password, # Pass the password
-            symbol_mapper=SymbolMapper(),
-            is_testnet=is_testnet,
-            **other_creds
-        )
+        client = get_client(request_data)
         order_params = request_data.get('params', {})
 
         if action == 'get_account_info':
-            result = client.get_account_info()
+            result = client.get_account_info(force_refresh=order_params.get('force_refresh', False))
         elif action == 'analyze_and_place_order':
             symbol = order_params.get('symbol')
             side = order_params.get('side')
             trade_volume_quote = order_params.get('trade_volume_quote')
             dry_run = order_params.get('dry_run', False)
 
-            # Step 1: Perform Analysis
-            impact_analysis = client.calculate_price_impact(symbol, side, trade_volume_quote)
-            funding_analysis = client.get_funding_rate_info(symbol)
+            # Step 1: Perform Analysis (book, funding and market metadata concurrently)
+            prefetched = (request_data.get('prefetched') or {}).get(client.exchange_name)
+            analysis = client.analyze_trade(symbol, side, trade_volume_quote, prefetched)
+            impact_analysis = analysis['price_impact']
 
             analysis_payload = {
                 "action": "pre_trade_analysis",
-                "status": "completed",
+                "status": "partial" if analysis['partial'] else "completed",
                 "data": {
                     "price_impact": impact_analysis,
-                    "funding_rate": funding_analysis
+                    "funding_rate": analysis['funding_rate'],
+                    "market": analysis['market']
                 }
             }
-            publish_result({"user_id": user_id, "payload": analysis_payload})
+            publish_result({"user_id": user_id, "payload": analysis_payload}, request_id=request_id)
 
             if dry_run:
                 return "Dry run complete, no order placed."
@@ -165,8 +424,9 @@ def handle_api_request(request_data: dict):
             # Step 3: Monitor and finalize
             filled_order = client.monitor_order(initial_order['id'], symbol)
             result = filled_order
+            publish_fill(request_data, client, filled_order)
             if filled_order.get('status') in ['closed', 'filled']:
-                task_monitor_pnl.delay(request_data, filled_order)
+                task_monitor_pnl.apply_async(args=[request_data, filled_order], priority=config.PNL_MONITOR_PRIORITY)
 
         elif action == 'place_market_order':
             initial = client.place_market_order(
@@ -177,21 +437,60 @@ def handle_api_request(request_data: dict):
             publish_result({
                 "user_id": user_id,
                 "payload": {"action": action, "status": "placed", "data": initial}
-            })
+            }, request_id=request_id)
             
             filled_order = client.monitor_order(initial['id'], order_params['symbol'])
+            publish_fill(request_data, client, filled_order)
 
             publish_result({
                 "user_id": user_id,
                 "payload": {"action": action, "status": "filled", "data": filled_order}
-            })
+            }, request_id=request_id)
 
             if filled_order.get('status') in ['closed', 'filled']:
                 # Start PnL monitoring if the order was filled
-                task_monitor_pnl.delay(request_data, filled_order)
+                task_monitor_pnl.apply_async(args=[request_data, filled_order], priority=config.PNL_MONITOR_PRIORITY)
 
             # set result
             result = filled_order
+        elif action == 'place_batch_orders':
+            legs = order_params.get('orders', [])
+            if not legs:
+                raise Exception("place_batch_orders requires a non-empty 'orders' list.")
+
+            leg_results = client.place_batch_orders(legs)
+            publish_result({
+                "user_id": user_id,
+                "payload": {"action": action, "status": "placed", "data": {"legs": leg_results}}
+            }, request_id=request_id)
+
+            # Track every accepted leg concurrently until it reaches a final state
+            def finalize_leg(leg_result):
+                if leg_result['status'] != 'placed':
+                    return leg_result
+                symbol = legs[leg_result['leg']]['symbol']
+                final_order = client.monitor_order(leg_result['order']['id'], symbol)
+                publish_fill(request_data, client, final_order)
+                if final_order.get('status') in ['closed', 'filled']:
+                    task_monitor_pnl.apply_async(args=[request_data, final_order], priority=config.PNL_MONITOR_PRIORITY)
+                status = final_order.get('status')
+                if status not in FINAL_ORDER_STATUSES:
+                    # monitor_order timed out or failed (its error dict carries the message)
+                    status = 'error'
+                return {**leg_result, "status": status, "order": final_order, "message": final_order.get('message')}
+
+            with ThreadPoolExecutor(max_workers=min(len(leg_results), config.BATCH_ORDER_MAX_WORKERS)) as pool:
+                final_legs = list(pool.map(finalize_leg, leg_results))
+
+            failed = sum(1 for leg in final_legs if leg['status'] in ('error', 'rejected', 'canceled'))
+            if failed == 0:
+                batch_status = 'completed'
+            elif failed == len(final_legs):
+                batch_status = 'error'
+            else:
+                batch_status = 'partial'
+            result = {"status": batch_status, "legs": final_legs}
+
         elif action == 'place_limit_order':
             initial = client.place_limit_order(**order_params)
 
@@ -199,20 +498,21 @@ def handle_api_request(request_data: dict):
             publish_result({
                 "user_id": user_id,
                 "payload": {"action": action, "status": "placed", "data": initial}
-            })
+            }, request_id=request_id)
 
             # now poll until it's closed/filled
             filled_order = client.monitor_order(initial['id'], order_params['symbol'])
+            publish_fill(request_data, client, filled_order)
 
             # Publish final order status
             publish_result({
                 "user_id": user_id,
                 "payload": {"action": action, "status": filled_order.get("status"), "data": filled_order}
-            })
+            }, request_id=request_id)
 
             # If filled, start PnL monitoring
             if filled_order.get('status') in ['closed', 'filled']:
-                task_monitor_pnl.delay(request_data, filled_order)
+                task_monitor_pnl.apply_async(args=[request_data, filled_order], priority=config.PNL_MONITOR_PRIORITY)
             return "Limit order task and potential PnL monitoring complete."
         else:
             result = {"status": "error", "message": f"Unknown action: {action}"}
@@ -232,5 +532,5 @@ def handle_api_request(request_data: dict):
     publish_result({
         "user_id": user_id,
         "payload": final_payload
-    })
+    }, request_id=request_id)
     return "Task and monitoring completed."
\ No newline at end of file
@@ -0,0 +1,77 @@
+import math
+import numpy as np
+import src.config as config
+
+def snapshot_arrays(snapshot: dict, depth: int = None) -> dict:
+    """
+    Converts one ccxt order book into the (1, depth) arrays `compute_metrics` takes,
+    the same layout `orderbook_reader.book_arrays` produces for stored snapshots.
+    """
+    depth = depth or config.METRICS_BOOK_DEPTH
+    arrays = {}
+    for side in ('bids', 'asks'):
+        prices = np.full((1, depth), np.nan)
+        sizes = np.full((1, depth), np.nan)
+        levels = [level[:2] for level in snapshot.get(side, [])[:depth]]
+        if levels:
+            values = np.asarray(levels, dtype=float)
+            prices[0, :len(values)] = values[:, 0]
+            sizes[0, :len(values)] = values[:, 1]
+        arrays[f"{side[:-1]}_prices"], arrays[f"{side[:-1]}_sizes"] = prices, sizes
+    return arrays
+
+
+def compute_metrics(books: dict, bands_bps: list = None) -> dict:
+    """
+    Computes per-snapshot book features for a batch of snapshots at once.
+
+    Args:
+        books (dict): 'bid_prices', 'bid_sizes', 'ask_prices', 'ask_sizes' as (n, depth)
+            NaN-padded arrays, best level first (see `orderbook_reader.book_arrays`).
+        bands_bps (list): Distances from mid, in basis points, to measure resting depth within.
+
+    Returns:
+        dict: float64 arrays of shape (n,):
+            'mid_price', 'spread', 'spread_bps',
+            'imbalance' (top-of-book, -1 all ask to +1 all bid),
+            'microprice' (mid weighted towards the side with less size),
+            'bid_depth_<N>bps', 'ask_depth_<N>bps' (size resting within N bps of mid).
+        Snapshots with an empty side give NaN.
+    """
+    bands_bps = bands_bps or config.METRICS_DEPTH_BANDS_BPS
+    bid_prices, bid_sizes = books['bid_prices'], books['bid_sizes']
+    ask_prices, ask_sizes = books['ask_prices'], books['ask_sizes']
+    best_bid, best_ask = bid_prices[:, 0], ask_prices[:, 0]
+    best_bid_size, best_ask_size = bid_sizes[:, 0], ask_sizes[:, 0]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mid = (best_bid + best_ask) / 2
+        spread = best_ask - best_bid
+        top_size = best_bid_size + best_ask_size
+        metrics = {
+            'mid_price': mid,
+            'spread': spread,
+            'spread_bps': spread / mid * 1e4,
+            'imbalance': (best_bid_size - best_ask_size) / top_size,
+            'microprice': (best_ask * best_bid_size + best_bid * best_ask_size) / top_size,
+        }
+        for band in bands_bps:
+            # NaN padding compares False, so missing levels add nothing
+            lower = (mid * (1 - band / 1e4))[:, None]
+            upper = (mid * (1 + band / 1e4))[:, None]
+            metrics[f'bid_depth_{band}bps'] = np.where(bid_prices >= lower, bid_sizes, 0.0).sum(axis=1)
+            metrics[f'ask_depth_{band}bps'] = np.where(ask_prices <= upper, ask_sizes, 0.0).sum(axis=1)
+            metrics[f'bid_depth_{band}bps'][np.isnan(mid)] = np.nan
+            metrics[f'ask_depth_{band}bps'][np.isnan(mid)] = np.nan
+    return metrics
+
+
+def snapshot_metrics(snapshot: dict, bands_bps: list = None, depth: int = None) -> dict:
+    """
+    Computes `compute_metrics` for a single ccxt order book.
+
+    Returns:
+        dict: Metric name -> float, with None instead of NaN so the result is JSON-safe.
+    """
+    metrics = compute_metrics(snapshot_arrays(snapshot, depth), bands_bps)
+    return {name: (None if math.isnan(values[0]) else float(values[0])) for name, values in metrics.items()}
@@ -0,0 +1,216 @@
+import argparse
+import uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pyarrow import fs
+import src.config as config
+from src.utils.data_persistor import partition_pair
+from src.utils.orderbook_reader import OrderbookReader
+
+COMPACTED_PREFIX = 'compacted-'
+# Readers (Arrow datasets) ignore files starting with '_' or '.', so staged output stays invisible
+STAGING_PREFIX = '_compacting-'
+
+class PartitionCompactor:
+    """
+    Merges the many small per-snapshot Parquet files of a `date=/pair=` partition
+    into a few large, time-sorted files with row groups and column statistics.
+
+    A partition is compacted in four steps:
+        1. read every data file and drop duplicate snapshots,
+        2. sort by timestamp and write staged files that readers ignore,
+        3. verify the staged row count against the input,
+        4. publish the staged files, then delete the originals.
+
+    Step 1 makes reruns safe: if a previous run died between publishing and
+    deleting, the leftover originals are merged again without duplicating rows.
+    """
+
+    def __init__(self, reader: OrderbookReader, row_group_size: int = None, target_file_rows: int = None,
+                 grace_minutes: int = None):
+        """
+        Args:
+            reader (OrderbookReader): Points at the dataset root and filesystem to compact.
+            row_group_size (int): Rows per Parquet row group in the compacted files.
+            target_file_rows (int): Maximum rows per compacted file.
+            grace_minutes (int): How long after midnight (UTC) a day counts as closed,
+                so late uploads for it have landed before it is compacted.
+        """
+        self.root = reader.root
+        self.filesystem = reader.filesystem
+        self.row_group_size = row_group_size or config.COMPACTION_ROW_GROUP_SIZE
+        self.target_file_rows = target_file_rows or config.COMPACTION_TARGET_FILE_ROWS
+        self.grace = timedelta(minutes=config.COMPACTION_GRACE_MINUTES if grace_minutes is None else grace_minutes)
+
+    def _list(self, path: str) -> list:
+        return self.filesystem.get_file_info(fs.FileSelector(path, allow_not_found=True))
+
+    def list_partitions(self, dates: list = None, pairs: list = None) -> list:
+        """
+        Lists `date=/pair=` partition directories, optionally restricted to some dates/symbols.
+
+        Returns:
+            list: (date_str, partition_path) tuples.
+        """
+        wanted_pairs = {partition_pair(p) for p in pairs} if pairs else None
+        partitions = []
+        for date_dir in self._list(self.root):
+            if date_dir.type != fs.FileType.Directory or not date_dir.base_name.startswith('date='):
+                continue
+            date_str = date_dir.base_name[len('date='):]
+            if dates and date_str not in dates:
+                continue
+            for pair_dir in self._list(date_dir.path):
+                if pair_dir.type != fs.FileType.Directory or not pair_dir.base_name.startswith('pair='):
+                    continue
+                if wanted_pairs and pair_dir.base_name[len('pair='):] not in wanted_pairs:
+                    continue
+                partitions.append((date_str, pair_dir.path))
+        return sorted(partitions)
+
+    def is_closed(self, date_str: str, now: datetime = None) -> bool:
+        """A partition is closed once its day (plus the grace period) has ended in UTC."""
+        now = now or datetime.utcnow()
+        day_end = datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=1)
+        return now >= day_end + self.grace
+
+    def _data_files(self, partition_path: str) -> list:
+        return sorted(
+            f.path for f in self._list(partition_path)
+            if f.type == fs.FileType.File and f.base_name.endswith('.parquet')
+            and not f.base_name.startswith(('_', '.'))
+        )
+
+    def needs_compaction(self, partition_path: str) -> bool:
+        """True if the partition holds any file that is not already a compacted file."""
+        return any(not path.rsplit('/', 1)[-1].startswith(COMPACTED_PREFIX) for path in self._data_files(partition_path))
+
+    @staticmethod
+    def _key_columns(table: pa.Table) -> list:
+        """Columns identifying a row: a snapshot, or for `orderbook_deltas` one level change of a snapshot."""
+        return [name for name in ('timestamp', 'exchange', 'symbol', 'side', 'price') if name in table.column_names]
+
+    @classmethod
+    def _drop_duplicates(cls, table: pa.Table) -> pa.Table:
+        """Drops repeated rows (same key columns) from a table sorted by those columns."""
+        if table.num_rows < 2:
+            return table
+        keep = np.ones(table.num_rows, dtype=bool)
+        same = np.ones(table.num_rows - 1, dtype=bool)
+        for name in cls._key_columns(table):
+            column = table.column(name).combine_chunks()
+            same &= pc.fill_null(pc.equal(column[1:], column[:-1]), False).to_numpy(zero_copy_only=False)
+        keep[1:] = ~same
+        return table.filter(pa.array(keep))
+
+    def compact_partition(self, partition_path: str, dry_run: bool = False) -> dict:
+        """
+        Compacts one partition.
+
+        Returns:
+            dict: A summary with the input/output file and row counts.
+        """
+        inputs = self._data_files(partition_path)
+        summary = {"partition": partition_path, "input_files": len(inputs)}
+        if not inputs or not self.needs_compaction(partition_path):
+            return {**summary, "status": "skipped", "reason": "Already compacted or empty"}
+
+        dataset = ds.dataset(inputs, format='parquet', filesystem=self.filesystem)
+        input_rows = sum(fragment.count_rows() for fragment in dataset.get_fragments())
+        table = dataset.to_table()
+        if table.num_rows != input_rows:
+            return {**summary, "status": "error", "reason": f"Read {table.num_rows} rows, metadata reports {input_rows}"}
+
+        table = self._drop_duplicates(table.sort_by([(name, 'ascending') for name in self._key_columns(table)]))
+        summary.update(input_rows=input_rows, duplicates_dropped=input_rows - table.num_rows)
+        if dry_run:
+            return {**summary, "status": "dry_run", "output_rows": table.num_rows}
+
+        # 1. Stage the sorted output where readers cannot see it
+        run_id = uuid.uuid4().hex[:8]
+        staged = []
+        for part, offset in enumerate(range(0, table.num_rows, self.target_file_rows)):
+            chunk = table.slice(offset, self.target_file_rows)
+            staged_path = f"{partition_path}/{STAGING_PREFIX}{run_id}-{part:04d}.parquet"
+            pq.write_table(
+                chunk, staged_path, filesystem=self.filesystem,
+                row_group_size=self.row_group_size, compression=config.COMPACTION_COMPRESSION,
+                write_statistics=True
+            )
+            staged.append(staged_path)
+
+        # 2. Verify before touching the originals
+        with ThreadPoolExecutor(max_workers=len(staged)) as pool:
+            written_rows = sum(pool.map(lambda p: pq.read_metadata(p, filesystem=self.filesystem).num_rows, staged))
+        if written_rows != table.num_rows:
+            for path in staged:
+                self.filesystem.delete_file(path)
+            return {**summary, "status": "error", "reason": f"Wrote {written_rows} rows, expected {table.num_rows}"}
+
+        # 3. Publish (an atomic rename locally, a single-object copy on S3), then remove the inputs
+        published = []
+        for path in staged:
+            final_path = path.replace(f"/{STAGING_PREFIX}", f"/{COMPACTED_PREFIX}")
+            self.filesystem.move(path, final_path)
+            published.append(final_path)
+        for path in inputs:
+            self.filesystem.delete_file(path)
+
+        return {**summary, "status": "compacted", "output_files": len(published), "output_rows": written_rows}
+
+    def run(self, dates: list = None, pairs: list = None, max_workers: int = None, dry_run: bool = False,
+            include_open: bool = False) -> list:
+        """
+        Compacts every closed partition that still has small files, in parallel across partitions.
+
+        Args:
+            dates (list): Only these 'YYYY-MM-DD' dates (all when omitted).
+            pairs (list): Only these symbols (all when omitted).
+            max_workers (int): Partitions compacted concurrently.
+            dry_run (bool): Report what would be compacted without writing anything.
+            include_open (bool): Also compact partitions whose day has not ended yet.
+        """
+        partitions = [
+            path for date_str, path in self.list_partitions(dates, pairs)
+            if include_open or self.is_closed(date_str)
+        ]
+        print(f"Compacting {len(partitions)} partition(s) under {self.root}...")
+        if not partitions:
+            return []
+
+        def compact(path):
+            try:
+                result = self.compact_partition(path, dry_run=dry_run)
+            except Exception as e:
+                result = {"partition": path, "status": "error", "reason": str(e)}
+            print(f"{result['status']:>10}: {path} {result.get('reason') or ''}".rstrip())
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers or config.COMPACTION_MAX_WORKERS) as pool:
+            return list(pool.map(compact, partitions))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compact small order book Parquet files into large sorted files.")
+    parser.add_argument("--dataset", default="orderbooks", help="Dataset directory under the store root.")
+    parser.add_argument("--date", action="append", dest="dates", help="Only compact this date (YYYY-MM-DD). Repeatable.")
+    parser.add_argument("--pair", action="append", dest="pairs", help="Only compact this symbol (e.g., BTC/USDT). Repeatable.")
+    parser.add_argument("--workers", type=int, default=config.COMPACTION_MAX_WORKERS, help="Partitions compacted in parallel.")
+    parser.add_argument("--include-open", action="store_true", help="Also compact partitions for days that have not ended.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be compacted.")
+    args = parser.parse_args()
+
+    compactor = PartitionCompactor(OrderbookReader.from_config(args.dataset))
+    results = compactor.run(args.dates, args.pairs, args.workers, args.dry_run, args.include_open)
+
+    print("\n--- Compaction Summary ---")
+    for status in ('compacted', 'dry_run', 'skipped', 'error'):
+        count = sum(1 for r in results if r['status'] == status)
+        if count:
+            print(f"{status:>10}: {count}")
+    print(f"Input files merged: {sum(r.get('input_files', 0) for r in results if r['status'] == 'compacted')}")
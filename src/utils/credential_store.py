@@ -0,0 +1,105 @@
+import json
+import os
+import secrets
+from cryptography.fernet import Fernet, InvalidToken
+
+# Fields that make up a registered trading account.
+CREDENTIAL_FIELDS = ('account_name', 'exchange', 'api_key', 'api_secret', 'password', 'uid', 'is_testnet')
+
+class CredentialStore:
+    """
+    A local, encrypted keystore for exchange credentials.
+
+    The WebSocket server registers an account once per session and hands the
+    client back an opaque account handle. Celery workers on the same host
+    resolve that handle from the keystore, so trade messages and task payloads
+    never have to carry the API secrets themselves.
+
+    Each account is stored as one Fernet-encrypted file named after its handle.
+    """
+
+    def __init__(self, directory: str, encryption_key: str = None):
+        """
+        Initializes the keystore.
+
+        Args:
+            directory (str): Directory holding the encrypted credential files.
+            encryption_key (str): A urlsafe base64 Fernet key. If omitted, a key is
+                generated once and kept in `<directory>/.key` so the server and the
+                workers on this host share it.
+        """
+        self.directory = directory
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.fernet = Fernet(encryption_key or self._load_or_create_key())
+
+    def _load_or_create_key(self) -> bytes:
+        """Loads the local keystore key, creating it on first use."""
+        key_path = os.path.join(self.directory, '.key')
+        try:
+            with open(key_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            key = Fernet.generate_key()
+            try:
+                fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                # Another process created the key first, use theirs
+                with open(key_path, 'rb') as f:
+                    return f.read()
+            with os.fdopen(fd, 'wb') as f:
+                f.write(key)
+            return key
+
+    def _path(self, account_id: str) -> str:
+        # Handles are generated by us, but never trust them as path components
+        if not account_id or not all(c.isalnum() or c in '-_' for c in account_id):
+            raise ValueError(f"Invalid account handle: '{account_id}'")
+        return os.path.join(self.directory, f"{account_id}.cred")
+
+    def register(self, credentials: dict) -> str:
+        """
+        Encrypts and stores a set of credentials.
+
+        Args:
+            credentials (dict): Account fields (see `CREDENTIAL_FIELDS`); unknown keys are dropped.
+
+        Returns:
+            str: The opaque account handle used to reference these credentials.
+        """
+        record = {k: credentials[k] for k in CREDENTIAL_FIELDS if credentials.get(k) is not None}
+        account_id = secrets.token_urlsafe(16)
+        path = self._path(account_id)
+        tmp_path = f"{path}.tmp"
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.fernet.encrypt(json.dumps(record).encode()))
+        os.replace(tmp_path, path)
+        return account_id
+
+    def load(self, account_id: str) -> dict | None:
+        """
+        Decrypts the credentials for an account handle.
+
+        Returns:
+            dict | None: The stored credentials, or None if the handle is unknown or unreadable.
+        """
+        try:
+            with open(self._path(account_id), 'rb') as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except (FileNotFoundError, ValueError, InvalidToken):
+            return None
+
+    def exists(self, account_id: str) -> bool:
+        """Cheap check that a handle is still registered, without decrypting it."""
+        try:
+            return os.path.exists(self._path(account_id))
+        except ValueError:
+            return False
+
+    def delete(self, account_id: str):
+        """Removes a registered account. Unknown handles are ignored."""
+        try:
+            os.remove(self._path(account_id))
+        except (FileNotFoundError, ValueError):
+            pass
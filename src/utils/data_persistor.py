@@ -1,62 +1,210 @@
-import boto3
 import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta
+import src.config as config
+from src.utils.storage_backends import AsyncUploader, S3StorageBackend, StorageBackend, create_backend_from_config
 
-class S3Persistor:
-    """Handles formatting and writing of trading data to AWS S3 as Parquet files."""
+def partition_pair(symbol: str) -> str:
+    """Returns the `pair=` partition value for a symbol (e.g., 'BTC/USDT' -> 'BTC-USDT')."""
+    return symbol.replace('/', '-')
 
-    def __init__(self, bucket_name: str, aws_access_key: str, aws_secret_key: str, region: str):
-        self.bucket_name = bucket_name
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name=region
+class OrderbookPersistor:
+    """
+    Formats trading data as partitioned Parquet objects and hands them to a
+    storage backend through a background uploader, so a slow store never
+    delays the next capture.
+    """
+
+    def __init__(self, backend: StorageBackend = None, uploader: AsyncUploader = None):
+        """
+        Args:
+            backend (StorageBackend): Where objects are written (from `config.PERSISTENCE_BACKEND` if omitted).
+            uploader (AsyncUploader): The background uploader (built around `backend` if omitted).
+        """
+        self.backend = backend or create_backend_from_config()
+        self.uploader = uploader or AsyncUploader(self.backend)
+        # (exchange, symbol) -> list of metric rows, written once per METRICS_FLUSH_INTERVAL_SECONDS
+        self._metrics = {}
+        print(f"✅ {type(self).__name__} initialized with '{self.backend.name}' storage backend.")
+
+    def _upload_frame(self, dataset: str, symbol: str, utc_now: datetime, df: pd.DataFrame):
+        """Serializes a DataFrame to Parquet and queues it under `<dataset>/date=.../pair=.../<ms>.parquet`."""
+        # Define the object key with partitioning
+        sanitized_symbol = partition_pair(symbol)
+        s3_key = (
+            f"{dataset}/date={utc_now.strftime('%Y-%m-%d')}/"
+            f"pair={sanitized_symbol}/"
+            f"{int(utc_now.timestamp() * 1000)}.parquet"
         )
-        print(f"✅ S3Persistor initialized for bucket: {self.bucket_name}")
 
+        # Write Dataframe to a Paraquet object in memory
+        parquet_buffer = BytesIO()
+        df.to_parquet(parquet_buffer, engine='pyarrow')
+
+        # Upload in the background; the capture loop moves on immediately
+        self.uploader.submit(s3_key, parquet_buffer.getvalue())
+
+    def _write_full_snapshot(self, exchange: str, symbol: str, snapshot: dict, utc_now: datetime):
+        # Create a DataFrame based on the required schema
+        data = {
+            'timestamp': [utc_now],
+            'exchange': [exchange],
+            'symbol': [symbol],
+            'bids': [snapshot['bids']],
+            'asks': [snapshot['asks']]
+        }
+        self._upload_frame('orderbooks', symbol, utc_now, pd.DataFrame(data))
 
     def write_orderbook_snapshot(self, exchange: str, symbol: str, snapshot:dict):
         """
-        Converts an order book snapshot to a partitioned Parquet object and writes it to S3.
+        Converts an order book snapshot to a partitioned Parquet object and queues it for upload.
         """
         try:
             # Get a high-precision UTC timestamp
-            utc_now = datetime.utcnow()
+            self._write_full_snapshot(exchange, symbol, snapshot, datetime.utcnow())
+        except Exception as e:
+            print(f"❌ Error persisting order book snapshot: {e}")
+
+    def write_metrics(self, exchange: str, symbol: str, metrics: dict, utc_now: datetime = None):
+        """
+        Buffers one row of derived book metrics (see `book_metrics.snapshot_metrics`) for
+        the narrow `orderbook_metrics/` table, flushing once the buffer spans the flush interval.
+        """
+        try:
+            utc_now = utc_now or datetime.utcnow()
+            rows = self._metrics.get((exchange, symbol))
+            if rows and rows[0]['timestamp'].date() != utc_now.date():
+                # Never let a buffer cross a date partition: the previous day's rows are written on their own
+                self._flush_metrics(exchange, symbol)
+            rows = self._metrics.setdefault((exchange, symbol), [])
+            rows.append({'timestamp': utc_now, 'exchange': exchange, 'symbol': symbol, **metrics})
+            if (utc_now - rows[0]['timestamp']).total_seconds() >= config.METRICS_FLUSH_INTERVAL_SECONDS:
+                self._flush_metrics(exchange, symbol)
+        except Exception as e:
+            print(f"❌ Error persisting order book metrics: {e}")
+
+    def _flush_metrics(self, exchange: str, symbol: str):
+        rows = self._metrics.pop((exchange, symbol), None)
+        if rows:
+            self._upload_frame('orderbook_metrics', symbol, rows[0]['timestamp'], pd.DataFrame(rows))
+
+    def flush(self):
+        """Writes out buffered metric rows. Full snapshots are never buffered."""
+        for exchange, symbol in list(self._metrics):
+            try:
+                self._flush_metrics(exchange, symbol)
+            except Exception as e:
+                print(f"❌ Error flushing order book metrics for {symbol}: {e}")
+
+    def close(self, timeout: float = None):
+        """Flushes buffered data and waits for queued uploads before the persistor is discarded."""
+        self.flush()
+        self.uploader.close(timeout)
 
-            # Create a DataFrame based on the required schema
-            data = {
-                'timestamp': [utc_now],
-                'exchange': [exchange],
-                'symbol': [symbol],
-                'bids': [snapshot['bids']],
-                'asks': [snapshot['asks']]
-            }
-            df = pd.DataFrame(data)
-
-            # Define the S3 path with partitioning
-
-            sanitized_symbol = symbol.replace('/', '-')
-            s3_key = (
-                f"orderbooks/date={utc_now.strftime('%Y-%m-%d')}/"
-                f"pair={sanitized_symbol}/"
-                f"{int(utc_now.timestamp() * 1000)}.parquet"
-            )
 
-            # Write Dataframe to a Paraquet object in memory
-            parquet_buffer = BytesIO()
-            df.to_parquet(parquet_buffer, engine='pyarrow')
+class DeltaOrderbookPersistor(OrderbookPersistor):
+    """
+    Persists order books as periodic full keyframes plus level changes in between.
 
-            # Upload the in-memory object to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=parquet_buffer.getvalue()
+    Keyframes use the regular `orderbooks/` dataset (so readers of full snapshots
+    keep working at keyframe resolution). Between keyframes, only the levels
+    whose quantity changed are recorded in `orderbook_deltas/`, one row per
+    change with quantity 0 meaning the level was removed. Deltas are buffered
+    and written as one object per keyframe interval, which keeps objects few and
+    large even at sub-second capture rates.
+
+    `OrderbookReconstructor` in `orderbook_reader` rebuilds the book at any timestamp.
+    """
+
+    def __init__(self, backend: StorageBackend = None, uploader: AsyncUploader = None,
+                 keyframe_interval_seconds: float = None):
+        super().__init__(backend, uploader)
+        self.keyframe_interval = timedelta(
+            seconds=keyframe_interval_seconds or config.KEYFRAME_INTERVAL_SECONDS
+        )
+        # (exchange, symbol) -> {'keyframe_at': datetime, 'bids': {price: qty}, 'asks': {price: qty}}
+        self._books = {}
+        # (exchange, symbol) -> list of (timestamp, side, price, quantity)
+        self._deltas = {}
+
+    @staticmethod
+    def _levels(side: list) -> dict:
+        return {level[0]: level[1] for level in side}
+
+    @staticmethod
+    def _diff(previous: dict, current: dict) -> list:
+        """Level changes turning `previous` into `current`; removed levels get quantity 0."""
+        changes = [(price, qty) for price, qty in current.items() if previous.get(price) != qty]
+        changes.extend((price, 0.0) for price in previous if price not in current)
+        return changes
+
+    def _flush_deltas(self, exchange: str, symbol: str):
+        rows = self._deltas.pop((exchange, symbol), None)
+        if not rows:
+            return
+        timestamps, sides, prices, quantities = (list(column) for column in zip(*rows))
+        df = pd.DataFrame({
+            'timestamp': timestamps,
+            'exchange': exchange,
+            'symbol': symbol,
+            'side': sides,
+            'price': prices,
+            'quantity': quantities,
+        })
+        self._upload_frame('orderbook_deltas', symbol, timestamps[0], df)
+
+    def write_orderbook_snapshot(self, exchange: str, symbol: str, snapshot: dict):
+        """Writes a keyframe when one is due, otherwise buffers the level changes since the last snapshot."""
+        try:
+            utc_now = datetime.utcnow()
+            key = (exchange, symbol)
+            state = self._books.get(key)
+            bids, asks = self._levels(snapshot['bids']), self._levels(snapshot['asks'])
+
+            keyframe_due = (
+                state is None
+                or utc_now - state['keyframe_at'] >= self.keyframe_interval
+                or utc_now.date() != state['keyframe_at'].date()  # never let deltas cross a date partition
             )
-            print(f"Successfully wrote {s3_key} to S3.")
+            if keyframe_due:
+                self._flush_deltas(exchange, symbol)
+                self._write_full_snapshot(exchange, symbol, snapshot, utc_now)
+                self._books[key] = {'keyframe_at': utc_now, 'bids': bids, 'asks': asks}
+                return
+
+            buffer = self._deltas.setdefault(key, [])
+            for side, previous, current in (('bid', state['bids'], bids), ('ask', state['asks'], asks)):
+                buffer.extend((utc_now, side, price, qty) for price, qty in self._diff(previous, current))
+            state['bids'], state['asks'] = bids, asks
 
         except Exception as e:
-            print(f"❌ Error writing to S3: {e}")
\ No newline at end of file
+            print(f"❌ Error persisting order book delta: {e}")
+
+    def flush(self):
+        """Writes out all buffered deltas and metric rows."""
+        super().flush()
+        for exchange, symbol in list(self._deltas):
+            try:
+                self._flush_deltas(exchange, symbol)
+            except Exception as e:
+                print(f"❌ Error flushing order book deltas for {symbol}: {e}")
+
+
+def create_persistor() -> OrderbookPersistor:
+    """Builds the persistor for `config.PERSISTENCE_MODE` ('full' or 'delta')."""
+    if config.PERSISTENCE_MODE == 'delta':
+        return DeltaOrderbookPersistor()
+    if config.PERSISTENCE_MODE == 'full':
+        return OrderbookPersistor()
+    raise ValueError(f"Unknown PERSISTENCE_MODE '{config.PERSISTENCE_MODE}'. Use 'full' or 'delta'.")
+
+
+class S3Persistor(OrderbookPersistor):
+    """Handles formatting and writing of trading data to AWS S3 as Parquet files."""
+
+    def __init__(self, bucket_name: str, aws_access_key: str, aws_secret_key: str, region: str,
+                 endpoint_url: str = None):
+        self.bucket_name = bucket_name
+        super().__init__(S3StorageBackend(bucket_name, aws_access_key, aws_secret_key, region,
+                                          endpoint_url or config.S3_ENDPOINT_URL))
+        print(f"✅ S3Persistor initialized for bucket: {self.bucket_name}")
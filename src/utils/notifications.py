@@ -0,0 +1,121 @@
+import json
+import queue
+import threading
+import pika
+import src.config as config
+from src.server.connection_registry import RedisConnectionRegistry
+
+# Every server instance consumes both exchanges with one exclusive queue:
+# the fanout reaches all instances, the direct exchange only the instance
+# whose id is the routing key.
+NOTIFICATIONS_EXCHANGE = 'notifications_exchange'
+ROUTED_NOTIFICATIONS_EXCHANGE = 'notifications_routed'
+
+_redis = None
+_redis_lock = threading.Lock()
+
+
+def lookup_instance(user_id: str) -> str | None:
+    """
+    The server instance holding a user's WebSocket, from the shared registry.
+    None when the registry is in-memory (single instance) or the user is not connected.
+    """
+    global _redis
+    if config.CONNECTION_REGISTRY != 'redis' or not user_id:
+        return None
+    with _redis_lock:
+        if _redis is None:
+            import redis
+            _redis = redis.Redis.from_url(config.REDIS_URL, decode_responses=True)
+    try:
+        return _redis.get(f"{RedisConnectionRegistry.KEY_PREFIX}{user_id}")
+    except Exception as e:
+        print(f"⚠️ Connection registry lookup failed, falling back to fanout: {e}")
+        return None
+
+
+def publish_notification(body: dict, channel=None):
+    """
+    Delivers {"user_id": ..., "payload": ...} to the server instance holding
+    the user's WebSocket.
+
+    With a shared registry the message goes only to the owning instance;
+    otherwise (single instance, or an unknown owner) it is fanned out to all
+    instances, and only the one holding the socket forwards it.
+
+    Args:
+        channel: An open pika channel to publish on; a short-lived connection is used if omitted.
+    """
+    instance_id = lookup_instance(body.get('user_id'))
+    if instance_id:
+        exchange, exchange_type, routing_key = ROUTED_NOTIFICATIONS_EXCHANGE, 'direct', instance_id
+    else:
+        exchange, exchange_type, routing_key = NOTIFICATIONS_EXCHANGE, 'fanout', ''
+
+    connection = None
+    if channel is None:
+        connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+        channel = connection.channel()
+    try:
+        channel.exchange_declare(exchange=exchange, exchange_type=exchange_type)
+        channel.basic_publish(exchange=exchange, routing_key=routing_key, body=json.dumps(body))
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+class NotificationPublisher:
+    """
+    Publishes notifications from a background thread over one long-lived
+    connection, for loops that push on every iteration (e.g. live metrics on
+    every capture) and must not wait on the registry lookup or the broker.
+
+    Notifications are live data superseded by the next one, so when more than
+    `max_pending` are waiting new ones are dropped rather than slowing the caller.
+    """
+
+    def __init__(self, max_pending: int = 100):
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='notification-publisher', daemon=True)
+        self._thread.start()
+
+    def publish(self, body: dict):
+        """Queues {"user_id": ..., "payload": ...} for delivery (see `publish_notification`)."""
+        try:
+            self._queue.put_nowait(body)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        connection = channel = None
+        while True:
+            body = self._queue.get()
+            if body is None:
+                break
+            try:
+                if channel is None or channel.is_closed:
+                    connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+                    channel = connection.channel()
+                publish_notification(body, channel)
+            except Exception as e:
+                # Reconnects on the next notification
+                print(f"⚠️ Could not publish notification for {body.get('user_id')}: {e}")
+                if connection is not None and connection.is_open:
+                    connection.close()
+                connection = channel = None
+        if connection is not None and connection.is_open:
+            connection.close()
+
+    def close(self, timeout: float = None):
+        """Delivers what is queued, then closes the connection."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+def broadcast_message(user_id: str, message: dict):
+    """
+    Sends a message to a user's WebSocket from any process (server or worker),
+    wherever that user is connected.
+    """
+    publish_notification({"user_id": user_id, "payload": message})
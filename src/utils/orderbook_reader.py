@@ -0,0 +1,370 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+from datetime import datetime, timedelta, timezone
+import src.config as config
+from src.utils.data_persistor import partition_pair
+
+# `date=YYYY-MM-DD/pair=BASE-QUOTE` directories written by the persistor.
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('pair', pa.string())]), flavor='hive')
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Snapshot timestamps are stored as naive UTC, so compare against naive UTC."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class OrderbookReader:
+    """
+    Reads persisted order book snapshots back as Arrow data or NumPy arrays.
+
+    Uses Arrow datasets so that queries only touch what they need:
+        - partition pruning on `date` and `pair` (only matching directories are listed),
+        - predicate pushdown on the `timestamp` range (row groups outside it are skipped),
+        - column projection,
+        - streaming record-batch iteration for datasets larger than memory.
+
+    Works on a local directory or on an S3-compatible store.
+    """
+
+    def __init__(self, root: str, filesystem: fs.FileSystem = None):
+        """
+        Initializes the reader.
+
+        Args:
+            root (str): The dataset root, i.e. the directory containing `date=...` partitions
+                (e.g., 'data/orderbooks' or 'my-bucket/orderbooks' for S3).
+            filesystem (fs.FileSystem): The filesystem holding the data (local if omitted).
+        """
+        self.root = root.rstrip('/')
+        self.filesystem = filesystem or fs.LocalFileSystem()
+
+    @classmethod
+    def from_config(cls, dataset: str = 'orderbooks') -> 'OrderbookReader':
+        """
+        Builds a reader for the configured store: the S3 bucket when `PERSISTENCE_BACKEND`
+        is 's3', otherwise `LOCAL_DATA_DIR`.
+        """
+        if config.PERSISTENCE_BACKEND == 's3':
+            s3 = fs.S3FileSystem(
+                access_key=config.AWS_ACCESS_KEY_ID,
+                secret_key=config.AWS_SECRET_ACCESS_KEY,
+                region=config.AWS_REGION,
+                endpoint_override=config.S3_ENDPOINT_URL
+            )
+            return cls(f"{config.AWS_S3_BUCKET_NAME}/{dataset}", s3)
+        return cls(f"{config.LOCAL_DATA_DIR}/{dataset}")
+
+    def _partition_dirs(self, start: datetime, end: datetime, pairs: list) -> list:
+        """Lists the existing partition directories for a date range and set of pairs."""
+        dirs = []
+        day = start.date()
+        while day <= end.date():
+            for pair in pairs:
+                path = f"{self.root}/date={day.isoformat()}/pair={partition_pair(pair)}"
+                if self.filesystem.get_file_info(path).type == fs.FileType.Directory:
+                    dirs.append(path)
+            day += timedelta(days=1)
+        return dirs
+
+    def dataset(self, start: datetime = None, end: datetime = None, pairs: list = None) -> ds.Dataset | None:
+        """
+        Opens the dataset. When both a time range and pairs are given, only the matching
+        partition directories are discovered, which avoids listing the whole store.
+
+        Returns:
+            ds.Dataset | None: The dataset, or None if no matching partition exists.
+        """
+        options = dict(format='parquet', partitioning=PARTITIONING, filesystem=self.filesystem,
+                       partition_base_dir=self.root)
+        if start and end and pairs:
+            dirs = self._partition_dirs(start, end, pairs)
+            if not dirs:
+                return None
+            return ds.dataset([ds.dataset(d, **options) for d in dirs])
+        if self.filesystem.get_file_info(self.root).type != fs.FileType.Directory:
+            return None
+        return ds.dataset(self.root, **options)
+
+    def build_filter(self, start: datetime = None, end: datetime = None, pairs: list = None,
+                     exchanges: list = None) -> ds.Expression | None:
+        """
+        Builds the pushdown filter: partition predicates on `date`/`pair` plus a
+        `timestamp` range (start inclusive, end exclusive).
+        """
+        conditions = []
+        if start is not None:
+            start = to_naive_utc(start)
+            conditions.append(ds.field('date') >= start.date().isoformat())
+            conditions.append(ds.field('timestamp') >= pa.scalar(start, type=pa.timestamp('us')))
+        if end is not None:
+            end = to_naive_utc(end)
+            conditions.append(ds.field('date') <= end.date().isoformat())
+            conditions.append(ds.field('timestamp') < pa.scalar(end, type=pa.timestamp('us')))
+        if pairs:
+            conditions.append(ds.field('pair').isin([partition_pair(p) for p in pairs]))
+        if exchanges:
+            conditions.append(ds.field('exchange').isin(list(exchanges)))
+
+        if not conditions:
+            return None
+        expression = conditions[0]
+        for condition in conditions[1:]:
+            expression = expression & condition
+        return expression
+
+    def iter_batches(self, start: datetime = None, end: datetime = None, pairs: list = None,
+                     exchanges: list = None, columns: list = None, batch_size: int = 65536):
+        """
+        Streams matching snapshots as Arrow record batches.
+
+        Args:
+            start (datetime): Inclusive lower bound on the snapshot timestamp (UTC).
+            end (datetime): Exclusive upper bound on the snapshot timestamp (UTC).
+            pairs (list): Symbols to include (e.g., ['BTC/USDT']).
+            exchanges (list): Exchange IDs to include.
+            columns (list): Columns to read (all when omitted).
+            batch_size (int): Maximum rows per batch.
+
+        Yields:
+            pa.RecordBatch: Batches in file order (not globally sorted by timestamp).
+        """
+        start = to_naive_utc(start) if start else None
+        end = to_naive_utc(end) if end else None
+        dataset = self.dataset(start, end, pairs)
+        if dataset is None:
+            return
+        yield from dataset.to_batches(
+            columns=columns,
+            filter=self.build_filter(start, end, pairs, exchanges),
+            batch_size=batch_size
+        )
+
+    def read_table(self, start: datetime = None, end: datetime = None, pairs: list = None,
+                   exchanges: list = None, columns: list = None) -> pa.Table:
+        """Reads all matching snapshots into one Arrow table, sorted by timestamp."""
+        batches = list(self.iter_batches(start, end, pairs, exchanges, columns))
+        if not batches:
+            return pa.table({})
+        table = pa.Table.from_batches(batches)
+        if 'timestamp' in table.column_names:
+            table = table.sort_by('timestamp')
+        return table
+
+    def iter_arrays(self, start: datetime = None, end: datetime = None, pairs: list = None,
+                    exchanges: list = None, depth: int = 10, batch_size: int = 65536):
+        """
+        Streams matching snapshots as NumPy arrays ready for backtests.
+
+        Yields:
+            dict: Per batch, see `book_arrays`.
+        """
+        columns = ['timestamp', 'exchange', 'symbol', 'bids', 'asks']
+        for batch in self.iter_batches(start, end, pairs, exchanges, columns, batch_size):
+            yield book_arrays(batch, depth)
+
+    def read_arrays(self, start: datetime = None, end: datetime = None, pairs: list = None,
+                    exchanges: list = None, depth: int = 10) -> dict:
+        """Reads all matching snapshots as NumPy arrays sorted by timestamp (see `book_arrays`)."""
+        table = self.read_table(start, end, pairs, exchanges, ['timestamp', 'exchange', 'symbol', 'bids', 'asks'])
+        return book_arrays(table, depth)
+
+
+def _column(data, name: str) -> pa.Array:
+    """Returns a column of a table or record batch as one contiguous array."""
+    column = data.column(name)
+    return column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+
+
+def _side_arrays(column: pa.Array, depth: int) -> tuple:
+    """
+    Converts a list<list<double>> order book side into padded (rows, depth)
+    price and size matrices without a Python loop over rows.
+    """
+    rows = len(column)
+    counts = pc.fill_null(pc.list_value_length(column), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+
+    prices = np.full((rows, depth), np.nan)
+    sizes = np.full((rows, depth), np.nan)
+    if counts.sum() == 0:
+        return prices, sizes
+
+    levels = pc.list_flatten(column)
+    level_prices = pc.list_element(levels, 0).to_numpy(zero_copy_only=False)
+    level_sizes = pc.list_element(levels, 1).to_numpy(zero_copy_only=False)
+
+    row_index = np.repeat(np.arange(rows), counts)
+    starts = np.cumsum(counts) - counts
+    level_index = np.arange(counts.sum()) - np.repeat(starts, counts)
+    keep = level_index < depth
+
+    prices[row_index[keep], level_index[keep]] = level_prices[keep]
+    sizes[row_index[keep], level_index[keep]] = level_sizes[keep]
+    return prices, sizes
+
+
+def book_arrays(data, depth: int = 10) -> dict:
+    """
+    Converts a table or record batch of snapshots into NumPy arrays.
+
+    Args:
+        data (pa.Table | pa.RecordBatch): Snapshots with timestamp/exchange/symbol/bids/asks columns.
+        depth (int): Levels per side to keep; shallower books are NaN-padded.
+
+    Returns:
+        dict: {
+            'timestamp': int64 nanoseconds since epoch, shape (n,),
+            'exchange', 'symbol': object arrays, shape (n,),
+            'bid_prices', 'bid_sizes', 'ask_prices', 'ask_sizes': float64, shape (n, depth)
+        }
+    """
+    if data.num_rows == 0:
+        empty = np.empty((0, depth))
+        return {'timestamp': np.empty(0, dtype=np.int64), 'exchange': np.empty(0, dtype=object),
+                'symbol': np.empty(0, dtype=object), 'bid_prices': empty, 'bid_sizes': empty,
+                'ask_prices': empty, 'ask_sizes': empty}
+
+    timestamps = pc.cast(_column(data, 'timestamp'), pa.timestamp('ns')).cast(pa.int64())
+    bid_prices, bid_sizes = _side_arrays(_column(data, 'bids'), depth)
+    ask_prices, ask_sizes = _side_arrays(_column(data, 'asks'), depth)
+    return {
+        'timestamp': timestamps.to_numpy(zero_copy_only=False),
+        'exchange': _column(data, 'exchange').to_numpy(zero_copy_only=False),
+        'symbol': _column(data, 'symbol').to_numpy(zero_copy_only=False),
+        'bid_prices': bid_prices,
+        'bid_sizes': bid_sizes,
+        'ask_prices': ask_prices,
+        'ask_sizes': ask_sizes,
+    }
+
+
+class OrderbookReconstructor:
+    """
+    Rebuilds order books from delta-mode persistence (see `DeltaOrderbookPersistor`):
+    full keyframes in `orderbooks/` plus level changes in `orderbook_deltas/`.
+
+    The book at any timestamp is the latest keyframe at or before it with all
+    later deltas up to that timestamp applied. Keyframes met along the way
+    replace the book, which also re-synchronizes after capture gaps.
+    """
+
+    DELTA_COLUMNS = ['timestamp', 'side', 'price', 'quantity']
+    KEYFRAME_COLUMNS = ['timestamp', 'bids', 'asks']
+
+    def __init__(self, keyframes: OrderbookReader, deltas: OrderbookReader, max_keyframe_age_seconds: float = None):
+        """
+        Args:
+            keyframes (OrderbookReader): Reader for the `orderbooks/` dataset.
+            deltas (OrderbookReader): Reader for the `orderbook_deltas/` dataset.
+            max_keyframe_age_seconds (float): How far back to look for the starting keyframe
+                (two keyframe intervals by default).
+        """
+        self.keyframes = keyframes
+        self.deltas = deltas
+        self.max_keyframe_age = timedelta(
+            seconds=max_keyframe_age_seconds or 2 * config.KEYFRAME_INTERVAL_SECONDS
+        )
+
+    @classmethod
+    def from_config(cls) -> 'OrderbookReconstructor':
+        return cls(OrderbookReader.from_config('orderbooks'), OrderbookReader.from_config('orderbook_deltas'))
+
+    def _keyframe_start(self, exchange: str, symbol: str, at: datetime) -> datetime | None:
+        """Timestamp of the latest keyframe at or before `at`, or None if there is none within reach."""
+        table = self.keyframes.read_table(at - self.max_keyframe_age, at + timedelta(microseconds=1),
+                                          [symbol], [exchange], ['timestamp'])
+        if table.num_rows == 0:
+            return None
+        latest_ns = pc.cast(table.column('timestamp'), pa.timestamp('ns')).cast(pa.int64())[-1].as_py()
+        return datetime(1970, 1, 1) + timedelta(microseconds=latest_ns // 1000)
+
+    def _states(self, exchange: str, symbol: str, start: datetime, end: datetime):
+        """
+        Yields (timestamp_ns, bids, asks) after every keyframe and delta group in
+        [keyframe before `start`, `end`), reading a day at a time. `bids`/`asks` are
+        live {price: quantity} dicts and change after each yield.
+        """
+        origin = self._keyframe_start(exchange, symbol, start) or start
+        bids = asks = None
+        day_start = origin
+        while day_start < end:
+            next_midnight = datetime.combine(day_start.date() + timedelta(days=1), datetime.min.time())
+            day_end = min(next_midnight, end)
+            keyframes = self.keyframes.read_table(day_start, day_end, [symbol], [exchange], self.KEYFRAME_COLUMNS)
+            deltas = self.deltas.read_table(day_start, day_end, [symbol], [exchange], self.DELTA_COLUMNS)
+            day_start = day_end
+
+            keyframe_ts = (pc.cast(keyframes.column('timestamp'), pa.timestamp('ns')).cast(pa.int64()).to_numpy()
+                           if keyframes.num_rows else np.empty(0, dtype=np.int64))
+            if deltas.num_rows:
+                delta_ts = pc.cast(deltas.column('timestamp'), pa.timestamp('ns')).cast(pa.int64()).to_numpy()
+                is_bid = pc.equal(deltas.column('side'), 'bid').to_numpy(zero_copy_only=False)
+                prices = deltas.column('price').to_numpy()
+                quantities = deltas.column('quantity').to_numpy()
+                # Rows written by one capture share a timestamp; apply them as one group
+                group_starts = np.concatenate(([0], np.flatnonzero(np.diff(delta_ts)) + 1))
+                group_ends = np.append(group_starts[1:], len(delta_ts))
+            else:
+                group_starts = group_ends = np.empty(0, dtype=np.int64)
+
+            k = g = 0
+            while k < len(keyframe_ts) or g < len(group_starts):
+                # On equal timestamps the keyframe goes first
+                if g == len(group_starts) or (k < len(keyframe_ts) and keyframe_ts[k] <= delta_ts[group_starts[g]]):
+                    bids = {level[0]: level[1] for level in keyframes.column('bids')[k].as_py() or []}
+                    asks = {level[0]: level[1] for level in keyframes.column('asks')[k].as_py() or []}
+                    yield int(keyframe_ts[k]), bids, asks
+                    k += 1
+                    continue
+
+                lo, hi = group_starts[g], group_ends[g]
+                g += 1
+                if bids is None:
+                    continue  # Deltas before the first keyframe have nothing to apply to
+                for bid, price, quantity in zip(is_bid[lo:hi], prices[lo:hi].tolist(), quantities[lo:hi].tolist()):
+                    levels = bids if bid else asks
+                    if quantity == 0:
+                        levels.pop(price, None)
+                    else:
+                        levels[price] = quantity
+                yield int(delta_ts[lo]), bids, asks
+
+    @staticmethod
+    def _snapshot(exchange: str, symbol: str, timestamp_ns: int, bids: dict, asks: dict, depth: int = None) -> dict:
+        timestamp = timestamp_ns // 1_000_000
+        return {
+            'timestamp': timestamp,
+            'datetime': datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).isoformat(),
+            'exchange': exchange,
+            'symbol': symbol,
+            'bids': [[price, bids[price]] for price in sorted(bids, reverse=True)[:depth]],
+            'asks': [[price, asks[price]] for price in sorted(asks)[:depth]],
+        }
+
+    def book_at(self, exchange: str, symbol: str, at: datetime, depth: int = None) -> dict | None:
+        """
+        Reconstructs the book as it was at `at` (UTC).
+
+        Returns:
+            dict | None: A ccxt-style order book (see `MarketReplay`), or None if no keyframe precedes `at`.
+        """
+        at = to_naive_utc(at)
+        latest = None
+        for timestamp_ns, bids, asks in self._states(exchange, symbol, at, at + timedelta(microseconds=1)):
+            latest = timestamp_ns
+        if latest is None:
+            return None
+        return self._snapshot(exchange, symbol, latest, bids, asks, depth)
+
+    def iter_books(self, exchange: str, symbol: str, start: datetime, end: datetime, depth: int = None):
+        """
+        Yields the reconstructed book after every captured change in [start, end), in timestamp order.
+        The first book includes everything up to `start`.
+        """
+        start, end = to_naive_utc(start), to_naive_utc(end)
+        start_ns = int(start.replace(tzinfo=timezone.utc).timestamp() * 1_000_000) * 1000
+        for timestamp_ns, bids, asks in self._states(exchange, symbol, start, end):
+            if timestamp_ns >= start_ns:
+                yield self._snapshot(exchange, symbol, timestamp_ns, bids, asks, depth)
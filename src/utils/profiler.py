@@ -0,0 +1,204 @@
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+import src.config as config
+
+
+class SamplingProfiler:
+    """
+    A statistical profiler: a background thread records the Python stack of the
+    profiled thread (or of every thread) every `PROFILE_SAMPLE_INTERVAL_SECONDS`,
+    and the counts are written as collapsed stacks, one `frame;frame;... count`
+    line per distinct stack. The file opens directly in speedscope or renders
+    with `flamegraph.pl`.
+
+    Sampling does not instrument the profiled code, so what is measured runs at
+    (nearly) full speed; time spent waiting on the network shows up as the
+    frames that wait (e.g. ccxt's `fetch` or `select` in the event loop).
+    """
+
+    def __init__(self, label: str, thread_id: int = None, stop_at: float = None):
+        self.label = label
+        self.thread_id = thread_id
+        self.stop_at = stop_at  # time.time() at which sampling ends on its own
+        self.counts = Counter()
+        self.samples = 0
+        self.path = None
+        self._frame_names = {}
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{label}", daemon=True)
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread.start()
+        return self
+
+    def stop(self) -> str | None:
+        """Stops sampling and writes the profile. Returns its path, or None if nothing was sampled."""
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        return self.write()
+
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return name
+
+    def _sample(self):
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self._thread.ident or (self.thread_id is not None and thread_id != self.thread_id):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            if self.thread_id is None:
+                stack.append(threads.get(thread_id, str(thread_id)))
+            self.counts[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(config.PROFILE_SAMPLE_INTERVAL_SECONDS):
+            if self.stop_at is not None and time.time() >= self.stop_at:
+                break
+            self._sample()
+        # A window that ran out writes its profile without waiting for stop()
+        self.write()
+
+    def write(self) -> str | None:
+        with self._write_lock:
+            if self.path is not None or not self.counts:
+                return self.path
+            os.makedirs(config.PROFILE_OUTPUT_DIR, exist_ok=True)
+            stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(self.started_at))
+            self.path = os.path.join(config.PROFILE_OUTPUT_DIR, f"{self.label}-{os.getpid()}-{stamp}.collapsed")
+            with open(self.path, 'w') as f:
+                for stack, count in self.counts.most_common():
+                    f.write(f"{stack} {count}\n")
+        print(f"🔥 Wrote {self.samples} samples of {self.label} to {self.path}")
+        return self.path
+
+
+# --- Task profiling ---
+# Armed in the worker parent (remote control command or environment) and read by
+# every pool child: the values live in shared memory created before the pool forks.
+_profile_until = multiprocessing.Value('d', 0.0)     # time.time() until which every task is profiled
+_profile_remaining = multiprocessing.Value('i', 0)   # next tasks to profile, across the pool
+
+
+def arm(seconds: float = 0, tasks: int = 0):
+    """Profiles every task for the next `seconds`, and/or the next `tasks` tasks started."""
+    seconds = min(max(seconds or 0, 0), config.PROFILE_MAX_WINDOW_SECONDS)
+    _profile_until.value = time.time() + seconds if seconds else 0.0
+    _profile_remaining.value = max(tasks or 0, 0)
+
+
+def disarm():
+    arm(0, 0)
+
+
+def armed_state() -> dict:
+    return {"until": _profile_until.value or None, "remaining_tasks": _profile_remaining.value}
+
+
+def _task_stop_at() -> float | None:
+    """When sampling of a task starting now should end, or None if the task is not profiled."""
+    now = time.time()
+    until = _profile_until.value
+    if until > now:
+        return until
+    if _profile_remaining.value > 0:
+        with _profile_remaining.get_lock():
+            if _profile_remaining.value > 0:
+                _profile_remaining.value -= 1
+                return now + config.PROFILE_MAX_TASK_SECONDS
+    return None
+
+
+def profiled(label: str):
+    """
+    Decorates a task body so it is sampled while profiling is armed (see `arm`).
+
+    Unarmed, a call costs two reads of shared memory. Armed, the calling
+    thread is sampled until the task returns or the window ends, whichever is
+    first, and the profile is written to `PROFILE_OUTPUT_DIR`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            stop_at = _task_stop_at()
+            if stop_at is None:
+                return fn(*args, **kwargs)
+            profiler = SamplingProfiler(label, thread_id=threading.get_ident(), stop_at=stop_at).start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.stop()
+        return wrapper
+    return decorator
+
+
+# --- Event loop ---
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes a coroutine that sleeps
+    `LOOP_LAG_INTERVAL_SECONDS`: the lag is how long something else held the
+    loop (blocking calls, long callbacks, JSON of big payloads), i.e. how long
+    every socket on this server waited.
+    """
+
+    def __init__(self):
+        self.lags = deque(maxlen=10000)
+        self.blocked = 0  # wake-ups later than LOOP_LAG_WARN_SECONDS
+
+    async def run(self, until: float = None):
+        """Measures until the monotonic time `until`, or until cancelled."""
+        interval = config.LOOP_LAG_INTERVAL_SECONDS
+        while until is None or time.monotonic() < until:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = max(time.monotonic() - started - interval, 0.0)
+            self.lags.append(lag)
+            if lag >= config.LOOP_LAG_WARN_SECONDS:
+                self.blocked += 1
+                print(f"⚠️ Event loop was blocked for {lag * 1000:.0f}ms.")
+
+    def summary(self) -> dict:
+        ordered = sorted(self.lags)
+        if not ordered:
+            return {"samples": 0}
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 2)
+
+        return {"samples": len(ordered), "p50_ms": percentile(50), "p99_ms": percentile(99),
+                "max_ms": round(ordered[-1] * 1000, 2), "blocked": self.blocked}
+
+
+async def profile_event_loop(seconds: float) -> dict:
+    """
+    Samples every thread of the process for `seconds` while measuring the event
+    loop's lag. The lag summary is written next to the profile (`.lag.json`).
+    """
+    seconds = min(seconds, config.PROFILE_MAX_WINDOW_SECONDS)
+    profiler = SamplingProfiler('server').start()
+    monitor = LoopLagMonitor()
+    try:
+        await monitor.run(until=time.monotonic() + seconds)
+    finally:
+        path = await asyncio.to_thread(profiler.stop)
+    lag = monitor.summary()
+    if path:
+        with open(path.replace('.collapsed', '.lag.json'), 'w') as f:
+            json.dump(lag, f)
+    return {"profile": path, "loop_lag": lag}
@@ -0,0 +1,123 @@
+import threading
+import time
+import pika
+import src.config as config
+
+# Stop requests go through a direct exchange to one small queue per running task,
+# `stop.<task_id>`, bound to the task id and to any scopes the task joins
+# (e.g. 'user.<user_id>' to stop everything a user started).
+STOP_EXCHANGE = 'task_control'
+
+def stop_queue_name(task_id: str) -> str:
+    return f"stop.{task_id}"
+
+def user_scope(user_id: str) -> str:
+    return f"user.{user_id}"
+
+def _queue_arguments() -> dict:
+    # Queues of tasks that never start (or died) remove themselves
+    return {'x-expires': config.STOP_QUEUE_EXPIRES_SECONDS * 1000}
+
+
+class StopSignal:
+    """
+    Cooperative cancellation for long-running tasks.
+
+    A task creates one at start and checks `is_set()` (or sleeps with `wait()`)
+    in its loop; whoever wants it to stop calls `request_stop(task_id)`. The
+    task then leaves its loop normally, so `finally` blocks run and buffered
+    data is flushed, instead of the worker process being killed with
+    `revoke(terminate=True)` and respawned.
+
+    Checks are a single non-blocking `basic_get`, rate-limited to one per
+    `STOP_CHECK_INTERVAL_SECONDS`. If the broker is unreachable the task keeps
+    running (a stop can then still be forced with `revoke`).
+    """
+
+    def __init__(self, task_id: str, scopes: list = ()):
+        self.task_id = task_id
+        self.queue = stop_queue_name(task_id)
+        self.routing_keys = [task_id, *scopes]
+        self._stopped = False
+        self._last_check = 0.0
+        self._lock = threading.Lock()  # pika channels are not thread-safe
+        self._connection = self._channel = None
+        self._connect()
+
+    def _connect(self):
+        try:
+            self._connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+            self._channel = self._connection.channel()
+            self._channel.exchange_declare(exchange=STOP_EXCHANGE, exchange_type='direct')
+            self._channel.queue_declare(queue=self.queue, arguments=_queue_arguments())
+            for routing_key in self.routing_keys:
+                self._channel.queue_bind(queue=self.queue, exchange=STOP_EXCHANGE, routing_key=routing_key)
+        except Exception as e:
+            print(f"⚠️ Stop signal for task {self.task_id} unavailable, task can only be revoked: {e}")
+            self._connection = self._channel = None
+
+    def is_set(self) -> bool:
+        """True once a stop has been requested for this task or one of its scopes."""
+        with self._lock:
+            now = time.monotonic()
+            if self._stopped or now - self._last_check < config.STOP_CHECK_INTERVAL_SECONDS:
+                return self._stopped
+            self._last_check = now
+            if self._channel is None or self._channel.is_closed:
+                self._connect()
+                if self._channel is None:
+                    return False
+            try:
+                method, _, _ = self._channel.basic_get(queue=self.queue, auto_ack=True)
+                self._stopped = method is not None
+            except Exception as e:
+                print(f"⚠️ Could not check stop signal for task {self.task_id}: {e}")
+                self._channel = None
+            return self._stopped
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Sleeps up to `timeout` seconds, waking early on a stop request.
+
+        Returns:
+            bool: True if a stop was requested.
+        """
+        deadline = time.monotonic() + max(timeout, 0.0)
+        while not self.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, config.STOP_CHECK_INTERVAL_SECONDS))
+        return True
+
+    def close(self):
+        """Removes the task's stop queue."""
+        with self._lock:
+            try:
+                if self._channel is not None and self._channel.is_open:
+                    self._channel.queue_delete(queue=self.queue)
+                if self._connection is not None and self._connection.is_open:
+                    self._connection.close()
+            except Exception as e:
+                print(f"⚠️ Could not clean up stop signal for task {self.task_id}: {e}")
+            self._connection = self._channel = None
+
+
+def request_stop(routing_key: str):
+    """
+    Asks a task (by task id) or every task in a scope (e.g. `user_scope(user_id)`) to stop.
+
+    For a task id the stop queue is declared here as well, so a stop sent while
+    the task is still waiting in its Celery queue is seen as soon as it starts.
+    """
+    connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+    try:
+        channel = connection.channel()
+        channel.exchange_declare(exchange=STOP_EXCHANGE, exchange_type='direct')
+        if not routing_key.startswith('user.'):
+            queue = stop_queue_name(routing_key)
+            channel.queue_declare(queue=queue, arguments=_queue_arguments())
+            channel.queue_bind(queue=queue, exchange=STOP_EXCHANGE, routing_key=routing_key)
+        channel.basic_publish(exchange=STOP_EXCHANGE, routing_key=routing_key, body=b'stop')
+    finally:
+        connection.close()
@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import src.config as config
+
+class StorageBackend(ABC):
+    """Interface for the object stores order book data can be written to."""
+
+    name = 'base'
+
+    @abstractmethod
+    def put(self, key: str, data: bytes):
+        """Stores `data` under `key` (e.g., 'orderbooks/date=.../pair=.../123.parquet')."""
+
+
+class LocalStorageBackend(StorageBackend):
+    """Writes objects as files under a local directory."""
+
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, data: bytes):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a dot-prefixed name first, readers skip those, then rename into place
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class MemoryStorageBackend(StorageBackend):
+    """Keeps objects in a dict. Useful for tests and dry runs."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            self.objects[key] = data
+
+
+class S3StorageBackend(StorageBackend):
+    """Writes objects to AWS S3 or any S3-compatible store (e.g., MinIO via `endpoint_url`)."""
+
+    name = 's3'
+
+    def __init__(self, bucket_name: str, aws_access_key: str, aws_secret_key: str, region: str,
+                 endpoint_url: str = None):
+        import boto3
+        self.bucket_name = bucket_name
+        self.s3_client = boto3.client(
+            's3',
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key,
+            region_name=region,
+            endpoint_url=endpoint_url
+        )
+
+    def put(self, key: str, data: bytes):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+
+
+def create_backend_from_config() -> StorageBackend:
+    """Builds the storage backend selected by `config.PERSISTENCE_BACKEND`."""
+    backend = config.PERSISTENCE_BACKEND
+    if backend == 's3':
+        return S3StorageBackend(
+            bucket_name=config.AWS_S3_BUCKET_NAME,
+            aws_access_key=config.AWS_ACCESS_KEY_ID,
+            aws_secret_key=config.AWS_SECRET_ACCESS_KEY,
+            region=config.AWS_REGION,
+            endpoint_url=config.S3_ENDPOINT_URL
+        )
+    if backend == 'local':
+        return LocalStorageBackend(config.LOCAL_DATA_DIR)
+    if backend == 'memory':
+        return MemoryStorageBackend()
+    raise ValueError(f"Unknown PERSISTENCE_BACKEND '{backend}'. Use 's3', 'local' or 'memory'.")
+
+
+class AsyncUploader:
+    """
+    Uploads objects on a bounded background thread pool, so the capture loop
+    never waits on the storage backend.
+
+    Failed uploads are retried with exponential backoff. Objects that still fail,
+    or that arrive while too many uploads are pending, are spilled to a local
+    directory and re-uploaded in the background once the remote is reachable again.
+    """
+
+    def __init__(self, backend: StorageBackend, max_workers: int = None, max_pending: int = None,
+                 max_retries: int = None, spill_dir: str = None):
+        """
+        Args:
+            backend (StorageBackend): Where objects are uploaded to.
+            max_workers (int): Concurrent uploads.
+            max_pending (int): Uploads allowed in flight before new objects spill to disk.
+            max_retries (int): Attempts per object before it spills to disk.
+            spill_dir (str): Directory for objects that could not be uploaded.
+        """
+        self.backend = backend
+        self.max_pending = max_pending or config.UPLOAD_MAX_PENDING
+        self.max_retries = max_retries or config.UPLOAD_MAX_RETRIES
+        self.spill_dir = spill_dir or os.path.join(config.SPILL_DIR, backend.name)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or config.UPLOAD_MAX_WORKERS,
+                                        thread_name_prefix='uploader')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._last_drain = 0.0
+        self.stats = {"uploaded": 0, "retried": 0, "spilled": 0, "recovered": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def submit(self, key: str, data: bytes):
+        """Queues an object for upload and returns immediately."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                overloaded = True
+            else:
+                overloaded = False
+                self._pending += 1
+        if overloaded:
+            self._spill(key, data)
+            return
+        self._pool.submit(self._upload, key, data)
+
+    def _upload(self, key: str, data: bytes):
+        try:
+            for attempt in range(self.max_retries):
+                try:
+                    self.backend.put(key, data)
+                    self._count("uploaded")
+                    self._maybe_drain_spill()
+                    return
+                except Exception as e:
+                    if attempt + 1 == self.max_retries:
+                        print(f"❌ Upload of {key} failed after {self.max_retries} attempts: {e}")
+                    else:
+                        self._count("retried")
+                        time.sleep(config.UPLOAD_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+            self._spill(key, data)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._idle.notify_all()
+
+    def _spill(self, key: str, data: bytes):
+        path = os.path.join(self.spill_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Rename into place so a concurrent drain never uploads a half-written file
+        with open(f"{path}.partial", 'wb') as f:
+            f.write(data)
+        os.replace(f"{path}.partial", path)
+        self._count("spilled")
+        print(f"⚠️ Spilled {key} to {path} for a later upload.")
+
+    def _spilled_files(self) -> list:
+        files = []
+        for dirpath, _, filenames in os.walk(self.spill_dir):
+            files.extend(os.path.join(dirpath, name) for name in filenames if not name.endswith('.partial'))
+        return sorted(files)
+
+    def _maybe_drain_spill(self):
+        """After a successful upload, occasionally retry what was spilled earlier."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_drain < config.SPILL_DRAIN_INTERVAL_SECONDS:
+                return
+            self._last_drain = now
+        self.drain_spill()
+
+    def drain_spill(self) -> int:
+        """
+        Uploads spilled objects, stopping at the first failure.
+
+        Returns:
+            int: The number of objects recovered.
+        """
+        recovered = 0
+        for path in self._spilled_files():
+            key = os.path.relpath(path, self.spill_dir).replace(os.sep, '/')
+            try:
+                with open(path, 'rb') as f:
+                    self.backend.put(key, f.read())
+            except FileNotFoundError:
+                continue  # Another upload thread recovered it first
+            except Exception as e:
+                print(f"Remote still unavailable, keeping spilled objects: {e}")
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            recovered += 1
+        if recovered:
+            self._count("recovered", recovered)
+            print(f"✅ Re-uploaded {recovered} spilled object(s).")
+        return recovered
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until all queued uploads have finished (or spilled).
+
+        Returns:
+            bool: True if the queue drained within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = None):
+        """Flushes pending uploads, retries the spill directory once and stops the pool."""
+        self.flush(timeout)
+        self.drain_spill()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,40 @@
+import argparse
+import src.config as config
+from src.celery_app import celery_app
+
+
+def build_worker_argv(profile_name: str, loglevel: str = 'info') -> list:
+    """
+    Builds the `celery worker` argument list for a named worker profile.
+
+    Args:
+        profile_name (str): A key of `config.WORKER_PROFILES` (e.g., 'orders').
+        loglevel (str): The Celery log level.
+
+    Returns:
+        list: Arguments suitable for `celery_app.worker_main`.
+    """
+    if profile_name not in config.WORKER_PROFILES:
+        raise ValueError(f"Unknown worker profile '{profile_name}'. Available: {list(config.WORKER_PROFILES)}")
+
+    profile = config.WORKER_PROFILES[profile_name]
+    return [
+        'worker',
+        f'--loglevel={loglevel}',
+        f"--queues={','.join(profile['queues'])}",
+        f"--concurrency={profile['concurrency']}",
+        f"--prefetch-multiplier={profile['prefetch_multiplier']}",
+        f"--pool={profile['pool']}",
+        f'--hostname={profile_name}@%h',
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Start a Celery worker for one of the configured worker profiles.")
+    parser.add_argument("profile", choices=list(config.WORKER_PROFILES), help="The worker profile to run.")
+    parser.add_argument("--loglevel", default="info", help="Celery log level.")
+    args = parser.parse_args()
+
+    argv = build_worker_argv(args.profile, args.loglevel)
+    print(f"🚀 Starting '{args.profile}' worker: celery {' '.join(argv)}")
+    celery_app.worker_main(argv=argv)
@@ -0,0 +1,135 @@
+import pytest
+
+pytest.importorskip('dotenv')  # src.config loads .env on import
+
+import src.config as config
+from src.server import admission as admission_module
+from src.server.admission import AdmissionController, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freezes time.monotonic() as seen by the admission module; advance with clock['now'] += seconds."""
+    state = {'now': 1000.0}
+    monkeypatch.setattr(admission_module.time, 'monotonic', lambda: state['now'])
+    return state
+
+
+@pytest.fixture
+def admission(clock):
+    return AdmissionController()
+
+
+def test_token_bucket_allows_burst_then_reports_wait(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock['now'] += 0.5
+    assert bucket.try_acquire() == 0.0
+
+
+def test_admits_and_tracks_in_flight(admission):
+    assert admission.admit('alice', 'place_market_order', 'r1') is None
+    assert admission.in_flight == 1
+    assert admission.metrics['place_market_order']['admitted'] == 1
+
+
+def test_untracked_action_is_not_counted_in_flight(admission):
+    assert admission.admit('alice', 'start_orderbook', 'r1') is None
+    assert admission.in_flight == 0
+
+
+def test_rejects_busy_when_queue_is_backed_up(admission, monkeypatch):
+    monkeypatch.setitem(config.ADMISSION_MAX_QUEUE_DEPTH, 'orders', 10)
+    admission.queue_depths['orders'] = (10, 2)
+
+    rejection = admission.admit('alice', 'place_market_order', 'r1')
+    assert rejection['status'] == 'busy'
+    assert rejection['retry_after'] == config.ADMISSION_QUEUE_POLL_SECONDS
+    assert admission.in_flight == 0
+    assert admission.metrics['place_market_order']['rejected_queue_depth'] == 1
+
+    # Other queues are unaffected
+    assert admission.admit('alice', 'start_execution_algo', 'r2') is None
+
+
+def test_rejects_busy_at_in_flight_limit(admission, monkeypatch):
+    monkeypatch.setattr(config, 'ADMISSION_MAX_IN_FLIGHT', 2)
+    assert admission.admit('alice', 'place_market_order', 'r1') is None
+    assert admission.admit('bob', 'place_market_order', 'r2') is None
+
+    rejection = admission.admit('carol', 'place_market_order', 'r3')
+    assert rejection['status'] == 'busy'
+    assert rejection['retry_after'] > 0
+    assert admission.metrics['place_market_order']['rejected_in_flight'] == 1
+
+
+def test_rate_limits_per_user_and_action(admission, monkeypatch):
+    monkeypatch.setattr(config, 'ADMISSION_USER_LIMIT', (100, 100))
+    monkeypatch.setitem(config.ADMISSION_ACTION_LIMITS, 'get_account_info', (1, 2))
+
+    assert admission.admit('alice', 'get_account_info', 'r1') is None
+    assert admission.admit('alice', 'get_account_info', 'r2') is None
+    rejection = admission.admit('alice', 'get_account_info', 'r3')
+    assert rejection['status'] == 'rate_limited'
+    assert rejection['retry_after'] == pytest.approx(1.0)
+
+    # Each user has their own buckets
+    assert admission.admit('bob', 'get_account_info', 'r4') is None
+
+
+def test_rate_limited_request_is_not_in_flight(admission, monkeypatch):
+    monkeypatch.setitem(config.ADMISSION_ACTION_LIMITS, 'get_account_info', (1, 1))
+    assert admission.admit('alice', 'get_account_info', 'r1') is None
+    assert admission.admit('alice', 'get_account_info', 'r2')['status'] == 'rate_limited'
+    assert admission.in_flight == 1
+
+
+def test_first_reply_releases_and_later_replies_do_not(admission, monkeypatch):
+    monkeypatch.setattr(config, 'ADMISSION_MAX_IN_FLIGHT', 1)
+    assert admission.admit('alice', 'analyze_and_place_order', 'r1') is None
+
+    admission.on_reply('r1', 'pre_trade_analysis')
+    assert admission.in_flight == 0
+
+    # A second reply ("filled" after "placed") must not free a slot it does not hold
+    admission.on_reply('r1', 'analyze_and_place_order')
+    assert admission.in_flight == 0
+    assert admission.admit('alice', 'analyze_and_place_order', 'r2') is None
+    assert admission.in_flight == 1
+    assert admission.admit('alice', 'analyze_and_place_order', 'r3')['status'] == 'busy'
+
+
+def test_reply_release_is_matched_by_request_id(admission):
+    assert admission.admit('alice', 'place_market_order', 'r1') is None
+    assert admission.admit('alice', 'place_market_order', 'r2') is None
+
+    admission.on_reply('unknown', 'place_market_order')
+    admission.on_reply(None, 'place_market_order')
+    admission.on_reply('r1', 'get_account_info')  # not an answer to this action
+    assert admission.in_flight == 2
+
+    admission.on_reply('r2', 'place_market_order')
+    assert admission.in_flight == 1
+    admission.on_reply('r1', 'place_market_order')
+    assert admission.in_flight == 0
+
+
+def test_unanswered_requests_expire(admission, clock):
+    assert admission.admit('alice', 'place_market_order', 'r1') is None
+    clock['now'] += config.ADMISSION_IN_FLIGHT_TTL_SECONDS
+    assert admission.snapshot()['in_flight'] == 0
+    assert admission.metrics['place_market_order']['expired'] == 1
+
+    # A late reply to the expired request changes nothing
+    admission.on_reply('r1', 'place_market_order')
+    assert admission.in_flight == 0
+
+
+def test_forget_user_resets_their_buckets(admission, monkeypatch):
+    monkeypatch.setitem(config.ADMISSION_ACTION_LIMITS, 'get_account_info', (1, 1))
+    assert admission.admit('alice', 'get_account_info', 'r1') is None
+    assert admission.admit('alice', 'get_account_info', 'r2')['status'] == 'rate_limited'
+
+    admission.forget_user('alice')
+    assert admission.admit('alice', 'get_account_info', 'r3') is None
@@ -0,0 +1,151 @@
+import shutil
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('dotenv')  # src.config loads .env on import
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from src.utils.compactor import COMPACTED_PREFIX, PartitionCompactor
+from src.utils.orderbook_reader import OrderbookReader
+
+DAY = datetime(2024, 3, 1)
+
+
+def write_snapshots(partition, timestamps):
+    """Writes one small file per snapshot, the way the persistor does."""
+    partition.mkdir(parents=True, exist_ok=True)
+    for ts in timestamps:
+        table = pa.table({
+            'timestamp': pa.array([ts], type=pa.timestamp('us')),
+            'exchange': ['binance'],
+            'symbol': ['BTC/USDT'],
+            'bids': [[[100.0, 1.0]]],
+            'asks': [[[101.0, 2.0]]],
+        })
+        pq.write_table(table, str(partition / f"{int(ts.timestamp() * 1000)}.parquet"))
+
+
+def data_files(partition):
+    return sorted(p.name for p in partition.glob('*.parquet'))
+
+
+@pytest.fixture
+def root(tmp_path):
+    return tmp_path / 'orderbooks'
+
+
+@pytest.fixture
+def partition(root):
+    return root / 'date=2024-03-01' / 'pair=BTC-USDT'
+
+
+def compactor(root, **kwargs) -> PartitionCompactor:
+    return PartitionCompactor(OrderbookReader(str(root)), **kwargs)
+
+
+def test_compaction_preserves_rows_and_sorts(root, partition):
+    # Written out of order, as concurrent uploads land
+    timestamps = [DAY + timedelta(seconds=s) for s in (5, 1, 9, 0, 3, 7, 2, 8, 4, 6)]
+    write_snapshots(partition, timestamps)
+    before = OrderbookReader(str(root)).read_table()
+
+    result = compactor(root, row_group_size=3, target_file_rows=4).compact_partition(str(partition))
+
+    assert result['status'] == 'compacted'
+    assert (result['input_files'], result['input_rows'], result['output_rows']) == (10, 10, 10)
+    assert result['duplicates_dropped'] == 0
+    assert result['output_files'] == 3
+    files = data_files(partition)
+    assert len(files) == 3 and all(name.startswith(COMPACTED_PREFIX) for name in files)
+
+    after = OrderbookReader(str(root)).read_table()
+    assert after.num_rows == before.num_rows
+    assert after.to_pylist() == before.to_pylist()
+
+    # Each file is time-sorted, cut into row groups, and together they hold every row once
+    rows = []
+    for name in files:
+        parquet = pq.ParquetFile(str(partition / name))
+        assert all(parquet.metadata.row_group(i).num_rows <= 3 for i in range(parquet.num_row_groups))
+        rows.extend(parquet.read().column('timestamp').to_pylist())
+    assert rows == sorted(timestamps)
+
+
+def test_rerun_merges_leftover_originals_without_duplicates(root, partition):
+    write_snapshots(partition, [DAY + timedelta(seconds=s) for s in range(6)])
+    compactor(root).compact_partition(str(partition))
+
+    # A previous run died after publishing but before deleting: the originals are back
+    write_snapshots(partition, [DAY + timedelta(seconds=s) for s in range(6)])
+    result = compactor(root).compact_partition(str(partition))
+
+    assert result['status'] == 'compacted'
+    assert (result['input_rows'], result['duplicates_dropped'], result['output_rows']) == (12, 6, 6)
+    assert OrderbookReader(str(root)).read_table().num_rows == 6
+
+
+def test_already_compacted_partition_is_skipped(root, partition):
+    write_snapshots(partition, [DAY + timedelta(seconds=s) for s in range(3)])
+    compactor(root).compact_partition(str(partition))
+    files = data_files(partition)
+
+    assert compactor(root).compact_partition(str(partition))['status'] == 'skipped'
+    assert data_files(partition) == files
+
+
+def test_dry_run_writes_nothing(root, partition):
+    write_snapshots(partition, [DAY + timedelta(seconds=s) for s in range(4)])
+    files = data_files(partition)
+    shutil.copy(partition / files[0], partition / 'copy.parquet')
+
+    result = compactor(root).compact_partition(str(partition), dry_run=True)
+
+    assert result['status'] == 'dry_run'
+    assert (result['input_rows'], result['output_rows']) == (5, 4)
+    assert data_files(partition) == sorted(files + ['copy.parquet'])
+
+
+def test_delta_rows_sharing_a_timestamp_are_kept(tmp_path):
+    root = tmp_path / 'orderbook_deltas'
+    partition = root / 'date=2024-03-01' / 'pair=BTC-USDT'
+    partition.mkdir(parents=True)
+    for second in range(3):
+        ts = DAY + timedelta(seconds=second)
+        pq.write_table(pa.table({
+            'timestamp': pa.array([ts] * 3, type=pa.timestamp('us')),
+            'exchange': ['binance'] * 3,
+            'symbol': ['BTC/USDT'] * 3,
+            'side': ['bid', 'bid', 'ask'],
+            'price': [100.0, 99.0, 100.0],
+            'quantity': [1.0, 0.0, 2.0],
+        }), str(partition / f"{second}.parquet"))
+
+    result = compactor(root).compact_partition(str(partition))
+
+    assert (result['input_rows'], result['duplicates_dropped'], result['output_rows']) == (9, 0, 9)
+
+
+def test_run_only_compacts_closed_days(root, partition):
+    write_snapshots(partition, [DAY + timedelta(seconds=s) for s in range(3)])
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    open_partition = root / f"date={today:%Y-%m-%d}" / 'pair=BTC-USDT'
+    write_snapshots(open_partition, [today + timedelta(seconds=s) for s in range(3)])
+
+    results = compactor(root).run(max_workers=2)
+
+    assert [r['partition'] for r in results] == [str(partition)]
+    assert results[0]['status'] == 'compacted'
+    assert len(data_files(open_partition)) == 3
+
+    results = compactor(root).run(include_open=True, pairs=['BTC/USDT'])
+    assert {r['partition']: r['status'] for r in results} == {str(partition): 'skipped',
+                                                              str(open_partition): 'compacted'}
+
+
+def test_is_closed_waits_for_the_grace_period(root):
+    compact = compactor(root, grace_minutes=15)
+    assert not compact.is_closed('2024-03-01', now=datetime(2024, 3, 1, 23, 59))
+    assert not compact.is_closed('2024-03-01', now=datetime(2024, 3, 2, 0, 14))
+    assert compact.is_closed('2024-03-01', now=datetime(2024, 3, 2, 0, 15))
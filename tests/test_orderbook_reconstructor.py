@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('dotenv')  # src.config loads .env on import
+pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+
+from src.utils import data_persistor
+from src.utils.data_persistor import DeltaOrderbookPersistor
+from src.utils.orderbook_reader import OrderbookReader, OrderbookReconstructor
+from src.utils.storage_backends import AsyncUploader, LocalStorageBackend
+
+EXCHANGE, SYMBOL = 'binance', 'BTC/USDT'
+KEYFRAME_INTERVAL = 5
+
+
+def source_book(step: int) -> dict:
+    """A book that changes on every step: quantities move, levels appear and disappear."""
+    bids = [[100.0 - level, 1.0 + level + step % 3] for level in range(5)]
+    asks = [[101.0 + level, 2.0 + level * step % 4] for level in range(5)]
+    if step % 2:
+        bids.pop(2)
+    if step % 3 == 0:
+        asks.append([110.0 + step, 0.5])
+    asks[0][1] += step
+    return {'bids': bids, 'asks': asks}
+
+
+def capture(tmp_path, monkeypatch, start: datetime, steps: int) -> list:
+    """Persists `steps` one-second-apart snapshots in delta mode and returns them as ccxt-style books."""
+    clock = {'now': start}
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock['now']
+
+    monkeypatch.setattr(data_persistor, 'datetime', FrozenDatetime)
+    backend = LocalStorageBackend(str(tmp_path))
+    persistor = DeltaOrderbookPersistor(backend, AsyncUploader(backend, spill_dir=str(tmp_path / 'spill')),
+                                        keyframe_interval_seconds=KEYFRAME_INTERVAL)
+    books = []
+    for step in range(steps):
+        clock['now'] = start + timedelta(seconds=step)
+        book = source_book(step)
+        persistor.write_orderbook_snapshot(EXCHANGE, SYMBOL, book)
+        books.append({
+            'timestamp': int((clock['now'] - datetime(1970, 1, 1)).total_seconds() * 1000),
+            'bids': sorted(book['bids'], reverse=True),
+            'asks': sorted(book['asks']),
+        })
+    persistor.close()
+    return books
+
+
+def reconstructor(tmp_path) -> OrderbookReconstructor:
+    return OrderbookReconstructor(OrderbookReader(str(tmp_path / 'orderbooks')),
+                                  OrderbookReader(str(tmp_path / 'orderbook_deltas')),
+                                  max_keyframe_age_seconds=2 * KEYFRAME_INTERVAL)
+
+
+@pytest.mark.parametrize('start', [
+    datetime(2024, 3, 1, 12, 0, 0),
+    datetime(2024, 3, 1, 23, 59, 53),  # crosses a date partition
+])
+def test_iter_books_matches_source_snapshots(tmp_path, monkeypatch, start):
+    source = capture(tmp_path, monkeypatch, start, steps=13)
+    # Most snapshots were stored as deltas, not keyframes
+    assert len(list((tmp_path / 'orderbooks').rglob('*.parquet'))) < len(source) // 2
+
+    rebuilt = list(reconstructor(tmp_path).iter_books(EXCHANGE, SYMBOL, start, start + timedelta(seconds=13)))
+
+    assert [book['timestamp'] for book in rebuilt] == [book['timestamp'] for book in source]
+    for got, expected in zip(rebuilt, source):
+        assert (got['exchange'], got['symbol']) == (EXCHANGE, SYMBOL)
+        assert got['bids'] == expected['bids']
+        assert got['asks'] == expected['asks']
+
+
+def test_iter_books_from_mid_interval_starts_with_the_full_book(tmp_path, monkeypatch):
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    source = capture(tmp_path, monkeypatch, start, steps=10)
+
+    # Starts between keyframes: the first book replays the keyframe and the deltas before it
+    rebuilt = list(reconstructor(tmp_path).iter_books(EXCHANGE, SYMBOL, start + timedelta(seconds=7),
+                                                      start + timedelta(seconds=9)))
+
+    assert [(book['timestamp'], book['bids'], book['asks']) for book in rebuilt] == \
+           [(book['timestamp'], book['bids'], book['asks']) for book in source[7:9]]
+
+
+def test_book_at_returns_the_latest_state(tmp_path, monkeypatch):
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    source = capture(tmp_path, monkeypatch, start, steps=8)
+    rebuild = reconstructor(tmp_path)
+
+    book = rebuild.book_at(EXCHANGE, SYMBOL, start + timedelta(seconds=6, milliseconds=500), depth=3)
+    assert book['timestamp'] == source[6]['timestamp']
+    assert book['bids'] == source[6]['bids'][:3]
+    assert book['asks'] == source[6]['asks'][:3]
+
+    assert rebuild.book_at(EXCHANGE, SYMBOL, start - timedelta(seconds=1)) is None
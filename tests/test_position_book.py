@@ -0,0 +1,160 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.portfolio.position_book import PositionBook
+
+
+def fill(book, side, amount, price, **kwargs):
+    return book.apply_fill('alice', 'main', 'binance', 'BTC/USDT', side, amount, price, **kwargs)
+
+
+def position(book, symbol='BTC/USDT', user_id='alice'):
+    return next(p for p in book.snapshot(user_id)['positions'] if p['symbol'] == symbol)
+
+
+def test_adding_averages_entry_price():
+    book = PositionBook()
+    fill(book, 'buy', 1, 100)
+    fill(book, 'buy', 3, 120)
+    p = position(book)
+    assert p['quantity'] == 4
+    assert p['entry_price'] == pytest.approx(115)
+    assert p['realized_pnl'] == 0
+
+
+def test_reducing_realizes_against_entry():
+    book = PositionBook()
+    fill(book, 'sell', 4, 100)
+    fill(book, 'buy', 1, 90)
+    p = position(book)
+    assert p['position_side'] == 'short'
+    assert p['quantity'] == -3
+    assert p['entry_price'] == pytest.approx(100)
+    assert p['realized_pnl'] == pytest.approx(10)
+
+
+def test_netting_across_flips():
+    book = PositionBook()
+    fill(book, 'buy', 2, 100)
+
+    # Sell through zero: close 2 long at +10 each, open 1 short at the fill price
+    fill(book, 'sell', 3, 110)
+    p = position(book)
+    assert p['quantity'] == -1
+    assert p['entry_price'] == pytest.approx(110)
+    assert p['realized_pnl'] == pytest.approx(20)
+
+    # Buy through zero again: close the short at +5, open 2 long at 105
+    fill(book, 'buy', 3, 105)
+    p = position(book)
+    assert p['quantity'] == 2
+    assert p['entry_price'] == pytest.approx(105)
+    assert p['realized_pnl'] == pytest.approx(25)
+
+    # Close exactly: flat, entry cleared, PnL kept
+    fill(book, 'sell', 2, 100)
+    p = position(book)
+    assert p['position_side'] == 'flat'
+    assert p['entry_price'] is None
+    assert p['realized_pnl'] == pytest.approx(15)
+    assert p['unrealized_pnl'] == 0
+
+
+def test_fees_reduce_realized_pnl():
+    book = PositionBook()
+    fill(book, 'buy', 1, 100, fee=0.5)
+    fill(book, 'sell', 1, 110, fee=0.5)
+    p = position(book)
+    assert p['fees'] == pytest.approx(1.0)
+    assert p['realized_pnl'] == pytest.approx(9.0)
+
+
+def test_contract_size_scales_pnl():
+    book = PositionBook()
+    fill(book, 'buy', 100, 50000, contract_size=0.01)
+    book.update_prices('binance', {'BTC/USDT': 51000})
+    assert position(book)['unrealized_pnl'] == pytest.approx(1000)
+    fill(book, 'sell', 50, 52000)
+    assert position(book)['realized_pnl'] == pytest.approx(1000)
+
+
+def test_price_ticks_mark_only_their_market():
+    book = PositionBook()
+    fill(book, 'buy', 1, 100)
+    book.apply_fill('alice', 'main', 'okx', 'BTC/USDT', 'buy', 1, 100)
+    book.update_prices('binance', {'BTC/USDT': 120, 'ETH/USDT': 5})
+
+    totals = book.totals()['alice']
+    assert totals['unrealized_pnl'] == pytest.approx(20)
+    assert totals['open_positions'] == 2
+    assert sorted(book.markets()) == [('binance', 'BTC/USDT'), ('okx', 'BTC/USDT')]
+
+
+def test_totals_are_per_user():
+    book = PositionBook()
+    fill(book, 'buy', 1, 100)
+    fill(book, 'sell', 1, 110)
+    book.apply_fill('bob', 'main', 'binance', 'BTC/USDT', 'sell', 2, 100)
+    book.update_prices('binance', {'BTC/USDT': 90})
+
+    totals = book.totals()
+    assert totals['alice'] == {'realized_pnl': 10.0, 'unrealized_pnl': 0.0, 'net_pnl': 10.0, 'open_positions': 0}
+    assert totals['bob'] == {'realized_pnl': 0.0, 'unrealized_pnl': 20.0, 'net_pnl': 20.0, 'open_positions': 1}
+
+
+def test_duplicate_fills_are_skipped():
+    book = PositionBook(dedup_window=2)
+    assert fill(book, 'buy', 1, 100, fill_id='f1') is not None
+    assert fill(book, 'buy', 1, 100, fill_id='f1') is None
+    assert position(book)['quantity'] == 1
+
+    # Only the most recent `dedup_window` IDs are remembered
+    fill(book, 'buy', 1, 100, fill_id='f2')
+    fill(book, 'buy', 1, 100, fill_id='f3')
+    assert fill(book, 'buy', 1, 100, fill_id='f1') is not None
+    assert position(book)['quantity'] == 4
+
+
+def test_grows_past_initial_capacity():
+    book = PositionBook(capacity=2)
+    for i, symbol in enumerate(['BTC/USDT', 'ETH/USDT', 'SOL/USDT']):
+        book.apply_fill('alice', 'main', 'binance', symbol, 'buy', 1, 100 + i)
+    book.update_prices('binance', {'SOL/USDT': 112})
+    assert position(book, 'BTC/USDT')['entry_price'] == pytest.approx(100)
+    assert position(book, 'SOL/USDT')['unrealized_pnl'] == pytest.approx(10)
+    assert position(book, 'ETH/USDT')['last_price'] == pytest.approx(101)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / 'positions.npz')
+    book = PositionBook(capacity=2)
+    fill(book, 'buy', 2, 100, fee=0.2, fill_id='f1')
+    fill(book, 'sell', 3, 110, fill_id='f2')
+    book.apply_fill('bob', 'sub', 'okx', 'ETH/USDT', 'buy', 10, 2000, contract_size=0.1, fill_id='f3')
+    book.update_prices('binance', {'BTC/USDT': 105})
+    book.update_prices('okx', {'ETH/USDT': 2100})
+    book.save(path)
+
+    restored = PositionBook.load(path)
+    assert restored.keys == book.keys
+    assert restored.totals() == book.totals()
+    for user_id in ('alice', 'bob'):
+        assert restored.snapshot(user_id) == book.snapshot(user_id)
+    assert sorted(restored.markets()) == sorted(book.markets())
+
+    # Fills applied before the checkpoint stay deduplicated after it
+    assert fill(restored, 'buy', 2, 100, fill_id='f1') is None
+
+    # Both books keep netting identically
+    for b in (book, restored):
+        fill(b, 'buy', 3, 100, fill_id='f4')
+        b.update_prices('okx', {'ETH/USDT': 1900})
+    assert restored.snapshot('alice') == book.snapshot('alice')
+    assert restored.snapshot('bob') == book.snapshot('bob')
+
+
+def test_load_without_checkpoint_is_empty(tmp_path):
+    book = PositionBook.load(str(tmp_path / 'missing.npz'))
+    assert book.size == 0
+    assert book.totals() == {}